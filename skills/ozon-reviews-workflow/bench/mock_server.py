@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Ozon Seller API Mock Server
+Локальный мок Ozon Seller API для бенчмарков (без обращения к продакшену):
+- /v1/review/list (has_next/last_id), /v1/review/info, /v1/review/comment/list,
+  /v1/review/comment/create, /v1/review/change-status
+- отзывы генерируются по seed: один и тот же seed и размер — один и тот же набор
+- инъекция задержки, ошибок 5xx и 429 с Retry-After
+- каждый запрос записывается (эндпоинт, код, длительность) для отчёта бенчмарка
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+TEXTS = [
+    "Отличный товар, спасибо!",
+    "Пришла помятая коробка, но сам товар целый",
+    "Подскажите, как правильно наносить?",
+    "Маломерит, пришлось вернуть",
+    "Не понравился запах, аллергия",
+    "Супер, рекомендую всем",
+    "Нормально, но дороговато",
+]
+
+
+def generate_reviews(n: int, seed: int = 42) -> List[Dict]:
+    """
+    n отзывов, от новых к старым; распределение примерно как у живого кабинета:
+    больше 5★, половина без текста, часть с фото и комментариями
+    """
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    reviews = []
+    for i in range(n):
+        rating = rng.choices([1, 2, 3, 4, 5], weights=[5, 3, 7, 15, 70])[0]
+        reviews.append({
+            "id": f"bench-{seed}-{i:08d}",
+            "sku": 100000 + rng.randrange(500),
+            "rating": rating,
+            "text": rng.choice(TEXTS) if rng.random() < 0.5 else "",
+            "photos_amount": rng.choice([0, 0, 0, 1, 3]),
+            "videos_amount": 0,
+            "comments_amount": 1 if rng.random() < 0.2 else 0,
+            "status": "UNPROCESSED" if rng.random() < 0.8 else "PROCESSED",
+            "order_status": "DELIVERED",
+            "is_rating_participant": True,
+            "published_at": (start - timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        })
+    return reviews
+
+
+class MockOzon:
+    """Состояние мок-API: отзывы, комментарии, журнал запросов и настройки сбоев"""
+
+    def __init__(
+        self,
+        reviews: List[Dict],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 42
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reviews = reviews
+        self.index = {r["id"]: i for i, r in enumerate(reviews)}
+        # У части отзывов с комментариями уже есть ответ продавца
+        self.comments: Dict[str, List[Dict]] = {
+            r["id"]: [{"id": f"c-{r['id']}", "text": "Спасибо!", "is_owner": i % 10 < 7}]
+            for i, r in enumerate(reviews) if r["comments_amount"]
+        }
+        self.requests: List[tuple] = []
+        self.created = 0
+        self.status_changed = 0
+
+    # --- журнал ---
+
+    def record(self, path: str, code: int, seconds: float):
+        with self._lock:
+            self.requests.append((path, code, seconds))
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = []
+            self.created = self.status_changed = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            requests = list(self.requests)
+            created, changed = self.created, self.status_changed
+        endpoints: Dict[str, Dict] = {}
+        for path, code, seconds in requests:
+            e = endpoints.setdefault(path, {"requests": 0, "errors": 0, "throttled": 0, "latencies": []})
+            e["requests"] += 1
+            e["errors"] += code >= 500
+            e["throttled"] += code == 429
+            e["latencies"].append(seconds)
+        return {"requests": len(requests), "comments_created": created, "status_changed": changed,
+                "endpoints": endpoints}
+
+    # --- сбои ---
+
+    def fault(self) -> Optional[int]:
+        """Код ошибки для инъекции или None; задержка применяется к каждому запросу"""
+        with self._lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            roll = self._rng.random()
+        if delay:
+            time.sleep(delay)
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+
+    # --- эндпоинты ---
+
+    def review_list(self, body: Dict) -> Dict:
+        limit = max(20, min(int(body.get("limit", 100)), 100))
+        ordered = self.reviews if body.get("sort_dir", "DESC") == "DESC" else self.reviews[::-1]
+        start = 0
+        if body.get("last_id"):
+            position = self.index.get(body["last_id"])
+            if position is None:
+                raise ValueError("unknown last_id")
+            start = (position if ordered is self.reviews else len(self.reviews) - 1 - position) + 1
+        page = ordered[start:start + limit]
+        with self._lock:
+            page = [dict(r) for r in page]
+        has_next = start + limit < len(ordered)
+        return {"reviews": page, "has_next": has_next, "last_id": page[-1]["id"] if page else ""}
+
+    def review_info(self, body: Dict) -> Dict:
+        position = self.index.get(body.get("review_id"))
+        if position is None:
+            raise KeyError("review not found")
+        with self._lock:
+            review = dict(self.reviews[position])
+        review["photos"] = [{"url": f"https://example.com/{i}.jpg"} for i in range(review.pop("photos_amount"))]
+        return review
+
+    def comment_list(self, body: Dict) -> Dict:
+        if body.get("review_id") not in self.index:
+            raise KeyError("review not found")
+        with self._lock:
+            return {"comments": list(self.comments.get(body["review_id"], []))}
+
+    def comment_create(self, body: Dict) -> Dict:
+        review_id = body.get("review_id")
+        if review_id not in self.index or not body.get("text"):
+            raise ValueError("review_id and text are required")
+        with self._lock:
+            comment = {"id": f"c-{review_id}-{self.created}", "text": body["text"], "is_owner": True}
+            self.comments.setdefault(review_id, []).append(comment)
+            self.reviews[self.index[review_id]]["comments_amount"] += 1
+            self.created += 1
+        return {"comment_id": comment["id"]}
+
+    def change_status(self, body: Dict) -> Dict:
+        ids = body.get("review_ids") or []
+        if not 1 <= len(ids) <= 100 or body.get("status") not in ("PROCESSED", "UNPROCESSED"):
+            raise ValueError("1-100 review_ids and a valid status are required")
+        with self._lock:
+            for review_id in ids:
+                if review_id in self.index:
+                    self.reviews[self.index[review_id]]["status"] = body["status"]
+            self.status_changed += len(ids)
+        return {}
+
+    ROUTES = {
+        "/v1/review/list": review_list,
+        "/v1/review/info": review_info,
+        "/v1/review/comment/list": comment_list,
+        "/v1/review/comment/create": comment_create,
+        "/v1/review/change-status": change_status,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Заголовки и тело уходят одним сегментом (без задержки Nagle/delayed ACK)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    api: MockOzon
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, data: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/__stats":
+            stats = self.api.stats()
+            for e in stats["endpoints"].values():
+                e.pop("latencies")
+            self._send(200, stats)
+        else:
+            self._send(404, {"code": 5, "message": "not found"})
+
+    def do_POST(self):
+        started = time.perf_counter()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        route = MockOzon.ROUTES.get(self.path)
+        code = self.api.fault() if route else None
+        if route is None:
+            code, data, headers = 404, {"code": 5, "message": "not found"}, None
+        elif code == 429:
+            data, headers = {"code": 8, "message": "too many requests"}, {"Retry-After": str(self.api.retry_after)}
+        elif code:
+            data, headers = {"code": 14, "message": "unavailable"}, None
+        else:
+            headers = None
+            try:
+                code, data = 200, route(self.api, body)
+            except KeyError as e:
+                code, data = 404, {"code": 5, "message": str(e)}
+            except ValueError as e:
+                code, data = 400, {"code": 3, "message": str(e)}
+        self._send(code, data, headers)
+        self.api.record(self.path, code, time.perf_counter() - started)
+
+
+def serve(api: MockOzon, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Запускает сервер в фоновом потоке; адрес — server.server_address"""
+    handler = type("BoundHandler", (Handler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Local mock of the Ozon Seller reviews API")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--reviews", type=int, default=10000, help="Number of generated reviews")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset and fault RNG seed")
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency jitter (±), ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After for 429, seconds")
+
+    args = parser.parse_args(argv)
+
+    api = MockOzon(
+        generate_reviews(args.reviews, args.seed),
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    server = serve(api, port=args.port)
+    host, port = server.server_address
+    print(f"Mock Ozon API: http://{host}:{port} ({args.reviews} reviews), stats: GET /__stats")
+    print(f"  export OZON_BASE_URL=http://{host}:{port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Benchmark
+Пропускная способность скриптов против локального мок-API (mock_server.py):
+- autoreply.py, import_replies.py, mark_processed.py на наборах отзывов разного размера
+- каждый прогон — отдельный процесс с чистыми базами; мок пересоздаётся с тем же seed
+- метрики: отзывов/с, p50/p99 задержки запросов, пиковый RSS процесса
+- результаты дописываются в JSONL вместе с коммитом (в папку данных навыка, не в исходники) —
+  прогоны разных коммитов сравнимы (--baseline), сравниваются только прогоны с теми же параметрами
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from mock_server import MockOzon, generate_reviews, serve
+
+BENCH_DIR = Path(__file__).resolve().parent
+SCRIPTS_DIR = BENCH_DIR.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from config import DATA_DIR  # noqa: E402
+
+DEFAULT_OUTPUT = DATA_DIR / "bench" / "results.jsonl"
+
+# Параметры прогона, от которых зависят цифры: сравнивать можно только прогоны с одинаковыми
+PARAMS = ("seed", "latency", "jitter", "error_rate", "throttle_rate", "retry_after", "rps", "max_in_flight")
+
+SCRIPTS = ("autoreply", "import_replies", "mark_processed")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль p (0-100) методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+
+def git_commit() -> Dict:
+    """Текущий коммит и наличие незакоммиченных изменений"""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BENCH_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain", "--", str(BENCH_DIR.parent)))}
+    except OSError:
+        return {"commit": "unknown", "dirty": False}
+
+
+def script_args(script: str, reviews: List[Dict], workdir: Path) -> List[str]:
+    """Аргументы скрипта; для import_replies — файл ответов на отзывы с текстом"""
+    if script == "autoreply":
+        return ["--limit", str(len(reviews))]
+    if script == "mark_processed":
+        return ["--limit", str(len(reviews)), "--yes"]
+    replies = workdir / "replies.jsonl"
+    with open(replies, "w", encoding="utf-8") as f:
+        for r in reviews:
+            if r["text"] and r["status"] == "UNPROCESSED":
+                f.write(json.dumps({"id": r["id"], "ai_reply": "Здравствуйте! Спасибо за отзыв 🙏"}, ensure_ascii=False) + "\n")
+    return [str(replies)]
+
+
+def processed(script: str, stats: Dict) -> int:
+    """Сколько отзывов скрипт реально обработал (по данным мока)"""
+    return stats["status_changed"] if script == "mark_processed" else stats["comments_created"]
+
+
+def run_one(script: str, size: int, args) -> Dict:
+    """Один прогон: свежий мок и базы, скрипт в отдельном процессе"""
+    reviews = generate_reviews(size, args.seed)
+    api = MockOzon(
+        reviews,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    server = serve(api)
+    host, port = server.server_address
+
+    with tempfile.TemporaryDirectory(prefix="ozon-bench-") as tmp:
+        workdir = Path(tmp)
+        argv = script_args(script, reviews, workdir)
+        env = {
+            **os.environ,
+            "OZON_CLIENT_ID": "bench",
+            "OZON_API_KEY": "bench",
+            "OZON_BASE_URL": f"http://{host}:{port}",
+            "OZON_RPS": str(args.rps),
+            "OZON_MAX_RPS": str(args.rps),
+            "OZON_MAX_IN_FLIGHT": str(args.max_in_flight),
+            "OZON_REVIEWS_DB": str(workdir / "reviews.db"),
+            "OZON_OUTBOX_DB": str(workdir / "outbox.db"),
+            "OZON_REPLY_CACHE_DB": str(workdir / "reply_cache.db"),
+            "OZON_LOG_DIR": str(workdir),
+            "PYTHONPATH": str(SCRIPTS_DIR),
+        }
+        with open(workdir / "output.log", "w") as log:
+            started = time.perf_counter()
+            # cwd — пустая папка: .env рабочей директории не подхватывается
+            proc = subprocess.Popen([sys.executable, str(SCRIPTS_DIR / f"{script}.py"), *argv],
+                                    cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            _, status, usage = os.wait4(proc.pid, 0)
+            seconds = time.perf_counter() - started
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        tail = (workdir / "output.log").read_text(errors="replace").splitlines()[-5:]
+    server.shutdown()
+    server.server_close()
+
+    stats = api.stats()
+    latencies = [s for e in stats["endpoints"].values() for s in e["latencies"]]
+    count = processed(script, stats)
+    result = {
+        "script": script,
+        "reviews": size,
+        "processed": count,
+        "exit_code": proc.returncode,
+        "seconds": round(seconds, 3),
+        "reviews_per_sec": round(count / seconds, 2) if seconds else 0.0,
+        "requests": stats["requests"],
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        # ru_maxrss в Linux — КБ, в macOS — байты
+        "peak_rss_mb": round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "endpoints": {
+            path: {
+                "requests": e["requests"],
+                "errors": e["errors"],
+                "throttled": e["throttled"],
+                "p50_ms": round(percentile(e["latencies"], 50) * 1000, 2),
+                "p99_ms": round(percentile(e["latencies"], 99) * 1000, 2),
+            }
+            for path, e in stats["endpoints"].items()
+        },
+    }
+    if proc.returncode:
+        result["output_tail"] = tail
+    return result
+
+
+def run_key(result: Dict) -> tuple:
+    """Ключ сравнения: скрипт, размер и параметры прогона"""
+    return result["script"], result["reviews"], json.dumps(result.get("params"), sort_keys=True)
+
+
+def load_baseline(path: str) -> Dict[tuple, Dict]:
+    """Последний результат каждого (скрипт, размер, параметры) из файла результатов"""
+    baseline = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                baseline[run_key(r)] = r
+    return baseline
+
+
+def print_table(results: List[Dict], baseline: Optional[Dict[tuple, Dict]] = None):
+    print(f"\n{'script':<16}{'reviews':>9}{'done':>8}{'rev/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>8}  vs base")
+    for r in results:
+        delta = ""
+        base = (baseline or {}).get(run_key(r))
+        if base and base.get("reviews_per_sec"):
+            delta = f"{(r['reviews_per_sec'] / base['reviews_per_sec'] - 1) * 100:+.1f}% ({base['commit']})"
+        elif baseline is not None:
+            delta = "no baseline with these params"
+        mark = "" if r["exit_code"] == 0 else f"  exit {r['exit_code']}"
+        print(f"{r['script']:<16}{r['reviews']:>9}{r['processed']:>8}{r['reviews_per_sec']:>10.1f}"
+              f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['peak_rss_mb']:>8.1f}  {delta}{mark}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark review scripts against a local mock Ozon API")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help=f"Comma-separated subset of {', '.join(SCRIPTS)}")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated dataset sizes")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset and fault RNG seed")
+    parser.add_argument("--latency", type=float, default=5.0, help="Mock latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=2.0, help="Mock latency jitter (±), ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After for 429, seconds")
+    parser.add_argument("--rps", type=float, default=200, help="Client rate limit (OZON_RPS/OZON_MAX_RPS)")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="Client concurrency (OZON_MAX_IN_FLIGHT)")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT), help=f"Results JSONL to append to (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--baseline", nargs="?", const=str(DEFAULT_OUTPUT), metavar="RESULTS",
+                        help="Earlier results JSONL to compare reviews/s against, same params only (default: --output file)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+
+    args = parser.parse_args(argv)
+
+    scripts = [s for s in args.scripts.split(",") if s]
+    unknown = set(scripts) - set(SCRIPTS)
+    if unknown:
+        print(f"Unknown scripts: {', '.join(sorted(unknown))}")
+        sys.exit(1)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    meta = {
+        **git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {k: getattr(args, k) for k in PARAMS},
+    }
+    baseline = load_baseline(args.baseline) if args.baseline and Path(args.baseline).exists() else None
+    if args.baseline and baseline is None:
+        print(f"⚠️  Baseline not found: {args.baseline}")
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for size in sizes:
+        for script in scripts:
+            print(f"▶ {script} × {size} reviews...", flush=True)
+            result = {**meta, **run_one(script, size, args)}
+            results.append(result)
+            with open(args.output, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if args.json:
+                print(json.dumps(result, ensure_ascii=False))
+
+    print_table(results, baseline)
+    print(f"\nCommit {meta['commit']}{' (dirty)' if meta['dirty'] else ''}, results appended to {args.output}")
+    if any(r["exit_code"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Multi-Account Runner
+Полный цикл для нескольких кабинетов продавца одновременно:
+- список кабинетов — accounts.json (env OZON_ACCOUNTS): ключи и бюджет скорости на каждый
+- каждый кабинет — в отдельном процессе: свой клиент, свой AIMD-лимитер, свои базы и журнал
+- общее время ≈ время самого медленного кабинета, итог сводится в одну таблицу
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO
+
+from config import DATA_DIR
+
+STATE_DIR = DATA_DIR / "accounts"
+# max_tasks_per_child (процесс на кабинет) появился в ProcessPoolExecutor в Python 3.11
+MIN_PYTHON = (3, 11)
+DEFAULT_CONFIG = Path(__file__).resolve().parent.parent / "accounts.json"
+
+# Поле конфига → переменная окружения процесса кабинета
+ACCOUNT_ENV = {
+    "client_id": "OZON_CLIENT_ID",
+    "api_key": "OZON_API_KEY",
+    "rps": "OZON_RPS",
+    "max_rps": "OZON_MAX_RPS",
+    "max_in_flight": "OZON_MAX_IN_FLIGHT",
+    "pool_size": "OZON_POOL_SIZE",
+}
+
+
+def load_accounts(path: Optional[str] = None) -> List[Dict]:
+    """
+    Кабинеты из JSON: [{"name", "client_id", "api_key", "rps"?, "max_rps"?, "max_in_flight"?, "env"?}]
+    Значение вида "$VAR" берётся из окружения (ключи можно не хранить в файле)
+    """
+    path = Path(path or os.environ.get("OZON_ACCOUNTS") or DEFAULT_CONFIG)
+    if not path.exists():
+        raise ValueError(f"Accounts config not found: {path}")
+    data = json.loads(path.read_text())
+    accounts = data.get("accounts", []) if isinstance(data, dict) else data
+
+    names = set()
+    for account in accounts:
+        for key, value in account.items():
+            if isinstance(value, str) and value.startswith("$"):
+                account[key] = os.environ.get(value[1:], "")
+        account["name"] = str(account.get("name") or account.get("client_id") or "")
+        if not account["name"] or not account.get("client_id") or not account.get("api_key"):
+            raise ValueError(f"Account needs name, client_id and api_key: {account.get('name') or '?'}")
+        if account["name"] in names:
+            raise ValueError(f"Duplicate account name: {account['name']}")
+        names.add(account["name"])
+    return accounts
+
+
+def account_env(account: Dict, state_dir: Path) -> Dict[str, str]:
+    """Окружение процесса кабинета: ключи, бюджет скорости, отдельные базы и журнал"""
+    safe = re.sub(r"[^\w.-]", "_", account["name"])
+    root = state_dir / safe
+    env = {var: str(account[key]) for key, var in ACCOUNT_ENV.items() if account.get(key) not in (None, "")}
+    env.update({
+        "OZON_REVIEWS_DB": str(root / "reviews.db"),
+        "OZON_OUTBOX_DB": str(root / "outbox.db"),
+        "OZON_REPLY_CACHE_DB": str(root / "reply_cache.db"),
+        "OZON_LOG_DIR": str(root),
+        "OZON_EXPORT_DIR": str(root),
+        "OZON_ARCHIVE_DIR": str(root / "archive"),
+    })
+    env.update({k: str(v) for k, v in account.get("env", {}).items()})
+    return env
+
+
+def run_account(account: Dict, state_dir: str, options: Dict) -> Dict:
+    """
+    Полный цикл одного кабинета (выполняется в отдельном процессе)
+    Вывод шагов пишется в workflow.log кабинета.
+    """
+    env = account_env(account, Path(state_dir))
+    os.environ.update(env)
+    root = Path(env["OZON_LOG_DIR"])
+    root.mkdir(parents=True, exist_ok=True)
+    log_path = root / "workflow.log"
+
+    started = time.perf_counter()
+    summary = {"account": account["name"], "success": False, "steps": [], "log": str(log_path)}
+    with open(log_path, "a", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            # Процесс свежий (spawn): клиент, лимитер и базы создаются при первом обращении,
+            # уже с env этого кабинета; workflow грузится только в процессах кабинетов
+            from workflow import full_workflow
+            steps = full_workflow(**options)
+            summary["steps"] = [
+                {k: step.get(k) for k in ("step", "name", "success", "seconds", "file")} for step in steps
+            ]
+            summary["success"] = all(step["success"] for step in steps)
+        except SystemExit as e:
+            summary["error"] = f"exit code {e.code}"
+        except Exception as e:
+            summary["error"] = f"{type(e).__name__}: {e}"
+            print(summary["error"])
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def run_accounts(
+    accounts: List[Dict],
+    options: Dict,
+    workers: Optional[int] = None,
+    state_dir: Path = STATE_DIR,
+    progress: Optional[TextIO] = None
+) -> List[Dict]:
+    """
+    Кабинеты параллельно по процессам; результаты — в порядке конфига
+    Строка о каждом завершённом кабинете пишется в progress (по умолчанию stdout).
+    Процесс на каждый кабинет создаётся заново (spawn, одна задача на процесс),
+    поэтому клиент, лимитер и базы никогда не переходят от кабинета к кабинету.
+    """
+    workers = max(1, min(workers or len(accounts), len(accounts)))
+    results: Dict[str, Dict] = {}
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1
+    ) as pool:
+        futures = {pool.submit(run_account, a, str(state_dir), options): a["name"] for a in accounts}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"account": name, "success": False, "steps": [], "error": str(e), "seconds": 0}
+            print(f"{'✅' if result['success'] else '❌'} {name}: {result['seconds']} с", file=progress or sys.stdout)
+            results[name] = result
+    return [results[a["name"]] for a in accounts]
+
+
+def print_summary(results: List[Dict], seconds: float):
+    print("\n" + "="*60)
+    print("📊 ИТОГ ПО КАБИНЕТАМ")
+    print("="*60)
+    for r in results:
+        steps = ", ".join(f"{'✓' if s['success'] else '✗'}{s['name']}" for s in r["steps"]) or r.get("error", "-")
+        print(f"{'✅' if r['success'] else '❌'} {r['account']:<20} {r['seconds']:>8.2f} с  {steps}")
+        if r.get("log"):
+            print(f"   лог: {r['log']}")
+    slowest = max((r["seconds"] for r in results), default=0)
+    total = sum(r["seconds"] for r in results)
+    print(f"\n⏱  Всего: {seconds:.2f} с (самый медленный кабинет {slowest:.2f} с, последовательно было бы ≈{total:.2f} с)")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the reviews workflow for several Ozon accounts in parallel")
+    parser.add_argument("--config", help="Accounts JSON (default: env OZON_ACCOUNTS or ../accounts.json)")
+    parser.add_argument("--only", action="append", help="Run only this account (repeatable)")
+    parser.add_argument("--workers", type=int, help="Max processes (default: one per account)")
+    parser.add_argument("--state-dir", default=str(STATE_DIR), help="Per-account databases and logs")
+    parser.add_argument("--dry-run", action="store_true", help="Test mode (no sending)")
+    parser.add_argument("--no-auto-5star", action="store_true", help="Skip 5★ auto-replies")
+    parser.add_argument("--parallel", action="store_true", help="Run steps of each account in parallel")
+    parser.add_argument("--llm", action="store_true", help="AI steps via the LLM backend")
+    parser.add_argument("--json", action="store_true", help="Print merged summary as JSON")
+
+    args = parser.parse_args(argv)
+    if sys.version_info < MIN_PYTHON:
+        print(json.dumps({"error": f"accounts.py requires Python {'.'.join(map(str, MIN_PYTHON))}+, "
+                                   f"running {sys.version.split()[0]}"}, ensure_ascii=False))
+        sys.exit(1)
+    # С --json в stdout только итоговый JSON, ход выполнения — в stderr
+    progress = sys.stderr if args.json else sys.stdout
+
+    try:
+        accounts = load_accounts(args.config)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False))
+        sys.exit(1)
+    if args.only:
+        accounts = [a for a in accounts if a["name"] in args.only]
+    if not accounts:
+        print("No accounts to run", file=progress)
+        return
+
+    options = {
+        "dry_run": args.dry_run,
+        "auto_5star": not args.no_auto_5star,
+        "parallel": args.parallel,
+        "llm": args.llm,
+    }
+    print(f"🚀 Кабинетов: {len(accounts)}, процессов: {min(args.workers or len(accounts), len(accounts))}",
+          file=progress)
+    started = time.perf_counter()
+    results = run_accounts(accounts, options, args.workers, Path(args.state_dir), progress)
+    seconds = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps({"seconds": round(seconds, 2), "accounts": results}, ensure_ascii=False, indent=2))
+    else:
+        print_summary(results, seconds)
+
+    if not all(r["success"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    from profiling import run_main
+    run_main(main)
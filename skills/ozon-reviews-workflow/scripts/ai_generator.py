@@ -6,60 +6,35 @@ Ozon Reviews AI Generator
 
 import json
 import os
-import sys
-import subprocess
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-WORKSPACE = Path("/home/firstvds/.openclaw/workspace")
-SKILL_DIR = WORKSPACE / "skills" / "ozon-reviews-workflow"
-OUTPUT_DIR = WORKSPACE / "tmp_files" / "ozon-reviews-workflow"
+from config import DATA_DIR, SKILL_DIR, load_env
+from jsonl import iter_records, write_records
+from profiling import span
 
-# Создаем директорию если не существует
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+OUTPUT_DIR = DATA_DIR
 
-def load_env():
-    """Загружает .env"""
-    env_path = WORKSPACE / ".env"
-    if env_path.exists():
-        with open(env_path) as f:
-            for line in f:
-                if line.strip() and not line.startswith("#") and "=" in line:
-                    k, v = line.strip().split("=", 1)
-                    os.environ.setdefault(k.strip(), v.strip().strip('"""'))
-
-def get_reviews_from_api(limit: int = 50, rating_min: int = 4, rating_max: int = 5) -> List[Dict]:
-    """Получает отзывы из Ozon API"""
-    import requests
+def iter_reviews_from_api(limit: int = 50, rating_min: int = 4, rating_max: int = 5) -> Iterator[Dict]:
+    """Отзывы по одному (из локальной базы после delta-синхронизации)"""
+    from review_store import synced_store
     
     load_env()
     
-    headers = {
-        "Client-Id": os.environ.get("OZON_CLIENT_ID"),
-        "Api-Key": os.environ.get("OZON_API_KEY"),
-        "Content-Type": "application/json"
-    }
-    
-    r = requests.post(
-        "https://api-seller.ozon.ru/v1/review/list",
-        headers=headers,
-        json={"limit": max(20, min(limit, 100)), "sort_dir": "DESC"},
-        timeout=30
-    )
-    r.raise_for_status()
-    
-    reviews = r.json().get("reviews", [])
-    
     # Фильтр: 4-5★ + UNPROCESSED + с текстом
-    filtered = [
-        r for r in reviews
-        if r.get("status") == "UNPROCESSED"
-        and rating_min <= r.get("rating", 0) <= rating_max
-        and r.get("text", "").strip()
-    ]
-    
-    return filtered
+    return synced_store().query(
+        status="UNPROCESSED",
+        rating_min=rating_min,
+        rating_max=rating_max,
+        has_text=True,
+        sort_dir="DESC",
+        limit=limit
+    )
+
+def get_reviews_from_api(limit: int = 50, rating_min: int = 4, rating_max: int = 5) -> List[Dict]:
+    """Получает отзывы (из локальной базы после delta-синхронизации)"""
+    return list(iter_reviews_from_api(limit, rating_min, rating_max))
 
 def load_company_policy() -> str:
     """Загружает правила компании"""
@@ -69,46 +44,33 @@ def load_company_policy() -> str:
             return f.read()
     return ""
 
-def generate_ai_reviews_file(reviews: List[Dict]) -> str:
-    """Создает файл для AI-обработки"""
+def generate_ai_reviews_file(reviews: Iterable[Dict]) -> Tuple[str, int]:
+    """Создает JSONL-файл для AI-обработки (пишется по мере чтения отзывов)"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    filename = f"ai_reviews_4_5_{timestamp}.json"
+    filename = f"ai_reviews_4_5_{timestamp}.jsonl"
     filepath = OUTPUT_DIR / filename
     
     # Добавляем поле для AI-ответа
-    for review in reviews:
-        review["ai_reply"] = ""
-    
-    with open(filepath, "w") as f:
-        json.dump(reviews, f, ensure_ascii=False, indent=2)
+    count = write_records(({**review, "ai_reply": ""} for review in reviews), filepath)
     
-    return str(filepath)
+    return str(filepath), count
 
-def create_prompt_for_ai(reviews_file: str, policy: str) -> str:
-    """Создает промпт для AI"""
-    with open(reviews_file) as f:
-        reviews = json.load(f)
-    
-    if not reviews:
-        return ""
-    
-    prompt = f"""Сгенерируй персонализированные ответы на отзывы Ozon.
+# Бюджет токенов на один промпт (политика + отзывы + требования), env OZON_PROMPT_TOKENS
+DEFAULT_TOKEN_BUDGET = 8000
+
+def default_token_budget() -> int:
+    """OZON_PROMPT_TOKENS или DEFAULT_TOKEN_BUDGET (читается при вызове, после load_env)"""
+    return int(os.environ.get("OZON_PROMPT_TOKENS") or DEFAULT_TOKEN_BUDGET)
+
+PROMPT_HEADER = """Сгенерируй персонализированные ответы на отзывы Ozon.
 
 ## ⚠️ КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА КОМПАНИИ:
 {policy}
 
 ## Отзывы для обработки:
 """
-    
-    for i, review in enumerate(reviews, 1):
-        prompt += f"""
-{i}. ID: {review['id']}
-   Рейтинг: {review['rating']}★
-   Текст: {review['text']}
-   SKU: {review.get('sku', 'N/A')}
-"""
-    
-    prompt += f"""
+
+PROMPT_FOOTER = """
 
 ## Требования к ответам:
 1. Каждый ответ должен быть уникальным и персонализированным
@@ -120,32 +82,163 @@ def create_prompt_for_ai(reviews_file: str, policy: str) -> str:
 7. Тон: вежливый, профессиональный, сочувствующий
 
 ## Формат ответа:
-Верни JSON массив с полем "ai_reply" для каждого отзыва:
-```json
-[
-  {{"id": "...", "ai_reply": "..."}},
-  ...
-]
+JSONL: по одной строке JSON с полем "ai_reply" на каждый отзыв, по мере готовности:
+```
+{{"id": "...", "ai_reply": "..."}}
+{{"id": "...", "ai_reply": "..."}}
 ```
 
 Файл с отзывами: {reviews_file}
-Сохрани результат в файл с суффиксом "_replied.json"
+Сохрани результат в файл: {output_file}
 """
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка токенов (~3 символа кириллицы на токен), без токенизатора"""
+    return len(text) // 3 + 1
+
+def render_review(i: int, review: Dict) -> str:
+    """Блок одного отзыва в промпте"""
+    return f"""
+{i}. ID: {review['id']}
+   Рейтинг: {review['rating']}★
+   Текст: {review['text']}
+   SKU: {review.get('sku', 'N/A')}
+"""
+
+def shard_reviews(reviews: Iterable[Dict], budget: int, fixed_tokens: int = 0) -> Iterator[List[Dict]]:
+    """
+    Делит отзывы на шарды, чтобы промпт шарда укладывался в budget токенов
+    fixed_tokens — общая часть промпта (политика, требования)
+    Отзыв, который один не влезает в бюджет, идёт отдельным шардом.
+    """
+    shard, used = [], fixed_tokens
+    for review in reviews:
+        tokens = estimate_tokens(render_review(len(shard) + 1, review))
+        if shard and used + tokens > budget:
+            yield shard
+            shard, used = [], fixed_tokens
+        shard.append(review)
+        used += tokens
+    if shard:
+        yield shard
+
+def build_prompt(reviews: List[Dict], policy: str, reviews_file: str, output_file: str) -> str:
+    """Промпт для одного шарда"""
+    with span("generate"):
+        return "".join([
+            PROMPT_HEADER.format(policy=policy),
+            *(render_review(i, review) for i, review in enumerate(reviews, 1)),
+            PROMPT_FOOTER.format(reviews_file=reviews_file, output_file=output_file)
+        ])
+
+def create_prompt_for_ai(reviews_file: str, policy: str) -> str:
+    """Создает один промпт на весь файл (без шардирования)"""
+    reviews = list(iter_records(reviews_file))
+    
+    if not reviews:
+        return ""
     
-    return prompt
+    return build_prompt(reviews, policy, reviews_file, reviews_file.replace(".jsonl", "_replied.jsonl"))
 
-def main():
+def create_prompt_shards(
+    reviews: Iterable[Dict],
+    policy: str,
+    reviews_file: str,
+    token_budget: Optional[int] = None
+) -> str:
+    """
+    Пишет по промпту на шард и манифест, возвращает путь манифеста
+    Шарды генерируются независимо (параллельно), потом собираются merge_shard_replies
+    """
+    token_budget = token_budget or default_token_budget()
+    base = reviews_file[:-len(".jsonl")] if reviews_file.endswith(".jsonl") else reviews_file
+    fixed = PROMPT_HEADER.format(policy=policy) + PROMPT_FOOTER.format(reviews_file=reviews_file, output_file=base)
+    
+    shards = []
+    for n, shard in enumerate(shard_reviews(reviews, token_budget, estimate_tokens(fixed)), 1):
+        prompt_file = f"{base}_part{n}_prompt.txt"
+        output_file = f"{base}_part{n}_replied.jsonl"
+        prompt = build_prompt(shard, policy, reviews_file, output_file)
+        with open(prompt_file, "w") as f:
+            f.write(prompt)
+        shards.append({
+            "index": n,
+            "prompt": prompt_file,
+            "output": output_file,
+            "tokens": estimate_tokens(prompt),
+            "review_ids": [review["id"] for review in shard]
+        })
+    
+    manifest_file = f"{base}_manifest.json"
+    with open(manifest_file, "w") as f:
+        json.dump({
+            "reviews_file": reviews_file,
+            "replies_file": f"{base}_replied.jsonl",
+            "token_budget": token_budget,
+            "created_at": datetime.now().isoformat(),
+            "shards": shards
+        }, f, ensure_ascii=False, indent=2)
+    
+    return manifest_file
+
+def merge_shard_replies(manifest_file: str) -> Dict:
+    """
+    Собирает ответы шардов в один файл (по id отзыва, первый ответ побеждает)
+    Ответы на чужие для шарда id отбрасываются; шарды без файла считаются незавершёнными.
+    """
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    
+    stats = {"file": manifest["replies_file"], "merged": 0, "missing": [], "pending_shards": []}
+    seen = set()
+    
+    def replies() -> Iterator[Dict]:
+        for shard in manifest["shards"]:
+            if not Path(shard["output"]).exists():
+                stats["pending_shards"].append(shard["index"])
+                continue
+            expected = set(shard["review_ids"])
+            for item in iter_records(shard["output"]):
+                review_id = item.get("id")
+                if review_id in expected and review_id not in seen and item.get("ai_reply"):
+                    seen.add(review_id)
+                    yield {"id": review_id, "ai_reply": item["ai_reply"]}
+    
+    stats["merged"] = write_records(replies(), manifest["replies_file"])
+    stats["missing"] = [
+        review_id
+        for shard in manifest["shards"] if shard["index"] not in stats["pending_shards"]
+        for review_id in shard["review_ids"] if review_id not in seen
+    ]
+    return stats
+
+def main(argv: Optional[List[str]] = None):
     import argparse
     
+    load_env()
+    
     parser = argparse.ArgumentParser(description="Export Ozon reviews for AI processing")
     parser.add_argument("--limit", type=int, default=20, help="Max reviews to export")
     parser.add_argument("--dry-run", action="store_true", help="Only export, don't process")
+    parser.add_argument("--token-budget", type=int, default=default_token_budget(),
+                        help="Max tokens per prompt shard (env OZON_PROMPT_TOKENS)")
+    parser.add_argument("--merge", metavar="MANIFEST", help="Merge shard replies listed in a manifest")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     print("=== Ozon Reviews AI Generator ===\n")
     
-    # 1. Получаем отзывы
+    if args.merge:
+        stats = merge_shard_replies(args.merge)
+        print(f"✓ Merged {stats['merged']} replies to: {stats['file']}")
+        if stats["pending_shards"]:
+            print(f"⚠️  Shards without replies yet: {stats['pending_shards']}")
+        if stats["missing"]:
+            print(f"⚠️  Reviews without reply: {len(stats['missing'])}")
+        print(f"\nImport: python3 {SKILL_DIR}/scripts/ai_reply.py --import-file {stats['file']}")
+        return
+    
+    # 1. Получаем отзывы (не больше --limit)
     print("Fetching reviews from Ozon API...")
     reviews = get_reviews_from_api(limit=args.limit)
     
@@ -156,37 +249,36 @@ def main():
     print(f"Found {len(reviews)} reviews to process\n")
     
     # 2. Создаем файл
-    reviews_file = generate_ai_reviews_file(reviews)
+    reviews_file, _count = generate_ai_reviews_file(reviews)
     print(f"✓ Exported to: {reviews_file}")
     
     # 3. Загружаем политику
     policy = load_company_policy()
     
-    # 4. Создаем промпт
-    prompt = create_prompt_for_ai(reviews_file, policy)
-    
-    # 5. Сохраняем промпт
-    prompt_file = OUTPUT_DIR / f"ai_prompt_{datetime.now().strftime('%Y%m%d_%H%M')}.txt"
-    with open(prompt_file, "w") as f:
-        f.write(prompt)
+    # 4. Промпты по шардам (политика в каждом) + манифест
+    manifest_file = create_prompt_shards(reviews, policy, reviews_file, args.token_budget)
+    with open(manifest_file) as f:
+        shards = json.load(f)["shards"]
     
-    print(f"✓ Prompt saved to: {prompt_file}")
+    print(f"✓ {len(shards)} prompt shard(s), manifest: {manifest_file}")
+    for shard in shards:
+        print(f"   {shard['index']}. {len(shard['review_ids'])} reviews, ~{shard['tokens']} tokens → {shard['output']}")
     
     if args.dry_run:
         print("\n[DRY RUN] Reviews exported. AI processing skipped.")
-        print(f"\nTo process with AI, send the prompt to OpenClaw.")
+        print("\nTo process with AI, send the prompt shards to OpenClaw.")
         return
     
     # 6. Выводим инструкцию
     print("\n" + "="*60)
     print("СЛЕДУЮЩИЙ ШАГ:")
     print("="*60)
-    print(f"\n1. Отправь файл AI для генерации ответов:")
-    print(f"   {reviews_file}")
-    print(f"\n2. Или используй промпт:")
-    print(f"   {prompt_file}")
-    print(f"\n3. После получения ответов - импортируй:")
-    print(f"   python3 {SKILL_DIR}/scripts/ai_reply.py --import-file [файл]_replied.json")
+    print("\n1. Отправь промпты шардов AI (можно параллельно), ответы — в файлы output из манифеста")
+    print("\n2. Собери ответы в один файл:")
+    print(f"   python3 {SKILL_DIR}/scripts/ai_generator.py --merge {manifest_file}")
+    print("\n3. Импортируй:")
+    print(f"   python3 {SKILL_DIR}/scripts/ai_reply.py --import-file {reviews_file.replace('.jsonl', '_replied.jsonl')}")
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main
+    run_main(main)
@@ -4,46 +4,41 @@ Ozon Reviews AI - Smart Replies
 AI-генерация ответов на отзывы с учётом контекста
 """
 
-import json
-import os
 import sys
 import argparse
-import requests
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-BASE_URL = "https://api-seller.ozon.ru"
+from config import load_env
+from ozon_client import get_client
+import run_log
+from jsonl import write_records
+from llm_backend import BACKENDS, RoutingBackend, generate_replies, get_backend, template_reply
+from reply_cache import CachingBackend
+from outbox import Outbox
+from review_store import lookup_review, record_reply, record_status, synced_store, unanswered
+from sender import ReplySender, add_sender_args
+from status_updater import StatusUpdater, print_flush
 
 
-def load_env():
-    """Загружает .env"""
-    paths = [
-        Path.cwd() / ".env",
-        Path(__file__).parent.parent / ".env",
-        Path(__file__).parent.parent.parent / ".env",
-    ]
-    for env_path in paths:
-        if env_path.exists():
-            with open(env_path) as f:
-                for line in f:
-                    if line.strip() and not line.startswith("#") and "=" in line:
-                        k, v = line.strip().split("=", 1)
-                        os.environ.setdefault(k.strip(), v.strip().strip('"\''))
-            break
-
-
-def get_headers():
-    """Возвращает заголовки Ozon API"""
-    client_id = os.environ.get("OZON_CLIENT_ID")
-    api_key = os.environ.get("OZON_API_KEY")
-    if not client_id or not api_key:
-        print("Error: Missing OZON_CLIENT_ID or OZON_API_KEY")
-        sys.exit(1)
-    return {
-        "Client-Id": client_id,
-        "Api-Key": api_key,
-        "Content-Type": "application/json"
-    }
+def iter_reviews(
+    limit: int = 20,
+    status: Optional[str] = "UNPROCESSED",
+    rating_min: Optional[int] = None,
+    rating_max: Optional[int] = None
+) -> Iterator[Dict]:
+    """Отзывы по одному (из локальной базы после delta-синхронизации)"""
+    # ВАЖНО: AI обрабатывает ТОЛЬКО отзывы с текстом
+    # (без текста идут в autoreply.py)
+    return synced_store().query(
+        status=status,
+        rating_min=rating_min,
+        rating_max=rating_max,
+        has_text=True,
+        sort_dir="DESC",
+        limit=limit
+    )
 
 
 def get_reviews(
@@ -52,98 +47,45 @@ def get_reviews(
     rating_min: Optional[int] = None,
     rating_max: Optional[int] = None
 ) -> List[Dict]:
-    """Получает отзывы из Ozon"""
-    payload = {
-        "limit": max(20, min(limit, 100)),
-        "sort_dir": "DESC"
-    }
-    
-    r = requests.post(
-        f"{BASE_URL}/v1/review/list",
-        headers=get_headers(),
-        json=payload,
-        timeout=30
-    )
-    r.raise_for_status()
-    
-    reviews = r.json().get("reviews", [])
-    
-    # Фильтрация по статусу (если указан)
-    if status is not None:
-        filtered = [r for r in reviews if r.get("status") == status]
-    else:
-        filtered = reviews
-    
-    if rating_min is not None:
-        filtered = [r for r in filtered if r.get("rating", 0) >= rating_min]
-    if rating_max is not None:
-        filtered = [r for r in filtered if r.get("rating", 5) <= rating_max]
-    
-    # ВАЖНО: AI обрабатывает ТОЛЬКО отзывы с текстом
-    # (без текста идут в autoreply.py)
-    filtered = [r for r in filtered if bool(r.get("text", "").strip())]
-    
-    return filtered
+    """Получает отзывы (из локальной базы после delta-синхронизации)"""
+    return list(iter_reviews(limit, status, rating_min, rating_max))
+
+
+def export_reviews(reviews: Iterable[Dict], output: Optional[str] = None) -> Tuple[str, int]:
+    """Пишет отзывы в JSONL-файл для AI по мере чтения (поле ai_reply заполняет AI)"""
+    output = output or f"ai_reviews_{datetime.now().strftime('%Y%m%d_%H%M')}.jsonl"
+    return output, write_records(({**r, "ai_reply": ""} for r in reviews), output)
 
 
 def generate_ai_reply(review: Dict, mode: str = "auto") -> str:
-    """
-    Генерирует AI-ответ на отзыв
-    Для демо использует шаблоны, в продакшене — OpenAI API
-    """
-    rating = review.get("rating", 5)
-    text = review.get("text", "")
-    has_photos = review.get("photos_amount", 0) > 0
-    
-    # Промпт для AI (в демо — шаблоны)
-    if rating >= 5:
-        if has_photos:
-            return f"Здравствуйте! Благодарим за прекрасный отзыв и фотографии 📸 Рады, что товар оправдал ожидания! Ваши снимки помогут другим покупателям с выбором. Ждём вас снова! ⭐"
-        else:
-            return f"Здравствуйте! Спасибо за высокую оценку и доверие 🙏 Мы рады, что товар вам понравился! Будем ждать вас снова ⭐"
-    
-    elif rating == 4:
-        return f"Добрый день! Благодарим за отзыв и оценку 🌟 Рады, что покупка вам подошла! Если будут вопросы — всегда на связи. Ждём снова!"
-    
-    elif rating == 3:
-        return f"Здравствуйте! Спасибо за честный отзыв 🙏 Нам важно ваше мнение. Если есть конкретные пожелания по улучшению — напишите нам, постараемся сделать лучше!"
-    
-    else:  # 1-2 stars
-        if text and ("брак" in text.lower() or "плох" in text.lower() or "не подош" in text.lower()):
-            return f"Здравствуйте! Приносим искренние извинения за неприятный опыт 😔 Это не соответствует нашим стандартам. Пожалуйста, напишите нам в личные сообщения — мы обязательно решим вопрос: заменим товар или оформим возврат. Спасибо за ваше терпение 🙏"
-        else:
-            return f"Здравствуйте! Сожалеем, что товар не оправдал ожиданий 🙏 Пожалуйста, свяжитесь с нами — мы постараемся найти решение: подберём альтернативу или поможем с возвратом. Ваше мнение важно для нас!"
+    """Ответ по шаблону (для пачек и LLM — llm_backend.get_backend)"""
+    return template_reply(review)
 
 
 def reply_to_review(review_id: str, text: str) -> Dict:
     """Отправляет ответ на отзыв"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/comment/create",
-        headers=get_headers(),
-        json={"review_id": review_id, "text": text},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json()
+    result = get_client().create_comment(review_id, text)
+    record_reply(review_id)
+    return result
 
 
 def change_status(review_ids: List[str]) -> Dict:
     """Обновляет статус на PROCESSED"""
-    print(f"  DEBUG: Updating status for {len(review_ids)} reviews...")
-    r = requests.post(
-        f"{BASE_URL}/v1/review/change-status",
-        headers=get_headers(),
-        json={"review_ids": review_ids, "status": "PROCESSED"},
-        timeout=30
-    )
-    print(f"  DEBUG: Status API response: {r.status_code}")
-    if r.status_code != 200:
-        print(f"  DEBUG: Response body: {r.text[:200]}")
-    r.raise_for_status()
-    return r.json()
+    # Коды ответов и задержки — в метриках клиента (--metrics), ошибки — в итоге StatusUpdater
+    result = get_client().change_status(review_ids, "PROCESSED")
+    record_status(review_ids, "PROCESSED")
+    return result
+
 
+def print_queued(queued: Dict[str, int]):
+    """Итог постановки в outbox"""
+    print(f"\nQueued {queued.get('added', 0)} replies ({queued.get('skipped', 0)} already in outbox)")
+    if queued.get("quarantined"):
+        print(f"⛔ {queued['quarantined']} replies violate company policy, held in quarantine "
+              f"(python3 scripts/outbox.py --quarantine)")
 
-def main():
+
+def main(argv: Optional[List[str]] = None):
     load_env()
     
     parser = argparse.ArgumentParser(
@@ -157,8 +99,30 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="Show replies without sending")
     parser.add_argument("--confirm", action="store_true", help="Confirm each reply before sending")
     parser.add_argument("--no-status-update", action="store_true", help="Skip status update")
+    parser.add_argument("--export", action="store_true", help="Export matching reviews for AI instead of replying")
+    parser.add_argument("--output", help="Export JSONL file (default: ai_reviews_<timestamp>.jsonl)")
+    parser.add_argument("--import-file", help="Import AI replies file (same as import_replies.py FILE)")
+    parser.add_argument("--backend", choices=list(BACKENDS),
+                        help="Reply generator (default: OZON_LLM_BACKEND or template)")
+    parser.add_argument("--no-reply-cache", action="store_true",
+                        help="Generate every reply (no cache, no near-duplicate clustering)")
+    parser.add_argument("--enqueue-only", action="store_true", help="Queue replies in the outbox without sending")
+    add_sender_args(parser)
+    
+    args = parser.parse_args(argv)
     
-    args = parser.parse_args()
+    if args.import_file:
+        import import_replies
+        import_argv = [args.import_file, "--max-in-flight", str(args.max_in_flight)]
+        if args.rps:
+            import_argv += ["--rps", str(args.rps)]
+        if args.dry_run:
+            import_argv.append("--dry-run")
+        if args.enqueue_only:
+            import_argv.append("--enqueue-only")
+        if args.no_status_update:
+            import_argv.append("--no-status-update")
+        return import_replies.main(import_argv)
     
     print("=== Ozon Reviews AI ===\n")
     
@@ -166,23 +130,36 @@ def main():
         if args.review_id:
             # Single review mode
             print(f"Fetching review {args.review_id}...")
-            # Get review details (no status filter for specific ID lookup)
-            reviews = get_reviews(limit=100, status=None)
-            review = next((r for r in reviews if r["id"] == args.review_id), None)
+            # По id из базы, при промахе — адресный запрос к API
+            review = lookup_review(args.review_id)
             
             if not review:
                 print(f"Review {args.review_id} not found")
                 sys.exit(1)
             
             target_reviews = [review]
+        elif args.export:
+            # Экспорт пишется потоково, без сбора списка в памяти
+            print(f"Exporting reviews (rating: {args.rating_min or 'any'}-{args.rating_max or 'any'})...")
+            output, count = export_reviews(
+                iter_reviews(limit=args.limit, rating_min=args.rating_min, rating_max=args.rating_max),
+                args.output
+            )
+            if not count:
+                Path(output).unlink()
+                print("No reviews found matching criteria.")
+            else:
+                print(f"✓ Exported {count} reviews to: {output}")
+            return
         else:
             # Batch mode
             print(f"Fetching reviews (rating: {args.rating_min or 'any'}-{args.rating_max or 'any'})...")
-            target_reviews = get_reviews(
+            # Перепроверка в API до генерации: на отвеченные вне скриптов не тратим ни LLM, ни ответ
+            target_reviews = unanswered(get_reviews(
                 limit=args.limit,
                 rating_min=args.rating_min,
                 rating_max=args.rating_max
-            )
+            ))
         
         if not target_reviews:
             print("No reviews found matching criteria.")
@@ -190,14 +167,35 @@ def main():
         
         print(f"\nFound {len(target_reviews)} reviews\n")
         
-        # Generate AI replies
+        if args.export:
+            output, count = export_reviews(target_reviews, args.output)
+            print(f"✓ Exported {count} reviews to: {output}")
+            return
+        
+        # Generate AI replies (LLM — пачками, параллельно)
+        backend = get_backend(args.backend)
+        if backend.name != "template":
+            if not args.no_reply_cache:
+                # Одинаковые и почти одинаковые отзывы — одна генерация
+                backend = CachingBackend(backend)
+            # Простые случаи (похвала 4-5★) — шаблоном, без LLM
+            backend = RoutingBackend(backend)
+        print(f"Generating replies ({backend.name})...")
         replies = []
-        for review in target_reviews:
-            reply_text = generate_ai_reply(review)
-            replies.append({
-                "review": review,
-                "reply": reply_text
-            })
+        for item in generate_replies(target_reviews, backend):
+            if item["reply"]:
+                replies.append(item)
+            else:
+                print(f"  ⚠️  No reply generated for {item['review']['id'][:20]}..., skipped")
+        escalated = []
+        if isinstance(backend, RoutingBackend):
+            print(f"  Routing: {backend.stats}")
+            escalated = [review_id for review_id, r in backend.routes.items() if r["queue"] == "escalation"]
+            if isinstance(backend.backend, CachingBackend):
+                stats = backend.backend.stats
+                print(f"  Cache: {stats['cached']} hits, {stats['clusters']} clusters, "
+                      f"{stats['generated']} generated, {stats['reused']} reused")
+        backend.close()
         
         # Show previews
         print("=" * 60)
@@ -224,51 +222,85 @@ def main():
                 print("Cancelled.")
                 return
         
-        # Send replies
-        print(f"\nSending {len(replies)} AI-generated replies...\n")
+        # Ставим в outbox: отзывы, уже стоящие в очереди, не дублируются
+        outbox = Outbox()
+        items = ((item["review"]["id"], item["reply"], {"rating": item["review"]["rating"]}) for item in replies)
+        
+        if args.enqueue_only:
+            queued = outbox.enqueue_many(items, source="ai_reply")
+            print_queued(queued)
+            print("Deliver with: python3 scripts/outbox.py --drain")
+            return
+        
+        # Send replies: уходят только ответы этого прогона; старая очередь и зависшие sending
+        # других процессов не трогаются (outbox.py --drain / --recover)
+        print(f"\nSending up to {len(replies)} replies...\n")
+        queued = {}
         success_count = 0
         replied_ids = []
+        results = []
         
-        for i, item in enumerate(replies, 1):
-            review = item["review"]
-            reply_text = item["reply"]
-            
-            print(f"[{i}/{len(replies)}] {review['id'][:20]}... [{review['rating']}★]")
+        sender = ReplySender(rps=args.rps, max_in_flight=args.max_in_flight, send_func=reply_to_review)
+        
+        # Статус обновляется пачками прямо во время отправки
+        status = None if args.no_status_update else StatusUpdater(
+            change_func=lambda ids, _status: change_status(ids), on_flush=print_flush
+        )
+        
+        for i, result in enumerate(outbox.drain(sender, jobs=outbox.stream(items, "ai_reply", queued)), 1):
+            results.append(result)
+            print(f"[{i}/{len(replies)}] {result['review_id'][:20]}... [{result.get('rating', '?')}★]")
             
-            try:
-                result = reply_to_review(review["id"], reply_text)
-                print(f"  ✓ Sent! Comment ID: {result.get('comment_id', 'unknown')[:20]}...")
+            if result["status"] == "success":
+                print(f"  ✓ Sent! Comment ID: {result['comment_id'][:20]}...")
                 success_count += 1
-                replied_ids.append(review["id"])
-            except Exception as e:
-                print(f"  ✗ Error: {e}")
+                replied_ids.append(result["review_id"])
+                if status:
+                    status.add(result["review_id"])
+            else:
+                print(f"  ✗ Error: {result['error']}")
+        
+        print_queued(queued)
+        leftover = outbox.counts()
+        if leftover["pending"] or leftover["sending"]:
+            print(f"ℹ️  Outbox still holds {leftover['pending']} pending and {leftover['sending']} unconfirmed "
+                  f"replies from other runs: python3 scripts/outbox.py --drain")
         
-        # Update status
+        # Дожидаемся последних пачек статуса
         status_updated = False
-        if replied_ids and not args.no_status_update:
-            print(f"\nUpdating status to PROCESSED for {len(replied_ids)} reviews...")
-            try:
-                result = change_status(replied_ids)
-                print(f"✓ Status updated successfully! API response: {result}")
-                status_updated = True
-            except Exception as e:
-                print(f"✗ Status update error: {e}")
-                print(f"  ⚠️  WARNING: {len(replied_ids)} reviews replied but status not updated!")
-                print(f"  Run manually: python3 {__file__} --update-status-only")
+        if status:
+            status.close()
+            status_updated = bool(replied_ids) and not status.failed
+            if status.failed:
+                print(f"\n✗ Status update error for {len(status.failed)} reviews:")
+                for review_id, error in list(status.failed.items())[:10]:
+                    print(f"  {review_id[:20]}...: {error}")
+                print(f"  ⚠️  WARNING: {len(status.failed)} reviews replied but status not updated!")
+                print("  Run manually: python3 scripts/mark_processed.py")
+            elif replied_ids:
+                print(f"\n✓ Status updated for {len(status.updated)} reviews")
         
         # Save log
         log_data = {
-            "timestamp": str(Path.cwd() / "autoreply_log.json"),
+            "script": "ai_reply",
+            "timestamp": datetime.now().isoformat(),
             "mode": "live",
-            "total_processed": len(replies),
+            "total_processed": len(results),
+            "queued": queued.get("added", 0),
+            "quarantined": queued.get("quarantined", 0),
+            "escalated_ids": escalated,
             "replied": success_count,
+            "errors": len(results) - success_count,
             "status_updated": status_updated,
-            "replied_ids": replied_ids
+            "status_failed": status.failed if status else {},
+            "replied_ids": replied_ids,
+            "reviews": results
         }
+        run_log.append(log_data)
         
         # Summary
         print(f"\n{'='*60}")
-        print(f"Done! Replied to {success_count}/{len(replies)} reviews")
+        print(f"Done! Replied to {success_count}/{len(results)} reviews")
         
     except Exception as e:
         print(f"Error: {e}")
@@ -276,4 +308,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main
+    run_main(main)
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Archive
+Колоночный архив отзывов за годы для аналитики (env OZON_ARCHIVE_DIR):
+- колонки фиксированной ширины: время, sku, рейтинг, флаги; тексты и id — блоб + смещения
+- файлы открываются через mmap и читаются без копирования (numpy.frombuffer, без numpy — memoryview)
+- строки разбиты на страницы; по каждой странице — мин/макс времени, по каждому SKU — список страниц,
+  поэтому «1–2★ по SKU X за март» читает только нужные страницы
+- дозапись инкрементальная из локальной базы (тот же путь, что у reviews.get_reviews)
+Писатель один (cron/daemon); читатели видят только закоммиченные строки (meta.json).
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import DATA_DIR
+from records import format_time, parse_time
+
+DEFAULT_DIR = DATA_DIR / "archive"
+VERSION = 1
+
+# Строк на странице: страница — единица чтения при запросе
+PAGE_ROWS = 4096
+
+# Колонка → тип array (родной порядок байт, фиксируется в meta.json)
+COLUMNS = {
+    "ts": "q",          # published_at, секунды epoch UTC
+    "sku": "q",
+    "rating": "B",
+    "flags": "B",
+    "text_end": "Q",    # конец текста строки в text.bin (начало — конец предыдущей)
+    "id_end": "Q",      # конец id строки в id.bin
+}
+BLOBS = {"text": "text_end", "id": "id_end"}
+
+FLAG_TEXT = 1
+FLAG_PHOTO = 2
+FLAG_VIDEO = 4
+FLAG_RATING_PARTICIPANT = 8
+
+_numpy = None
+
+
+def _np():
+    """numpy, если установлен (импорт лениво: без него архив работает на memoryview)"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def flags_of(review: Dict) -> int:
+    flags = 0
+    if (review.get("text") or "").strip():
+        flags |= FLAG_TEXT
+    if review.get("photos_amount"):
+        flags |= FLAG_PHOTO
+    if review.get("videos_amount"):
+        flags |= FLAG_VIDEO
+    if review.get("is_rating_participant"):
+        flags |= FLAG_RATING_PARTICIPANT
+    return flags
+
+
+def parse_day(value: str) -> int:
+    """YYYY-MM-DD (или полная ISO-дата) → секунды epoch UTC"""
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return int(when.timestamp())
+
+
+def month_range(value: str) -> Tuple[int, int]:
+    """YYYY-MM → [начало месяца, начало следующего) в секундах epoch UTC"""
+    year, month = map(int, value.split("-"))
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+class ReviewArchive:
+    """Архив в папке: файлы колонок, блобы, meta.json (число строк, страницы, индекс SKU)"""
+
+    def __init__(self, path: Optional[str] = None, page_rows: int = PAGE_ROWS):
+        self.path = Path(path or os.environ.get("OZON_ARCHIVE_DIR") or DEFAULT_DIR)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._maps: Dict[str, mmap.mmap] = {}
+        self.meta = self._load_meta(page_rows)
+
+    def _load_meta(self, page_rows: int) -> Dict:
+        meta_path = self.path / "meta.json"
+        if not meta_path.exists():
+            return {
+                "version": VERSION,
+                "byteorder": sys.byteorder,
+                "page_rows": page_rows,
+                "rows": 0,
+                "text_bytes": 0,
+                "id_bytes": 0,
+                "store_rowid": 0,
+                "pages": [],
+                "sku_pages": {},
+            }
+        meta = json.loads(meta_path.read_text())
+        if meta.get("version") != VERSION:
+            raise ValueError(f"Unsupported archive version: {meta.get('version')}")
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Archive written on a {meta['byteorder']}-endian machine")
+        return meta
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    def close(self):
+        for mm in self._maps.values():
+            try:
+                mm.close()
+            except BufferError:
+                # На отображение ещё ссылаются выданные колонки — освободится вместе с ними
+                pass
+        self._maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- запись ---
+
+    def _file(self, name: str) -> Path:
+        return self.path / (f"{name}.bin" if name in BLOBS else f"{name}.col")
+
+    def append(self, reviews: Iterable[Dict], store_rowid: Optional[int] = None) -> int:
+        """
+        Дописывает отзывы в конец архива, возвращает число строк
+        Файлы сначала обрезаются до закоммиченного размера (хвост прерванной записи),
+        коммит — атомарная замена meta.json.
+        """
+        columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        blobs = {name: bytearray() for name in BLOBS}
+        ends = {"text": self.meta["text_bytes"], "id": self.meta["id_bytes"]}
+
+        for review in reviews:
+            columns["ts"].append(int(parse_time(review.get("published_at"))))
+            columns["sku"].append(review.get("sku") or 0)
+            columns["rating"].append(review.get("rating") or 0)
+            columns["flags"].append(flags_of(review))
+            for name, value in (("text", review.get("text") or ""), ("id", review["id"])):
+                data = value.encode("utf-8")
+                blobs[name] += data
+                ends[name] += len(data)
+                columns[BLOBS[name]].append(ends[name])
+
+        added = len(columns["ts"])
+        if added:
+            self.close()
+            self._truncate()
+            for name, column in columns.items():
+                with open(self._file(name), "ab") as f:
+                    column.tofile(f)
+            for name, blob in blobs.items():
+                with open(self._file(name), "ab") as f:
+                    f.write(blob)
+            self._index(columns["ts"], columns["sku"])
+            self.meta["rows"] += added
+            self.meta["text_bytes"], self.meta["id_bytes"] = ends["text"], ends["id"]
+        if store_rowid is not None:
+            self.meta["store_rowid"] = store_rowid
+        if added or store_rowid is not None:
+            self._commit()
+        return added
+
+    def _truncate(self):
+        for name, typecode in COLUMNS.items():
+            self._truncate_file(self._file(name), self.rows * array(typecode).itemsize)
+        self._truncate_file(self._file("text"), self.meta["text_bytes"])
+        self._truncate_file(self._file("id"), self.meta["id_bytes"])
+
+    @staticmethod
+    def _truncate_file(path: Path, size: int):
+        if path.exists() and path.stat().st_size != size:
+            os.truncate(path, size)
+        elif not path.exists():
+            path.touch()
+
+    def _index(self, ts: array, skus: array):
+        """Мин/макс времени страниц и страницы каждого SKU для новых строк"""
+        page_rows, pages, sku_pages = self.meta["page_rows"], self.meta["pages"], self.meta["sku_pages"]
+        for offset, (when, sku) in enumerate(zip(ts, skus)):
+            page = (self.rows + offset) // page_rows
+            if page == len(pages):
+                pages.append([when, when])
+            else:
+                bounds = pages[page]
+                bounds[0] = min(bounds[0], when)
+                bounds[1] = max(bounds[1], when)
+            sku_list = sku_pages.setdefault(str(sku), [])
+            if not sku_list or sku_list[-1] != page:
+                sku_list.append(page)
+
+    def _commit(self):
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(self.meta, separators=(",", ":")))
+        os.replace(tmp, self.path / "meta.json")
+
+    def sync(self, store, chunk: int = 5000) -> int:
+        """Дописывает отзывы, появившиеся в базе после прошлой выгрузки (по rowid базы)"""
+        added = 0
+        batch, last = [], self.meta["store_rowid"]
+        for rowid, review in store.iter_appended(last):
+            batch.append(review)
+            last = rowid
+            if len(batch) >= chunk:
+                added += self.append(batch, last)
+                batch = []
+        added += self.append(batch, last)
+        return added
+
+    # --- чтение ---
+
+    def _map(self, name: str) -> Optional[mmap.mmap]:
+        mm = self._maps.get(name)
+        if mm is None:
+            path = self._file(name)
+            if not path.exists() or path.stat().st_size == 0:
+                return None
+            with open(path, "rb") as f:
+                mm = self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mm
+
+    def column(self, name: str):
+        """
+        Колонка целиком без копирования: numpy-массив поверх mmap, без numpy — memoryview
+        Длина — число закоммиченных строк.
+        """
+        typecode = COLUMNS[name]
+        mm = self._map(name)
+        np = _np()
+        if np is not None:
+            if mm is None:
+                return np.zeros(0, dtype=np.dtype(typecode))
+            return np.frombuffer(mm, dtype=np.dtype(typecode), count=self.rows)
+        if mm is None:
+            return memoryview(b"").cast(typecode)
+        return memoryview(mm)[:self.rows * array(typecode).itemsize].cast(typecode)
+
+    def _blob(self, name: str, i: int) -> str:
+        ends = self.column(BLOBS[name])
+        start = int(ends[i - 1]) if i else 0
+        return self._map(name)[start:int(ends[i])].decode("utf-8")
+
+    def text(self, i: int) -> str:
+        return self._blob("text", i)
+
+    def review_id(self, i: int) -> str:
+        return self._blob("id", i)
+
+    def row(self, i: int) -> Dict:
+        ts = int(self.column("ts")[i])
+        flags = int(self.column("flags")[i])
+        return {
+            "id": self.review_id(i),
+            "sku": int(self.column("sku")[i]),
+            "rating": int(self.column("rating")[i]),
+            "text": self.text(i),
+            "published_at": format_time(ts),
+            "has_photo": bool(flags & FLAG_PHOTO),
+            "has_video": bool(flags & FLAG_VIDEO),
+        }
+
+    def pages_for(self, sku: Optional[int] = None, since: Optional[int] = None, until: Optional[int] = None) -> List[int]:
+        """Страницы, где могут быть строки: по индексу SKU и мин/макс времени страниц"""
+        pages = self.meta["pages"]
+        candidates = self.meta["sku_pages"].get(str(sku), []) if sku is not None else range(len(pages))
+        return [
+            p for p in candidates
+            if (since is None or pages[p][1] >= since) and (until is None or pages[p][0] < until)
+        ]
+
+    def query(
+        self,
+        sku: Optional[int] = None,
+        rating_min: Optional[int] = None,
+        rating_max: Optional[int] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        flags: int = 0
+    ) -> List[int]:
+        """
+        Номера строк по фильтрам (since включительно, until — нет; flags — все указанные биты)
+        Читаются только страницы из pages_for(); с numpy страница фильтруется векторно.
+        """
+        page_rows = self.meta["page_rows"]
+        cols = {name: self.column(name) for name in ("ts", "sku", "rating", "flags")}
+        np = _np()
+        result: List[int] = []
+        for page in self.pages_for(sku, since, until):
+            start = page * page_rows
+            end = min(start + page_rows, self.rows)
+            ts, skus, ratings, row_flags = (cols[name][start:end] for name in ("ts", "sku", "rating", "flags"))
+            if np is not None:
+                mask = np.ones(end - start, dtype=bool)
+                if sku is not None:
+                    mask &= skus == sku
+                if rating_min is not None:
+                    mask &= ratings >= rating_min
+                if rating_max is not None:
+                    mask &= ratings <= rating_max
+                if since is not None:
+                    mask &= ts >= since
+                if until is not None:
+                    mask &= ts < until
+                if flags:
+                    mask &= (row_flags & flags) == flags
+                result.extend((np.flatnonzero(mask) + start).tolist())
+                continue
+            low = 0 if rating_min is None else rating_min
+            high = 255 if rating_max is None else rating_max
+            for i, (when, row_sku, rating, row_flag) in enumerate(zip(ts, skus, ratings, row_flags), start):
+                if ((sku is None or row_sku == sku) and low <= rating <= high
+                        and (since is None or when >= since) and (until is None or when < until)
+                        and row_flag & flags == flags):
+                    result.append(i)
+        return result
+
+    def stats(self) -> Dict:
+        pages = self.meta["pages"]
+        sizes = sum(self._file(name).stat().st_size for name in (*COLUMNS, *BLOBS) if self._file(name).exists())
+        return {
+            "dir": str(self.path),
+            "rows": self.rows,
+            "pages": len(pages),
+            "skus": len(self.meta["sku_pages"]),
+            "from": datetime.fromtimestamp(min(p[0] for p in pages), timezone.utc).isoformat() if pages else None,
+            "to": datetime.fromtimestamp(max(p[1] for p in pages), timezone.utc).isoformat() if pages else None,
+            "size_mb": round(sizes / 1024 / 1024, 2),
+            "numpy": _np() is not None,
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    from config import load_env
+
+    load_env()
+
+    parser = argparse.ArgumentParser(description="Columnar Ozon reviews archive for historical analytics")
+    parser.add_argument("--dir", help="Archive directory (default: env OZON_ARCHIVE_DIR or tmp_files/.../archive)")
+    parser.add_argument("--no-sync", action="store_true", help="Archive what is in the local store without API sync")
+    parser.add_argument("--full", action="store_true", help="Full store resync before archiving")
+    parser.add_argument("--sku", type=int, help="Query: only this SKU")
+    parser.add_argument("--rating-min", type=int, help="Query: min rating (1-5)")
+    parser.add_argument("--rating-max", type=int, help="Query: max rating (1-5)")
+    parser.add_argument("--month", help="Query: month YYYY-MM (UTC)")
+    parser.add_argument("--since", help="Query: from date YYYY-MM-DD (UTC, inclusive)")
+    parser.add_argument("--until", help="Query: to date YYYY-MM-DD (UTC, exclusive)")
+    parser.add_argument("--with-text", action="store_true", help="Query: only reviews with text")
+    parser.add_argument("--limit", type=int, default=20, help="Query: max rows to print")
+    parser.add_argument("--json", action="store_true", help="Output as JSON")
+
+    args = parser.parse_args(argv)
+
+    querying = any(v is not None for v in (args.sku, args.rating_min, args.rating_max, args.month,
+                                          args.since, args.until)) or args.with_text
+    try:
+        with ReviewArchive(args.dir) as archive:
+            if querying:
+                since = parse_day(args.since) if args.since else None
+                until = parse_day(args.until) if args.until else None
+                if args.month:
+                    since, until = month_range(args.month)
+                _np()  # импорт numpy не входит во время запроса
+                started = time.perf_counter()
+                pages = archive.pages_for(args.sku, since, until)
+                found = archive.query(args.sku, args.rating_min, args.rating_max, since, until,
+                                      FLAG_TEXT if args.with_text else 0)
+                ms = (time.perf_counter() - started) * 1000
+                rows = [archive.row(i) for i in found[:args.limit]]
+                if args.json:
+                    print(json.dumps({"total": len(found), "pages_scanned": len(pages), "ms": round(ms, 2),
+                                      "reviews": rows}, ensure_ascii=False, indent=2))
+                else:
+                    print(f"Found {len(found)} reviews ({len(pages)}/{len(archive.meta['pages'])} pages, {ms:.1f} ms)")
+                    for r in rows:
+                        text = r["text"] or "(no text)"
+                        print(f"  [{r['rating']}★] {r['published_at'][:10]} SKU {r['sku']} {r['id']}: "
+                              f"{text[:100]}{'...' if len(text) > 100 else ''}")
+                return
+
+            from review_store import get_store, synced_store
+            store = get_store() if args.no_sync else synced_store(full=args.full)
+            added = archive.sync(store)
+            stats = {**archive.stats(), "added": added}
+            if args.json:
+                print(json.dumps(stats, ensure_ascii=False, indent=2))
+            else:
+                print(f"Archive: {stats['dir']}")
+                print(f"Added: {added}, total: {stats['rows']} reviews, {stats['pages']} pages, "
+                      f"{stats['skus']} SKUs, {stats['size_mb']} MB")
+                if stats["from"]:
+                    print(f"Period: {stats['from'][:10]} — {stats['to'][:10]}")
+    except Exception as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    from profiling import run_main
+    run_main(main)
@@ -8,17 +8,20 @@ Ozon 5-Star Auto-Reply v2
 """
 
 import json
-import os
 import sys
-import time
 import random
 import argparse
 from datetime import datetime
-from pathlib import Path
 from typing import List, Dict, Optional
-import requests
 
-BASE_URL = "https://api-seller.ozon.ru"
+from config import load_env
+from metrics import add_metrics_args, export_metrics
+from ozon_client import get_client
+import run_log
+from review_store import record_reply, record_status, synced_store, unanswered
+from sender import ReplySender, add_sender_args
+from status_updater import StatusUpdater, print_flush
+
 
 # Шаблоны для отзывов без фото
 TEMPLATES_TEXT = [
@@ -41,77 +44,28 @@ TEMPLATES_PHOTOS = [
 ]
 
 
-def load_env():
-    """Загружает .env из разных мест"""
-    paths = [
-        Path.cwd() / ".env",
-        Path(__file__).parent.parent / ".env",
-        Path(__file__).parent.parent.parent / ".env",
-    ]
-    for env_path in paths:
-        if env_path.exists():
-            with open(env_path) as f:
-                for line in f:
-                    if line.strip() and not line.startswith("#") and "=" in line:
-                        k, v = line.strip().split("=", 1)
-                        os.environ.setdefault(k.strip(), v.strip().strip('"\''))
-            break
-
-
-def get_headers():
-    """Возвращает заголовки для API"""
-    client_id = os.environ.get("OZON_CLIENT_ID")
-    api_key = os.environ.get("OZON_API_KEY")
-    if not client_id or not api_key:
-        print(json.dumps({"error": "Missing OZON_CLIENT_ID or OZON_API_KEY"}, ensure_ascii=False))
-        sys.exit(1)
-    return {
-        "Client-Id": client_id,
-        "Api-Key": api_key,
-        "Content-Type": "application/json"
-    }
-
-
 def get_5star_reviews(limit: int = 100, include_with_text: bool = False) -> List[Dict]:
     """
     Получает 5★ отзывы для авто-ответа
     - Без текста (любые)
     - С фото (даже с текстом)
     Сортировка: от новых к старым (DESC)
+    Отзывы берутся из локальной базы после delta-синхронизации и перепроверяются в API:
+    строка в базе могла устареть (ответ или смена статуса вне скриптов)
     """
-    payload = {
-        "limit": max(20, min(limit, 100)),
-        "sort_dir": "DESC"  # От новых к старым
-    }
-    
-    r = requests.post(
-        f"{BASE_URL}/v1/review/list",
-        headers=get_headers(),
-        json=payload,
-        timeout=30
-    )
-    r.raise_for_status()
-    
-    reviews = r.json().get("reviews", [])
-    
-    filtered = []
-    for review in reviews:
-        # Только 5★ и UNPROCESSED
-        if review.get("rating") != 5 or review.get("status") != "UNPROCESSED":
-            continue
-        
-        has_photos = review.get("photos_amount", 0) > 0
-        has_text = bool(review.get("text", "").strip())
-        
-        # Логика:
-        # 1) 5★ + UNPROCESSED + без текста + без фото → шаблоны
-        # 2) 5★ + UNPROCESSED + без текста + с фото → шаблоны (с фото)
-        # 3) 5★ с текстом → AI (ai_reply.py)
-        # Важно: если есть текст — пропускаем (пусть AI обрабатывает)
-        if not has_text:
-            filtered.append(review)
-    
-    return filtered
+    # Логика:
+    # 1) 5★ + UNPROCESSED + без текста + без фото → шаблоны
+    # 2) 5★ + UNPROCESSED + без текста + с фото → шаблоны (с фото)
+    # 3) 5★ с текстом → AI (ai_reply.py)
+    # Важно: если есть текст — пропускаем (пусть AI обрабатывает)
+    return unanswered(synced_store().query(
+        status="UNPROCESSED",
+        rating_min=5,
+        rating_max=5,
+        has_text=False,
+        sort_dir="DESC",  # От новых к старым
+        limit=limit
+    ))
 
 
 def get_template(review: Dict) -> str:
@@ -124,51 +78,24 @@ def get_template(review: Dict) -> str:
 
 def reply_to_review(review_id: str, text: str) -> Dict:
     """Отправляет ответ на отзыв"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/comment/create",
-        headers=get_headers(),
-        json={"review_id": review_id, "text": text},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json()
+    result = get_client().create_comment(review_id, text)
+    record_reply(review_id)
+    return result
 
 
 def change_status(review_ids: List[str], status: str = "PROCESSED") -> Dict:
     """Обновляет статус отзывов ⚠️ ОБЯЗАТЕЛЬНО"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/change-status",
-        headers=get_headers(),
-        json={"review_ids": review_ids, "status": status},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json()
+    result = get_client().change_status(review_ids, status)
+    record_status(review_ids, status)
+    return result
 
 
 def save_log(log_data: Dict):
-    """Сохраняет лог в JSON"""
-    # Директория для логов
-    log_dir = Path("/home/firstvds/.openclaw/workspace/tmp_files/ozon-reviews-workflow")
-    log_dir.mkdir(parents=True, exist_ok=True)
-    
-    log_file = log_dir / "autoreply_log.json"
-    
-    logs = []
-    if log_file.exists():
-        try:
-            with open(log_file) as f:
-                logs = json.load(f)
-        except:
-            logs = []
-    
-    logs.append(log_data)
-    
-    with open(log_file, "w") as f:
-        json.dump(logs, f, ensure_ascii=False, indent=2)
+    """Дописывает запись в журнал прогонов (JSONL)"""
+    return run_log.append({"script": "autoreply", **log_data})
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     load_env()
     
     parser = argparse.ArgumentParser(description="Ozon 5-Star Auto-Reply v2")
@@ -176,13 +103,16 @@ def main():
                         help="Test mode - don't actually send replies")
     parser.add_argument("--limit", type=int, default=100,
                         help="Max reviews to process (default: 100)")
-    parser.add_argument("--delay", type=float, default=1.5,
-                        help="Delay between requests in seconds (default: 1.5)")
+    parser.add_argument("--delay", type=float,
+                        help="Deprecated: same as --rps 1/DELAY")
+    add_sender_args(parser)
     parser.add_argument("--no-status-update", action="store_true",
                         help="Skip status update to PROCESSED (not recommended)")
     parser.add_argument("--json", action="store_true", help="Output results as JSON")
+    add_metrics_args(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    import requests
     
     mode = "DRY RUN" if args.dry_run else "LIVE"
     print(f"=== Ozon 5-Star Auto-Reply v2 [{mode}] ===\n")
@@ -239,65 +169,56 @@ def main():
         error_count = 0
         replied_ids = []
         
-        for i, review in enumerate(reviews, 1):
-            review_id = review["id"]
-            sku = review["sku"]
-            template = get_template(review)
-            has_photos = review.get("photos_amount", 0) > 0
-            
-            photo_badge = " 📸" if has_photos else ""
+        rps = 1 / args.delay if args.delay else args.rps
+        print(f"Sending: {f'up to {rps:.2f} req/s' if rps else 'adaptive rate'}, {args.max_in_flight} in flight\n")
+        
+        jobs = (
+            {
+                "review_id": review["id"],
+                "sku": review["sku"],
+                "has_photos": review.get("photos_amount", 0) > 0,
+                "photos_amount": review.get("photos_amount", 0),
+                "has_text": bool(review.get("text", "").strip()),
+                "template_used": template,
+                "text": template
+            }
+            for review in reviews
+            for template in [get_template(review)]
+        )
+        sender = ReplySender(rps=rps, max_in_flight=args.max_in_flight, send_func=reply_to_review)
+        # Статус обновляется пачками прямо во время отправки ⚠️ ОБЯЗАТЕЛЬНО
+        status = None if args.no_status_update else StatusUpdater(change_func=change_status, on_flush=print_flush)
+        
+        for i, result in enumerate(sender.send(jobs), 1):
+            result.pop("text")
+            review_id = result["review_id"]
+            photo_badge = " 📸" if result["has_photos"] else ""
             
-            print(f"[{i}/{len(reviews)}] Replying to review {review_id[:20]}... (SKU: {sku}){photo_badge}")
-            if has_photos:
-                print(f"  Photos: {review['photos_amount']}")
-            print(f"  Template: {template[:50]}...")
+            print(f"[{i}/{len(reviews)}] Review {review_id[:20]}... (SKU: {result['sku']}){photo_badge}")
+            print(f"  Template: {result['template_used'][:50]}...")
             
-            try:
-                result = reply_to_review(review_id, template)
-                comment_id = result.get("comment_id", "unknown")
-                print(f"  ✓ Sent! Comment ID: {comment_id[:20]}...")
-                
-                results.append({
-                    "review_id": review_id,
-                    "sku": sku,
-                    "has_photos": has_photos,
-                    "photos_amount": review.get("photos_amount", 0),
-                    "has_text": bool(review.get("text", "").strip()),
-                    "template_used": template,
-                    "comment_id": comment_id,
-                    "status": "success"
-                })
+            if result["status"] == "success":
+                print(f"  ✓ Sent! Comment ID: {result['comment_id'][:20]}...")
                 replied_ids.append(review_id)
                 success_count += 1
-                
-            except Exception as e:
-                print(f"  ✗ Error: {e}")
-                results.append({
-                    "review_id": review_id,
-                    "sku": sku,
-                    "has_photos": has_photos,
-                    "photos_amount": review.get("photos_amount", 0),
-                    "has_text": bool(review.get("text", "").strip()),
-                    "template_used": template,
-                    "error": str(e),
-                    "status": "error"
-                })
+                if status:
+                    status.add(review_id)
+            else:
+                print(f"  ✗ Error: {result['error']}")
                 error_count += 1
-            
-            # Delay between requests
-            if i < len(reviews):
-                time.sleep(args.delay)
+            results.append(result)
         
-        # Update status to PROCESSED ⚠️ ОБЯЗАТЕЛЬНО
-        if replied_ids and not args.no_status_update:
+        # Дожидаемся последних пачек статуса
+        status_failed = {}
+        if status:
             print(f"\n{'='*50}")
-            print(f"Updating status to PROCESSED for {len(replied_ids)} reviews...")
-            try:
-                change_status(replied_ids, "PROCESSED")
-                print(f"✓ Status updated!")
-            except Exception as e:
-                print(f"✗ Status update error: {e}")
-                print(f"⚠️  Run: python3 ../../ozon-reviews/scripts/mark_processed.py")
+            print("Flushing status updates...")
+            status_failed = status.close().failed
+            if status_failed:
+                print(f"✗ Status not updated for {len(status_failed)} reviews")
+                print("⚠️  Run: python3 scripts/mark_processed.py")
+            else:
+                print("✓ Status updated!")
         
         # Summary
         print(f"\n{'='*50}")
@@ -307,8 +228,8 @@ def main():
         print(f"  📸 With photos: {with_photos}")
         print(f"  📄 Without photos: {without_photos}")
         
-        if not args.no_status_update and replied_ids:
-            print(f"  ✓ Status updated to PROCESSED")
+        if status and replied_ids:
+            print(f"  ✓ Status updated to PROCESSED: {len(status.updated)}/{len(replied_ids)}")
         
         # Save log
         log_data = {
@@ -319,11 +240,12 @@ def main():
             "errors": error_count,
             "with_photos": with_photos,
             "without_photos": without_photos,
-            "status_updated": not args.no_status_update and len(replied_ids) > 0,
+            "status_updated": bool(status and replied_ids and not status_failed),
+            "status_failed": status_failed,
             "reviews": results
         }
-        save_log(log_data)
-        print(f"\nLog saved to autoreply_log.json")
+        log_file = save_log(log_data)
+        print(f"\nLog saved to {log_file}")
         
         if args.json:
             print(json.dumps(log_data, ensure_ascii=False, indent=2))
@@ -334,7 +256,10 @@ def main():
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
+    finally:
+        export_metrics(args.metrics)
 
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main
+    run_main(main)
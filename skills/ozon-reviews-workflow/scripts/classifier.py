@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Classifier
+Быстрая локальная классификация отзывов (несколько меток на отзыв):
+defect, packaging, usage, sizing, praise
+- все ключевые основы собраны в один автомат Aho-Corasick (один проход по тексту)
+- оценка — мешок слов: счётчики совпадений × матрица весов основа → метка,
+  пачка отзывов считается целиком
+- route() по меткам и рейтингу выбирает очередь: шаблон, LLM или эскалация
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from policy_check import AhoCorasick, normalize
+
+LABELS = ("defect", "packaging", "usage", "sizing", "praise")
+
+# Основа → {метка: вес}; отрицательный вес гасит ложные срабатывания («не понравилось»)
+KEYWORDS: Dict[str, Dict[str, float]] = {
+    # defect
+    "брак": {"defect": 1.5},
+    "дефект": {"defect": 1.5},
+    "сломал": {"defect": 1.0},
+    "сломан": {"defect": 1.0},
+    "не работа": {"defect": 1.5},
+    "протек": {"defect": 1.0},
+    "трещин": {"defect": 1.0},
+    "испорч": {"defect": 1.0},
+    "просроч": {"defect": 1.5},
+    "подделк": {"defect": 1.5},
+    "аллерг": {"defect": 1.0},
+    "раздражен": {"defect": 1.0},
+    "плох": {"defect": 0.5, "praise": -1.0},
+    # packaging / delivery
+    "упаковк": {"packaging": 1.0},
+    "коробк": {"packaging": 0.5},
+    "доставк": {"packaging": 1.0},
+    "курьер": {"packaging": 1.0},
+    "помят": {"packaging": 1.0},
+    "разбит": {"packaging": 1.0, "defect": 0.5},
+    "вскрыт": {"packaging": 1.0},
+    "пвз": {"packaging": 1.0},
+    "пункт выдачи": {"packaging": 1.0},
+    "пришел": {"packaging": 0.5},
+    "пришла": {"packaging": 0.5},
+    # usage question
+    "как пользоват": {"usage": 1.5},
+    "как применя": {"usage": 1.5},
+    "как наносить": {"usage": 1.5},
+    "подскажите": {"usage": 1.0},
+    "инструкц": {"usage": 1.0},
+    "не понятно": {"usage": 1.0},
+    "непонятно": {"usage": 1.0},
+    "?": {"usage": 0.5},
+    # sizing
+    "размер": {"sizing": 1.0},
+    "маломер": {"sizing": 1.5},
+    "большемер": {"sizing": 1.5},
+    "маленьк": {"sizing": 0.5},
+    "объем": {"sizing": 0.5},
+    "не подош": {"sizing": 1.0, "praise": -1.0},
+    # praise
+    "отличн": {"praise": 1.0},
+    "супер": {"praise": 1.0},
+    "прекрасн": {"praise": 1.0},
+    "понрав": {"praise": 1.0},
+    "не понрав": {"praise": -2.0, "defect": 0.5},
+    "рекоменд": {"praise": 1.0},
+    "не рекоменд": {"praise": -2.0},
+    "спасибо": {"praise": 0.5},
+    "люблю": {"praise": 1.0},
+    "класс": {"praise": 1.0},
+    "лучш": {"praise": 0.5},
+    "доволь": {"praise": 1.0},
+}
+
+THRESHOLD = 1.0
+
+
+class ReviewClassifier:
+    """Мультиметочный классификатор по ключевым основам"""
+
+    def __init__(self, keywords: Optional[Dict[str, Dict[str, float]]] = None, threshold: float = THRESHOLD):
+        keywords = KEYWORDS if keywords is None else keywords
+        self.automaton = AhoCorasick(keywords)
+        self.threshold = threshold
+        # Матрица весов в разреженном виде: основа → [(индекс метки, вес)]
+        self.weights = {
+            stem: [(LABELS.index(label), w) for label, w in labels.items()]
+            for stem, labels in keywords.items()
+        }
+
+    def counts(self, text: str) -> Counter:
+        """Мешок основ: сколько раз встретилась каждая основа"""
+        found, node = Counter(), 0
+        goto, fail, out = self.automaton.goto, self.automaton.fail, self.automaton.out
+        for ch in normalize(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for stem in out[node]:
+                found[stem] += 1
+        return found
+
+    def score_batch(self, reviews: List[Dict]) -> List[List[float]]:
+        """Матрица оценок отзывы × метки (counts · weights), рейтинг как априорный сдвиг"""
+        scores = [[0.0] * len(LABELS) for _ in reviews]
+        for row, review in zip(scores, reviews):
+            for stem, n in self.counts(review.get("text") or "").items():
+                for j, w in self.weights[stem]:
+                    row[j] += n * w
+            rating = review.get("rating") or 0
+            if rating >= 4:
+                row[LABELS.index("praise")] += 0.5
+            elif rating and rating <= 2:
+                row[LABELS.index("praise")] -= 1.0
+        return scores
+
+    def classify_batch(self, reviews: List[Dict]) -> List[List[str]]:
+        """Метки для каждого отзыва пачки"""
+        return [
+            [label for label, score in zip(LABELS, row) if score >= self.threshold]
+            for row in self.score_batch(reviews)
+        ]
+
+    def classify(self, review: Dict) -> List[str]:
+        return self.classify_batch([review])[0]
+
+
+def route(labels: List[str], rating: int, has_text: bool = True) -> Dict:
+    """
+    Очередь по меткам и рейтингу
+    - escalation: брак/повреждение при 1-3★ — первыми, с особыми инструкциями
+    - llm: вопросы по применению и размеру, 3★ и всё неясное с текстом
+    - template: похвала 4-5★ и отзывы без текста
+    priority: 0 — самый срочный
+    """
+    if not has_text:
+        return {"queue": "template", "priority": 3, "template": "praise" if rating >= 4 else "neutral"}
+    if rating <= 3 and ("defect" in labels or "packaging" in labels):
+        return {"queue": "escalation", "priority": 0, "template": "defect" if "defect" in labels else "packaging"}
+    if "usage" in labels or "sizing" in labels:
+        return {"queue": "llm", "priority": 1, "template": "usage" if "usage" in labels else "sizing"}
+    if rating >= 4 and labels == ["praise"]:
+        return {"queue": "template", "priority": 3, "template": "praise"}
+    return {"queue": "llm", "priority": 2, "template": None}
+
+
+_classifier: Optional[ReviewClassifier] = None
+
+
+def get_classifier() -> ReviewClassifier:
+    """Общий классификатор процесса (автомат строится один раз)"""
+    global _classifier
+    if _classifier is None:
+        _classifier = ReviewClassifier()
+    return _classifier
+
+
+def classify_reviews(reviews: List[Dict]) -> List[Tuple[Dict, List[str], Dict]]:
+    """(отзыв, метки, маршрут) для пачки отзывов"""
+    labels = get_classifier().classify_batch(reviews)
+    return [
+        (review, review_labels, route(review_labels, review.get("rating") or 0, bool((review.get("text") or "").strip())))
+        for review, review_labels in zip(reviews, labels)
+    ]
+
+
+def main(argv: Optional[List[str]] = None):
+    from config import load_env
+    from review_store import synced_store
+
+    load_env()
+
+    parser = argparse.ArgumentParser(description="Classify Ozon reviews and show routing")
+    parser.add_argument("--limit", type=int, default=100, help="Max reviews to classify")
+    parser.add_argument("--status", default="UNPROCESSED", help="Review status filter ('' for any)")
+    parser.add_argument("--json", action="store_true", help="Output as JSON lines")
+
+    args = parser.parse_args(argv)
+
+    try:
+        reviews = list(synced_store().query(status=args.status or None, limit=args.limit))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False))
+        sys.exit(1)
+
+    queues, labels_total = Counter(), Counter()
+    for review, labels, target in classify_reviews(reviews):
+        queues[target["queue"]] += 1
+        labels_total.update(labels)
+        if args.json:
+            print(json.dumps({"id": review["id"], "rating": review.get("rating"), "labels": labels, **target},
+                             ensure_ascii=False))
+        elif target["queue"] != "template":
+            print(f"[{target['queue']}/{target['priority']}] {review['id'][:20]}... [{review.get('rating')}★] "
+                  f"{','.join(labels) or '-'}: {(review.get('text') or '')[:60]}")
+
+    if not args.json:
+        print(f"\nReviews: {len(reviews)}")
+        print(f"Queues: {dict(queues)}")
+        print(f"Labels: {dict(labels_total)}")
+
+
+if __name__ == "__main__":
+    from profiling import run_main
+    run_main(main)
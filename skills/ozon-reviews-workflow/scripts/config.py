@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Config
+Общие настройки скриптов:
+- .env читается один раз на процесс, повторные load_env() ничего не делают
+- рабочая папка OpenClaw и папка данных навыка
+Только stdlib и без побочных эффектов при импорте: модуль грузится раньше всех.
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+WORKSPACE = Path.home() / ".openclaw" / "workspace"
+DATA_DIR = WORKSPACE / "tmp_files" / "ozon-reviews-workflow"
+SKILL_DIR = Path(__file__).resolve().parent.parent
+
+
+@lru_cache(maxsize=None)
+def load_env() -> Optional[Path]:
+    """
+    Загружает первый найденный .env (текущая папка, навык, папка навыков, workspace)
+    Уже заданные переменные окружения не перезаписываются; возвращает путь или None
+    """
+    paths = [
+        Path.cwd() / ".env",
+        SKILL_DIR / ".env",
+        SKILL_DIR.parent / ".env",
+        WORKSPACE / ".env",
+    ]
+    for env_path in paths:
+        if env_path.exists():
+            with open(env_path) as f:
+                for line in f:
+                    if line.strip() and not line.startswith("#") and "=" in line:
+                        k, v = line.strip().split("=", 1)
+                        os.environ.setdefault(k.strip(), v.strip().strip('"\''))
+            return env_path
+    return None
@@ -4,127 +4,190 @@ Ozon Reviews Import
 Импорт AI-сгенерированных ответов в Ozon
 """
 
-import json
-import os
-import sys
 import argparse
-import requests
 from pathlib import Path
-from typing import List, Dict
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-BASE_URL = "https://api-seller.ozon.ru"
-
-
-def load_env():
-    """Загружает .env"""
-    paths = [
-        Path.cwd() / ".env",
-        Path(__file__).parent.parent / ".env",
-        Path(__file__).parent.parent.parent / ".env",
-    ]
-    for env_path in paths:
-        if env_path.exists():
-            with open(env_path) as f:
-                for line in f:
-                    if line.strip() and not line.startswith("#") and "=" in line:
-                        k, v = line.strip().split("=", 1)
-                        os.environ.setdefault(k.strip(), v.strip().strip('"\''))
-            break
-
-
-def get_headers():
-    """Возвращает заголовки Ozon API"""
-    client_id = os.environ.get("OZON_CLIENT_ID")
-    api_key = os.environ.get("OZON_API_KEY")
-    if not client_id or not api_key:
-        print("Error: Missing OZON_CLIENT_ID or OZON_API_KEY")
-        sys.exit(1)
-    return {
-        "Client-Id": client_id,
-        "Api-Key": api_key,
-        "Content-Type": "application/json"
-    }
+from config import load_env
+from metrics import add_metrics_args, export_metrics
+from ozon_client import get_client
+import run_log
+from jsonl import iter_records
+from outbox import Outbox
+from review_store import record_reply, record_status, unanswered
+from sender import ReplySender, add_sender_args
+from status_updater import StatusUpdater, print_flush
 
 
 def reply_to_review(review_id: str, text: str) -> Dict:
     """Отправляет ответ на отзыв"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/comment/create",
-        headers=get_headers(),
-        json={"review_id": review_id, "text": text},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json()
+    result = get_client().create_comment(review_id, text)
+    record_reply(review_id)
+    return result
 
 
 def change_status(review_ids: List[str]) -> Dict:
     """Обновляет статус на PROCESSED"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/change-status",
-        headers=get_headers(),
-        json={"review_ids": review_ids, "status": "PROCESSED"},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json()
+    result = get_client().change_status(review_ids, "PROCESSED")
+    record_status(review_ids, "PROCESSED")
+    return result
+
+
+def read_replies(path: str) -> Iterator[Tuple[str, str, Dict]]:
+    """
+    (id, ответ, meta) из файла по одной записи
+    Записи без ответа (AI ещё не дописал) пропускаются молча, записи без id — с предупреждением.
+    """
+    for n, item in enumerate(iter_records(path), 1):
+        if not isinstance(item, dict) or not item.get("ai_reply"):
+            continue
+        if not item.get("id"):
+            print(f"⚠️  {path}: record {n} has no id, skipped")
+            continue
+        yield item["id"], item["ai_reply"], {}
 
 
-def main():
+def still_unanswered(replies: Iterable[Tuple[str, str, Dict]], skipped: List[str], chunk: int = 16) -> Iterator[Tuple]:
+    """
+    Ответы только на отзывы, которые всё ещё ждут ответа: файл мог пролежать часы,
+    поэтому статус и комментарии перепроверяются в API; отсеянные id — в skipped
+    Пачки растут от 1 до chunk: первая запись уходит в отправку после одной проверки.
+    """
+    replies = iter(replies)
+    size = 1
+    for batch in iter(lambda: list(islice(replies, size)), []):
+        waiting = {r["id"] for r in unanswered({"id": review_id} for review_id, _text, _meta in batch)}
+        for item in batch:
+            if item[0] in waiting:
+                yield item
+            else:
+                skipped.append(item[0])
+        size = min(size * 2, chunk)
+
+
+def main(argv: Optional[List[str]] = None):
     load_env()
     
     parser = argparse.ArgumentParser(description="Import AI replies to Ozon")
-    parser.add_argument("file", help="JSON file with replies")
+    parser.add_argument("file", help="JSONL (or JSON array) file with replies")
     parser.add_argument("--dry-run", action="store_true", help="Show without sending")
+    parser.add_argument("--enqueue-only", action="store_true", help="Queue replies in the outbox without sending")
+    parser.add_argument("--no-status-update", action="store_true", help="Skip status update")
+    add_sender_args(parser)
+    add_metrics_args(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    # Load replies
-    with open(args.file) as f:
-        replies = json.load(f)
+    print("=== Ozon Reviews Import ===")
+    print(f"File: {args.file}\n")
     
-    print(f"=== Ozon Reviews Import ===")
-    print(f"File: {args.file}")
-    print(f"Replies to import: {len(replies)}\n")
+    # Файл читается по одной записи
+    replies = read_replies(args.file)
     
     if args.dry_run:
         print("[DRY RUN] Would import:")
-        for item in replies:
-            print(f"\n  {item['id'][:20]}...")
-            print(f"  Reply: {item['ai_reply'][:60]}...")
+        count = 0
+        for review_id, text, _meta in replies:
+            count += 1
+            print(f"\n  {review_id[:20]}...")
+            print(f"  Reply: {text[:60]}...")
+        print(f"\nReplies to import: {count}")
         return
     
-    # Send replies
-    success_count = 0
-    replied_ids = []
-    
-    for i, item in enumerate(replies, 1):
-        review_id = item["id"]
-        reply_text = item["ai_reply"]
+    try:
+        # Отвеченные тем временем (PROCESSED, ответ продавца в комментариях) не отправляются
+        answered: List[str] = []
+        replies = still_unanswered(replies, answered)
         
-        print(f"[{i}/{len(replies)}] {review_id[:20]}...")
+        # Ставим в outbox: отзывы, уже стоящие в очереди, не дублируются
+        outbox = Outbox()
+        source = f"import:{Path(args.file).name}"
         
-        try:
-            result = reply_to_review(review_id, reply_text)
-            print(f"  ✓ Sent! Comment ID: {result.get('comment_id', 'unknown')[:20]}...")
-            success_count += 1
-            replied_ids.append(review_id)
-        except Exception as e:
-            print(f"  ✗ Error: {e}")
-    
-    # Update status
-    if replied_ids:
-        print(f"\nUpdating status to PROCESSED...")
-        try:
-            change_status(replied_ids)
-            print(f"✓ Status updated for {len(replied_ids)} reviews!")
-        except Exception as e:
-            print(f"✗ Status update error: {e}")
-    
-    # Summary
-    print(f"\n{'='*50}")
-    print(f"Done! Imported {success_count}/{len(replies)} replies")
+        if args.enqueue_only:
+            queued = outbox.enqueue_many(replies, source=source)
+            print(f"Queued {queued['added']} replies ({queued['skipped']} already in outbox, "
+                  f"{len(answered)} already answered)")
+            if queued["quarantined"]:
+                print(f"⛔ {queued['quarantined']} replies violate company policy, held in quarantine")
+            print("Deliver with: python3 scripts/outbox.py --drain")
+            return
+        
+        # Send replies: отправка начинается с первой прочитанной записи;
+        # уходят только ответы из этого файла, старая очередь — через outbox.py --drain
+        queued = {}
+        success_count = 0
+        replied_ids = []
+        results = []
+        
+        sender = ReplySender(rps=args.rps, max_in_flight=args.max_in_flight, send_func=reply_to_review)
+        
+        # Статус обновляется пачками прямо во время отправки
+        status = None if args.no_status_update else StatusUpdater(
+            change_func=lambda ids, _status: change_status(ids), on_flush=print_flush
+        )
+        
+        for i, result in enumerate(outbox.drain(sender, jobs=outbox.stream(replies, source, queued)), 1):
+            results.append(result)
+            review_id = result["review_id"]
+        
+            print(f"[{i}] {review_id[:20]}...")
+        
+            if result["status"] == "success":
+                print(f"  ✓ Sent! Comment ID: {result['comment_id'][:20]}...")
+                success_count += 1
+                replied_ids.append(review_id)
+                if status:
+                    status.add(review_id)
+            else:
+                print(f"  ✗ Error: {result['error']}")
+        
+        print(f"\nQueued {queued.get('added', 0)} replies ({queued.get('skipped', 0)} already in outbox, "
+              f"{len(answered)} already answered)")
+        if queued.get("quarantined"):
+            print(f"⛔ {queued['quarantined']} replies violate company policy, held in quarantine "
+                  f"(python3 scripts/outbox.py --quarantine)")
+        
+        leftover = outbox.counts()
+        if leftover["pending"] or leftover["sending"]:
+            print(f"ℹ️  Outbox still holds {leftover['pending']} pending and {leftover['sending']} unconfirmed "
+                  f"replies from earlier runs: python3 scripts/outbox.py --drain")
+        
+        # Дожидаемся последних пачек статуса
+        if status:
+            status.close()
+            if status.updated:
+                print(f"\n✓ Status updated for {len(status.updated)} reviews!")
+            if status.failed:
+                print(f"\n✗ Status update error for {len(status.failed)} reviews:")
+                for review_id, error in status.failed.items():
+                    print(f"  {review_id[:20]}...: {error}")
+        
+        # Save log
+        run_log.append({
+            "script": "import_replies",
+            "mode": "live",
+            "file": args.file,
+            "total_processed": len(results),
+            "queued": queued.get("added", 0),
+            "quarantined": queued.get("quarantined", 0),
+            "already_answered": answered,
+            "replied": success_count,
+            "errors": len(results) - success_count,
+            "status_updated": bool(replied_ids) and status is not None and not status.failed,
+            "status_failed": status.failed if status else {},
+            "replied_ids": replied_ids,
+            "reviews": results
+        })
+        
+        # Summary
+        print(f"\n{'='*50}")
+        print(f"Done! Imported {success_count}/{len(results)} replies")
+    finally:
+        # Метрики пишутся и при ошибке посреди отправки
+        export_metrics(args.metrics)
 
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main
+    run_main(main)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews JSONL
+Потоковый формат файлов обмена с AI (экспорт отзывов, импорт ответов):
+- одна запись — одна строка JSON (NDJSON), запись идёт по мере поступления данных
+- чтение по одной записи, память не зависит от размера файла
+- обрезанная последняя строка (файл ещё дописывается или запись прервалась) пропускается
+- старый формат — JSON-массив — тоже читается потоково
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Union
+
+CHUNK = 64 * 1024
+# Как часто записанное сбрасывается на диск для читателя файла, с
+FLUSH_INTERVAL = 1.0
+
+_decoder = json.JSONDecoder()
+
+
+def write_records(records: Iterable[Dict], path: Union[str, Path]) -> int:
+    """Пишет записи построчно, возвращает их количество"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        flushed = time.monotonic()
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+            # Читатель файла видит записанное не позже чем через FLUSH_INTERVAL,
+            # без системного вызова на каждую запись
+            now = time.monotonic()
+            if now - flushed >= FLUSH_INTERVAL:
+                f.flush()
+                flushed = now
+    return count
+
+
+def _iter_lines(f, path: Path) -> Iterator[Dict]:
+    broken = None
+    for n, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        if broken is not None:
+            raise ValueError(f"{path}:{broken}: invalid JSON line")
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Допустима только последняя строка
+            broken = n
+    if broken is not None:
+        print(f"⚠️  {path}:{broken}: truncated last line skipped")
+
+
+def _iter_array(f, path: Path) -> Iterator[Dict]:
+    buffer = f.read(CHUNK).lstrip()[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = _decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                if buffer:
+                    print(f"⚠️  {path}: truncated last record skipped")
+                return
+            chunk = f.read(CHUNK)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+
+def iter_records(path: Union[str, Path]) -> Iterator[Dict]:
+    """Читает записи по одной (JSONL или JSON-массив)"""
+    path = Path(path)
+    with open(path, encoding="utf-8") as f:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+    with open(path, encoding="utf-8") as f:
+        if head == "[":
+            yield from _iter_array(f, path)
+        elif head:
+            yield from _iter_lines(f, path)
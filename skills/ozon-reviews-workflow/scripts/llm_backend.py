@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews LLM Backend
+Генерация ответов на отзывы через подключаемый backend:
+- template — шаблоны по рейтингу (без сети)
+- openai — любой OpenAI-совместимый /chat/completions:
+  несколько отзывов в одном запросе, N запросов параллельно,
+  ответ — JSON {"replies": [{"id": ..., "reply": ...}]}
+Настройка через env: OZON_LLM_BACKEND, OZON_LLM_BASE_URL, OZON_LLM_API_KEY,
+OZON_LLM_MODEL, OZON_LLM_BATCH, OZON_LLM_CONCURRENCY.
+"""
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from classifier import classify_reviews, get_classifier
+from profiling import span
+from throttle import parse_retry_after, retry_delay
+
+POLICY_PATH = Path(__file__).resolve().parent.parent / "references" / "company-policy.md"
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_BATCH = 10
+DEFAULT_CONCURRENCY = 4
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+SYSTEM_PROMPT = """Ты отвечаешь от имени продавца на отзывы покупателей Ozon.
+
+## ⚠️ КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА КОМПАНИИ:
+{policy}
+
+## Требования к ответам:
+1. Каждый ответ уникальный и персонализированный, учитывает содержание отзыва
+2. Эмодзи — уместно и немного
+3. **СТРОГО** соблюдай правила компании - никаких возвратов/компенсаций
+4. Для 1-3★: больше эмпатии, проблемы упаковки/доставки — в поддержку Ozon
+5. Тон: вежливый, профессиональный, сочувствующий
+
+## Формат ответа:
+Только JSON-объект: {{"replies": [{{"id": "<id отзыва>", "reply": "<текст ответа>"}}]}}
+По одному элементу на каждый отзыв из запроса, id — без изменений.
+"""
+
+
+def load_policy() -> str:
+    """Правила компании (references/company-policy.md)"""
+    return POLICY_PATH.read_text() if POLICY_PATH.exists() else ""
+
+
+def template_reply(review: Dict, labels: Optional[List[str]] = None) -> str:
+    """Ответ по шаблону для рейтинга и меток классификатора"""
+    rating = review.get("rating", 5)
+    has_photos = review.get("photos_amount", 0) > 0
+    if labels is None:
+        labels = get_classifier().classify(review)
+
+    if rating >= 5:
+        if has_photos:
+            return "Здравствуйте! Благодарим за прекрасный отзыв и фотографии 📸 Рады, что товар оправдал ожидания! Ваши снимки помогут другим покупателям с выбором. Ждём вас снова! ⭐"
+        else:
+            return "Здравствуйте! Спасибо за высокую оценку и доверие 🙏 Мы рады, что товар вам понравился! Будем ждать вас снова ⭐"
+
+    elif rating == 4:
+        return "Добрый день! Благодарим за отзыв и оценку 🌟 Рады, что покупка вам подошла! Если будут вопросы — всегда на связи. Ждём снова!"
+
+    elif "packaging" in labels and "defect" not in labels:
+        return "Здравствуйте! Сожалеем о ситуации 😔 Упаковка и доставка — зона ответственности Ozon, рекомендуем обратиться в поддержку Ozon с фото упаковки. Мы гарантируем качество самой продукции 🙏"
+
+    elif "defect" in labels:
+        return "Здравствуйте! Приносим извинения за неприятный опыт 😔 Мы гарантируем подлинность и качество продукции. Если есть сомнения в качестве — верните товар по процедуре Ozon. Поможем с консультацией по применению 🙏"
+
+    elif rating == 3:
+        return "Здравствуйте! Спасибо за честный отзыв 🙏 Нам важно ваше мнение. Если есть конкретные пожелания по улучшению — напишите нам, постараемся сделать лучше!"
+
+    else:  # 1-2 stars
+        return "Здравствуйте! Сожалеем, что товар не оправдал ожиданий 🙏 Поможем с консультацией по применению — возможно, нужно скорректировать способ использования. Ваше мнение важно для нас!"
+
+
+class ReplyBackend:
+    """Интерфейс backend'а: отзывы → {id отзыва: текст ответа}"""
+
+    name = "base"
+
+    def generate(self, reviews: List[Dict]) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class TemplateBackend(ReplyBackend):
+    """Шаблоны по рейтингу"""
+
+    name = "template"
+
+    def generate(self, reviews: List[Dict]) -> Dict[str, str]:
+        labels = get_classifier().classify_batch(reviews)
+        return {review["id"]: template_reply(review, l) for review, l in zip(reviews, labels)}
+
+
+class RoutingBackend(ReplyBackend):
+    """
+    Маршрутизация перед дорогим backend'ом (см. classifier.route):
+    очередь template отвечается шаблоном без LLM, остальные идут в backend по приоритету
+    routes: {id отзыва: маршрут}, stats: template, llm, escalation
+    """
+
+    def __init__(self, backend: ReplyBackend):
+        self.backend = backend
+        self.name = f"{backend.name}+routing"
+        self.routes: Dict[str, Dict] = {}
+        self.stats = {"template": 0, "llm": 0, "escalation": 0}
+
+    def close(self):
+        self.backend.close()
+
+    def generate(self, reviews: List[Dict]) -> Dict[str, str]:
+        replies, expensive = {}, []
+        for review, labels, target in classify_reviews(reviews):
+            self.routes[review["id"]] = {**target, "labels": labels}
+            self.stats[target["queue"]] += 1
+            if target["queue"] == "template":
+                replies[review["id"]] = template_reply(review, labels)
+            else:
+                expensive.append(review)
+        expensive.sort(key=lambda r: self.routes[r["id"]]["priority"])
+        if expensive:
+            replies.update(self.backend.generate(expensive))
+        return replies
+
+
+class OpenAIBackend(ReplyBackend):
+    """
+    OpenAI-совместимый /chat/completions
+    - batch_size отзывов в одном запросе, concurrency запросов одновременно
+    - 429/5xx и сетевые ошибки повторяются с jitter (не меньше Retry-After)
+    - отзывы, на которые модель не вернула ответ, в результат не попадают
+    """
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = DEFAULT_BASE_URL,
+        model: str = DEFAULT_MODEL,
+        batch_size: int = DEFAULT_BATCH,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        policy: Optional[str] = None,
+        timeout: float = 120,
+        max_retries: int = 3
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.system_prompt = SYSTEM_PROMPT.format(policy=load_policy() if policy is None else policy)
+        import requests
+
+        self._network_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        self.session = requests.Session()
+        self.session.mount(
+            self.base_url,
+            requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        )
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "OpenAIBackend":
+        """Настройки из OZON_LLM_* (ключ — OZON_LLM_API_KEY или OPENAI_API_KEY)"""
+        return cls(
+            api_key=os.environ.get("OZON_LLM_API_KEY") or os.environ.get("OPENAI_API_KEY"),
+            base_url=os.environ.get("OZON_LLM_BASE_URL", DEFAULT_BASE_URL),
+            model=os.environ.get("OZON_LLM_MODEL", DEFAULT_MODEL),
+            batch_size=int(os.environ.get("OZON_LLM_BATCH", DEFAULT_BATCH)),
+            concurrency=int(os.environ.get("OZON_LLM_CONCURRENCY", DEFAULT_CONCURRENCY)),
+            **kwargs
+        )
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, payload: Dict) -> Dict:
+        attempt = 0
+        while True:
+            try:
+                r = self.session.post(f"{self.base_url}/chat/completions", json=payload, timeout=self.timeout)
+            except self._network_errors:
+                if attempt >= self.max_retries:
+                    raise
+                r = None
+            if r is not None and (r.status_code not in RETRY_STATUSES or attempt >= self.max_retries):
+                r.raise_for_status()
+                return r.json()
+            wait = parse_retry_after(r.headers.get("Retry-After")) if r is not None else None
+            time.sleep(max(wait or 0, retry_delay(attempt)))
+            attempt += 1
+
+    def _batch(self, reviews: List[Dict]) -> Dict[str, str]:
+        items = [
+            {"id": r["id"], "rating": r.get("rating"), "text": r.get("text") or "", "photos": r.get("photos_amount", 0)}
+            for r in reviews
+        ]
+        data = self._request({
+            "model": self.model,
+            "temperature": 0.7,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": json.dumps({"reviews": items}, ensure_ascii=False)}
+            ]
+        })
+        content = data["choices"][0]["message"]["content"]
+        return parse_replies(content, {r["id"] for r in reviews})
+
+    def _safe_batch(self, reviews: List[Dict]) -> Dict[str, str]:
+        # Сбой одной пачки не должен терять ответы остальных
+        try:
+            return self._batch(reviews)
+        except Exception as e:
+            print(f"  ⚠️  LLM batch of {len(reviews)} reviews failed: {e}")
+            return {}
+
+    def generate(self, reviews: List[Dict]) -> Dict[str, str]:
+        batches = [reviews[i:i + self.batch_size] for i in range(0, len(reviews), self.batch_size)]
+        replies = {}
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches) or 1)) as pool:
+            for result in pool.map(self._safe_batch, batches):
+                replies.update(result)
+        return replies
+
+
+def parse_replies(content: str, expected: set) -> Dict[str, str]:
+    """
+    Разбирает ответ модели: {"replies": [...]} или просто список
+    (допускается обёртка ```json ... ```); чужие id и пустые ответы отбрасываются
+    """
+    content = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", content)
+    data = json.loads(content)
+    items = data.get("replies", []) if isinstance(data, dict) else data
+    replies = {}
+    for item in items:
+        review_id = item.get("id")
+        reply = (item.get("reply") or item.get("ai_reply") or "").strip()
+        if review_id in expected and reply:
+            replies[review_id] = reply
+    return replies
+
+
+BACKENDS = {
+    "template": TemplateBackend,
+    "openai": OpenAIBackend.from_env,
+}
+
+
+def get_backend(name: Optional[str] = None) -> ReplyBackend:
+    """Backend по имени (по умолчанию OZON_LLM_BACKEND или template)"""
+    name = name or os.environ.get("OZON_LLM_BACKEND", "template")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name} (available: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+def generate_replies(reviews: List[Dict], backend: ReplyBackend) -> Iterator[Dict]:
+    """Пары {"review", "reply"} в порядке отзывов; без ответа — reply=None"""
+    with span("generate"):
+        replies = backend.generate(reviews)
+    for review in reviews:
+        yield {"review": review, "reply": replies.get(review["id"])}
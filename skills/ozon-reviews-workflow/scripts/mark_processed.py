@@ -2,93 +2,70 @@
 """
 Ozon Reviews - Mark processed with comments as PROCESSED
 Обновляет статус отзывов, на которые уже есть ответ
+(ответ продавца проверяется по комментариям, а не только по comments_amount)
 """
 import json
-import os
 import sys
 import argparse
-import requests
-from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
-BASE_URL = "https://api-seller.ozon.ru"
+from config import load_env
+from ozon_client import get_client
+from review_store import get_store, prefetch_comments, record_status, refresh_unprocessed, synced_store
+from status_updater import MAX_BATCH, StatusUpdater, print_flush
 
 
-def load_env():
-    """Загружает .env из разных мест"""
-    paths = [
-        Path.cwd() / ".env",
-        Path(__file__).parent.parent / ".env",
-        Path(__file__).parent.parent.parent / ".env",
-    ]
-    for env_path in paths:
-        if env_path.exists():
-            with open(env_path) as f:
-                for line in f:
-                    if line.strip() and not line.startswith("#") and "=" in line:
-                        k, v = line.strip().split("=", 1)
-                        os.environ.setdefault(k.strip(), v.strip().strip('"\''))
-            break
-
-
-def get_headers():
-    """Возвращает заголовки для API"""
-    client_id = os.environ.get("OZON_CLIENT_ID")
-    api_key = os.environ.get("OZON_API_KEY")
-    if not client_id or not api_key:
-        print(json.dumps({"error": "Missing OZON_CLIENT_ID or OZON_API_KEY"}, ensure_ascii=False))
-        sys.exit(1)
-    return {
-        "Client-Id": client_id,
-        "Api-Key": api_key,
-        "Content-Type": "application/json"
-    }
+def get_reviews_with_comments_unprocessed(limit: int = 100, full_sync: bool = False, refresh: int = 0) -> List[Dict]:
+    """
+    Получает UNPROCESSED отзывы с комментариями (из локальной базы)
+    refresh — сколько давно не обновлявшихся UNPROCESSED-отзывов сначала перечитать из API:
+    delta-синхронизация не видит ответов, данных вне скриптов на старые отзывы
+    """
+    store = synced_store(full=full_sync)
+    if refresh and not full_sync:
+        print(f"Refreshed {refresh_unprocessed(refresh)} UNPROCESSED reviews from API")
+    # Фильтруем: UNPROCESSED но с комментариями
+    return list(store.query(
+        status="UNPROCESSED",
+        commented=True,
+        sort_dir="DESC",
+        limit=limit
+    ))
 
 
-def get_reviews_with_comments_unprocessed(limit: int = 100) -> List[Dict]:
-    """Получает UNPROCESSED отзывы с комментариями"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/list",
-        headers=get_headers(),
-        json={"limit": max(20, min(limit, 100)), "sort_dir": "DESC"},
-        timeout=30
-    )
-    r.raise_for_status()
-    
-    reviews = r.json().get("reviews", [])
-    
-    # Фильтруем: UNPROCESSED но с комментариями
-    filtered = [
-        r for r in reviews 
-        if r.get("status") == "UNPROCESSED" 
-        and r.get("comments_amount", 0) > 0
-    ]
-    
-    return filtered
+def split_by_seller_reply(reviews: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """Делит отзывы на (есть ответ продавца, только комментарии покупателей)"""
+    stats = prefetch_comments(r["id"] for r in reviews)
+    if stats["failed"]:
+        print(f"  ⚠️  Comments not loaded for {len(stats['failed'])} reviews, skipping them")
+    replied = set(get_store().seller_replied([r["id"] for r in reviews]))
+    return [r for r in reviews if r["id"] in replied], [r for r in reviews if r["id"] not in replied]
 
 
 def change_status(review_ids: List[str], status: str = "PROCESSED") -> Dict:
     """Меняет статус отзывов"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/change-status",
-        headers=get_headers(),
-        json={"review_ids": review_ids, "status": status},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json()
+    result = get_client().change_status(review_ids, status)
+    record_status(review_ids, status)
+    return result
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     load_env()
     
     parser = argparse.ArgumentParser(description="Mark reviews with comments as PROCESSED")
-    parser.add_argument("--limit", type=int, default=100, help="Max reviews to check")
+    parser.add_argument("--limit", type=int, default=100, help="Max reviews to update")
+    parser.add_argument("--full-sync", action="store_true",
+                        help="Resync all reviews first (catch replies made outside these scripts)")
+    parser.add_argument("--refresh", type=int, default=100, metavar="N",
+                        help="Re-read N least recently synced UNPROCESSED reviews first (0 to skip)")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="Trust comments_amount, don't check that the seller's reply exists")
     parser.add_argument("--dry-run", action="store_true", help="Test mode - show what would be updated")
     parser.add_argument("--yes", action="store_true", help="Skip confirmation prompt")
     parser.add_argument("--json", action="store_true", help="Output results as JSON")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    import requests
     
     mode = "DRY RUN" if args.dry_run else "LIVE"
     print(f"=== Ozon Reviews - Mark Processed [{mode}] ===\n")
@@ -96,10 +73,16 @@ def main():
     try:
         # Get reviews
         print("Fetching UNPROCESSED reviews with comments...")
-        reviews = get_reviews_with_comments_unprocessed(limit=args.limit)
+        reviews = get_reviews_with_comments_unprocessed(
+            limit=args.limit, full_sync=args.full_sync, refresh=args.refresh
+        )
         
         print(f"Found {len(reviews)} UNPROCESSED reviews with comments\n")
         
+        if reviews and not args.no_verify:
+            reviews, without_reply = split_by_seller_reply(reviews)
+            print(f"Seller replied: {len(reviews)}, customer comments only: {len(without_reply)}\n")
+        
         if not reviews:
             print("No reviews to update. All caught up!")
             return
@@ -119,7 +102,7 @@ def main():
         
         if args.dry_run:
             print(f"[DRY RUN] Would update {len(reviews)} reviews to PROCESSED")
-            print(f"\nRun without --dry-run to actually update:")
+            print("\nRun without --dry-run to actually update:")
             print(f"  python3 {sys.argv[0]}")
             return
         
@@ -137,26 +120,25 @@ def main():
                 print("Cancelled.")
                 return
         
-        # Process in batches (max 100 per request)
-        batch_size = 100
-        total_updated = 0
-        
-        for i in range(0, len(reviews), batch_size):
-            batch = reviews[i:i + batch_size]
-            review_ids = [r["id"] for r in batch]
-            
-            print(f"\nUpdating batch {i//batch_size + 1} ({len(batch)} reviews)...")
-            result = change_status(review_ids, "PROCESSED")
-            total_updated += len(batch)
-            print(f"  ✓ Updated")
+        # Пачки по ≤100 id с повторами и итогом по каждому id
+        print(f"\nUpdating {len(reviews)} reviews in batches of {MAX_BATCH}...")
+        with StatusUpdater(change_func=change_status, on_flush=print_flush) as status:
+            for review in reviews:
+                status.add(review["id"])
+        total_updated = len(status.updated)
         
         # Summary
         print(f"\n{'='*50}")
         print(f"Done! Updated {total_updated} reviews to PROCESSED")
+        if status.failed:
+            print(f"  ✗ Failed: {len(status.failed)}")
+            for review_id, error in list(status.failed.items())[:10]:
+                print(f"    {review_id[:30]}...: {error}")
         
         if args.json:
             print(json.dumps({
                 "updated": total_updated,
+                "failed": status.failed,
                 "reviews": [{"id": r["id"], "sku": r["sku"]} for r in reviews]
             }, ensure_ascii=False, indent=2))
         
@@ -169,4 +151,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main
+    run_main(main)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Ozon API Metrics
+Метрики вызовов Ozon API, собираются в OzonClient._post:
+- по эндпоинтам: запросы, ответы по кодам, 429, сетевые ошибки, повторы
+- гистограмма задержек в стиле HDR (лог-линейные корзины, точность ~3%)
+- время в полёте (запрос) и во сне (ожидание лимитера, паузы между повторами)
+- экспорт: Prometheus text (.prom) или JSON-снимок (env OZON_METRICS_FILE / --metrics)
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+# 2^SUB_BITS корзин на каждую степень двойки: относительная погрешность ≤ 1/16
+SUB_BITS = 5
+SUB_HALF = 1 << (SUB_BITS - 1)
+
+# Границы корзин для экспорта в Prometheus, секунды
+PROM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUANTILES = (50, 90, 99, 99.9)
+
+
+class Histogram:
+    """Гистограмма значений в микросекундах с лог-линейными корзинами (HDR)"""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value: int) -> int:
+        shift = max(0, value.bit_length() - SUB_BITS)
+        return shift * SUB_HALF + (value >> shift)
+
+    @staticmethod
+    def _bounds(index: int) -> tuple:
+        """[нижняя, верхняя) граница корзины"""
+        if index < 2 * SUB_HALF:
+            return index, index + 1
+        shift = index // SUB_HALF - 1
+        mantissa = index - shift * SUB_HALF
+        return mantissa << shift, (mantissa + 1) << shift
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1_000_000))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float:
+        """Значение перцентиля p (0-100), секунды (верхняя граница корзины, не больше max)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._bounds(index)[1] - 1, self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def cumulative(self, bounds=PROM_BUCKETS) -> List[int]:
+        """Число значений ≤ каждой границы (для корзин Prometheus)"""
+        result = []
+        for bound in bounds:
+            limit = bound * 1_000_000
+            result.append(sum(n for i, n in self.counts.items() if self._bounds(i)[1] - 1 <= limit))
+        return result
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.total / 1_000_000, 6),
+            "min_ms": round((self.min or 0) / 1000, 3),
+            "max_ms": round(self.max / 1000, 3),
+            **{f"p{q:g}_ms": round(self.percentile(q) * 1000, 3) for q in QUANTILES},
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.statuses: Dict[str, int] = {}
+        self.throttled = 0
+        self.network_errors = 0
+        self.retries = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+    """Потокобезопасный реестр метрик процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.in_flight_seconds = 0.0
+        self.sleep_seconds = 0.0
+
+    def _endpoint(self, path: str) -> EndpointStats:
+        stats = self.endpoints.get(path)
+        if stats is None:
+            stats = self.endpoints[path] = EndpointStats()
+        return stats
+
+    def request(self, path: str, status: Optional[int], seconds: float):
+        """Завершённый запрос: status=None — сетевая ошибка/таймаут"""
+        with self._lock:
+            stats = self._endpoint(path)
+            stats.requests += 1
+            stats.latency.record(seconds)
+            self.in_flight_seconds += seconds
+            if status is None:
+                stats.network_errors += 1
+                return
+            key = str(status)
+            stats.statuses[key] = stats.statuses.get(key, 0) + 1
+            if status == 429:
+                stats.throttled += 1
+
+    def retry(self, path: str):
+        with self._lock:
+            self._endpoint(path).retries += 1
+
+    def sleep(self, seconds: float):
+        """Время ожидания: лимитер, Retry-After, пауза перед повтором"""
+        if seconds > 0:
+            with self._lock:
+                self.sleep_seconds += seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "started_at": self.started,
+                "uptime_seconds": round(time.time() - self.started, 3),
+                "in_flight_seconds": round(self.in_flight_seconds, 3),
+                "sleep_seconds": round(self.sleep_seconds, 3),
+                "endpoints": {
+                    path: {
+                        "requests": s.requests,
+                        "statuses": dict(s.statuses),
+                        "errors": sum(n for code, n in s.statuses.items() if int(code) >= 400) + s.network_errors,
+                        "throttled": s.throttled,
+                        "network_errors": s.network_errors,
+                        "retries": s.retries,
+                        "latency": s.latency.snapshot(),
+                    }
+                    for path, s in sorted(self.endpoints.items())
+                },
+            }
+
+    def prometheus(self) -> str:
+        """Текстовый формат Prometheus (для node_exporter textfile collector)"""
+        lines = [
+            "# HELP ozon_api_requests_total Ozon API requests by endpoint and HTTP status",
+            "# TYPE ozon_api_requests_total counter",
+        ]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            for path, s in endpoints:
+                for code, n in sorted(s.statuses.items()):
+                    lines.append(f'ozon_api_requests_total{{endpoint="{path}",status="{code}"}} {n}')
+                if s.network_errors:
+                    lines.append(f'ozon_api_requests_total{{endpoint="{path}",status="network"}} {s.network_errors}')
+            for name, attr, help_text in (
+                ("ozon_api_throttled_total", "throttled", "429 responses"),
+                ("ozon_api_retries_total", "retries", "Retried requests"),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f'{name}{{endpoint="{path}"}} {getattr(s, attr)}' for path, s in endpoints]
+
+            lines += [
+                "# HELP ozon_api_request_duration_seconds Ozon API request latency",
+                "# TYPE ozon_api_request_duration_seconds histogram",
+            ]
+            for path, s in endpoints:
+                for bound, n in zip(PROM_BUCKETS, s.latency.cumulative()):
+                    lines.append(f'ozon_api_request_duration_seconds_bucket{{endpoint="{path}",le="{bound:g}"}} {n}')
+                lines.append(f'ozon_api_request_duration_seconds_bucket{{endpoint="{path}",le="+Inf"}} {s.latency.count}')
+                lines.append(f'ozon_api_request_duration_seconds_sum{{endpoint="{path}"}} {s.latency.total / 1_000_000:.6f}')
+                lines.append(f'ozon_api_request_duration_seconds_count{{endpoint="{path}"}} {s.latency.count}')
+
+            lines += [
+                "# HELP ozon_api_time_seconds Time spent in flight vs sleeping (limiter, retries)",
+                "# TYPE ozon_api_time_seconds counter",
+                f'ozon_api_time_seconds{{state="in_flight"}} {self.in_flight_seconds:.6f}',
+                f'ozon_api_time_seconds{{state="sleep"}} {self.sleep_seconds:.6f}',
+                "# HELP ozon_run_timestamp_seconds When the run started",
+                "# TYPE ozon_run_timestamp_seconds gauge",
+                f"ozon_run_timestamp_seconds {self.started:.0f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Union[str, Path]) -> Path:
+        """Снимок в файл: .prom — Prometheus, иначе JSON; запись атомарная"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        text = self.prometheus() if path.suffix == ".prom" else json.dumps(self.snapshot(), indent=2)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text)
+        os.replace(tmp, path)
+        return path
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Общий реестр метрик процесса"""
+    return _metrics
+
+
+def add_metrics_args(parser):
+    """Аргумент --metrics для скриптов"""
+    parser.add_argument("--metrics", default=os.environ.get("OZON_METRICS_FILE"),
+                        help="Write Ozon API metrics at the end of the run (.prom = Prometheus, else JSON; "
+                             "env OZON_METRICS_FILE)")
+
+
+def export_metrics(path: Optional[str]):
+    """Пишет метрики, если задан файл, и печатает краткую сводку"""
+    if not path:
+        return
+    metrics = get_metrics()
+    snapshot = metrics.snapshot()
+    try:
+        written = metrics.export(path)
+    except OSError as e:
+        print(f"⚠️  Metrics not written: {e}")
+        return
+    print(f"\n📈 Метрики API: {written} "
+          f"(в полёте {snapshot['in_flight_seconds']:.1f} с, ожидание {snapshot['sleep_seconds']:.1f} с)")
+    for path, e in snapshot["endpoints"].items():
+        print(f"   {path}: {e['requests']} запр., ошибок {e['errors']}, 429 {e['throttled']}, "
+              f"p50 {e['latency']['p50_ms']:.0f} мс, p99 {e['latency']['p99_ms']:.0f} мс")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Show an Ozon API metrics JSON snapshot")
+    parser.add_argument("file", help="JSON snapshot written with --metrics")
+
+    args = parser.parse_args(argv)
+
+    data = json.loads(Path(args.file).read_text())
+    print(f"In flight: {data['in_flight_seconds']} s, sleeping: {data['sleep_seconds']} s")
+    print(f"{'endpoint':<32}{'req':>7}{'err':>6}{'429':>6}{'retry':>7}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for path, e in data["endpoints"].items():
+        lat = e["latency"]
+        print(f"{path:<32}{e['requests']:>7}{e['errors']:>6}{e['throttled']:>6}{e['retries']:>7}"
+              f"{lat['p50_ms']:>9.1f}{lat['p99_ms']:>9.1f}{lat['max_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    from profiling import run_main
+    run_main(main)
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Outbox
+Надёжная очередь ответов (SQLite, WAL) между генерацией и отправкой:
+- генератор ставит (review_id, text) в очередь; повтор того же review_id игнорируется
+- отправитель забирает задания по одному (pending → sending) прямо перед отправкой,
+  поэтому ответ уходит не больше одного раза
+- после сбоя «зависшие» sending сверяются с комментариями отзыва:
+  есть ответ продавца → sent, нет → снова pending
+- повторный прогон пропускает уже отправленное
+- ответы, нарушающие company-policy.md, сразу попадают в карантин (quarantined) с причинами
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import DATA_DIR
+from policy_check import check_reply
+
+DEFAULT_DB = DATA_DIR / "outbox.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    review_id TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    source TEXT,
+    meta TEXT,
+    comment_id TEXT,
+    error TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, created_at);
+"""
+
+STATUSES = ("pending", "sending", "sent", "failed", "quarantined")
+
+
+def has_seller_reply(review_id: str) -> bool:
+    """Есть ли у отзыва ответ продавца (по API)"""
+    from ozon_client import get_client
+
+    return any(c.get("is_owner") for c in get_client().list_comments(review_id, limit=100))
+
+
+class Outbox:
+    """Очередь ответов на отзывы"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or os.environ.get("OZON_OUTBOX_DB") or DEFAULT_DB)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _now(self) -> str:
+        return datetime.now().isoformat()
+
+    # --- производитель ---
+
+    def enqueue(self, review_id: str, text: str, source: str = "", meta: Optional[Dict] = None) -> Optional[str]:
+        """
+        Ставит ответ в очередь, возвращает его статус: pending или quarantined (нарушает policy);
+        None, если этот отзыв уже есть в очереди
+        """
+        reasons = check_reply(text)
+        status = "quarantined" if reasons else "pending"
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO outbox (review_id, text, status, source, meta, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    review_id, text, status, source, json.dumps(meta or {}, ensure_ascii=False),
+                    "; ".join(reasons) or None, self._now(), self._now()
+                )
+            )
+            return status if cur.rowcount == 1 else None
+
+    def enqueue_many(self, items: Iterable[Tuple[str, str, Dict]], source: str = "") -> Dict[str, int]:
+        """Ставит пачку (review_id, text, meta); возвращает счётчики added/skipped/quarantined"""
+        stats = {"added": 0, "skipped": 0, "quarantined": 0}
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                for review_id, text, meta in items:
+                    self._count(stats, self.enqueue(review_id, text, source, meta))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return stats
+
+    @staticmethod
+    def _count(stats: Dict[str, int], status: Optional[str]):
+        key = {"pending": "added", "quarantined": "quarantined", None: "skipped"}[status]
+        stats[key] = stats.get(key, 0) + 1
+
+    # --- отправитель ---
+
+    def _claim(self, review_id: str) -> bool:
+        """pending → sending; False, если задание уже забрал другой процесс"""
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE outbox SET status = 'sending', updated_at = ? WHERE review_id = ? AND status = 'pending'",
+                (self._now(), review_id)
+            )
+            return cur.rowcount == 1
+
+    def _finish(self, review_id: str, status: str, comment_id: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE outbox SET status = ?, comment_id = ?, error = ?, updated_at = ? WHERE review_id = ?",
+                (status, comment_id, error, self._now(), review_id)
+            )
+
+    def claimed_jobs(self, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Задания для ReplySender; каждое забирается в момент, когда его берут в отправку"""
+        taken = 0
+        while limit is None or taken < limit:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT review_id, text, meta FROM outbox WHERE status = 'pending' "
+                    "ORDER BY created_at LIMIT 100"
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                if limit is not None and taken >= limit:
+                    return
+                if self._claim(row["review_id"]):
+                    taken += 1
+                    yield {**json.loads(row["meta"] or "{}"), "review_id": row["review_id"], "text": row["text"]}
+
+    def stream(self, items: Iterable[Tuple[str, str, Dict]], source: str = "", stats: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Ставит (review_id, text, meta) в очередь по мере поступления и сразу забирает в отправку;
+        в stats считаются added/skipped/quarantined
+        Отдаются только задания, поставленные этим вызовом: старые pending из прошлых прогонов
+        отправляются явно (drain без jobs / outbox.py --drain).
+        """
+        stats = stats if stats is not None else {}
+        stats.update(added=0, skipped=0, quarantined=0)
+        for review_id, text, meta in items:
+            status = self.enqueue(review_id, text, source, meta)
+            self._count(stats, status)
+            if status == "pending" and self._claim(review_id):
+                yield {**(meta or {}), "review_id": review_id, "text": text}
+
+    def drain(self, sender, limit: Optional[int] = None, jobs: Optional[Iterator[Dict]] = None) -> Iterator[Dict]:
+        """Отправляет очередь (или jobs из stream) через ReplySender, фиксирует результат каждого ответа"""
+        for result in sender.send(jobs if jobs is not None else self.claimed_jobs(limit)):
+            if result["status"] == "success":
+                self._finish(result["review_id"], "sent", comment_id=result.get("comment_id"))
+            else:
+                # Повтор — после проверки, что ответ не дошёл до Ozon (--retry-failed, daemon)
+                self._finish(result["review_id"], "failed", error=result.get("error"))
+            yield result
+
+    def recover(self, check_replied: Callable[[str], bool] = has_seller_reply) -> Dict:
+        """Разбирает задания, оставшиеся в sending после сбоя"""
+        with self._lock:
+            stuck = [r["review_id"] for r in self.conn.execute(
+                "SELECT review_id FROM outbox WHERE status = 'sending'"
+            )]
+        stats = {"sent": 0, "pending": 0, "unknown": 0}
+        for review_id in stuck:
+            try:
+                replied = check_replied(review_id)
+            except Exception as e:
+                # Не смогли проверить — оставляем sending, чтобы не отправить дважды
+                stats["unknown"] += 1
+                print(f"  ⚠️  {review_id[:20]}...: cannot verify delivery ({e})")
+                continue
+            if replied:
+                self._finish(review_id, "sent", error="recovered: reply found")
+                stats["sent"] += 1
+            else:
+                self._finish(review_id, "pending")
+                stats["pending"] += 1
+        return stats
+
+    def retry_failed(self, check_replied: Optional[Callable[[str], bool]] = None, older_than: float = 0) -> int:
+        """
+        failed → pending (после проверки, что ответ действительно не дошёл); возвращает число вернувшихся
+        С check_replied проверка делается здесь: ответ найден → sent, проверить не удалось → остаётся failed.
+        older_than — только задания, упавшие не меньше older_than секунд назад.
+        """
+        cutoff = (datetime.now() - timedelta(seconds=older_than)).isoformat()
+        with self._lock:
+            if check_replied is None:
+                return self.conn.execute(
+                    "UPDATE outbox SET status = 'pending', error = NULL, updated_at = ? "
+                    "WHERE status = 'failed' AND updated_at <= ?",
+                    (self._now(), cutoff)
+                ).rowcount
+            failed = [r["review_id"] for r in self.conn.execute(
+                "SELECT review_id FROM outbox WHERE status = 'failed' AND updated_at <= ?", (cutoff,)
+            )]
+        requeued = 0
+        for review_id in failed:
+            try:
+                replied = check_replied(review_id)
+            except Exception as e:
+                print(f"  ⚠️  {review_id[:20]}...: cannot verify delivery ({e})")
+                continue
+            if replied:
+                self._finish(review_id, "sent", error="recovered: reply found")
+            else:
+                self._finish(review_id, "pending")
+                requeued += 1
+        return requeued
+
+    def quarantined(self) -> List[Dict]:
+        """Ответы в карантине с причинами"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT review_id, text, error, source FROM outbox WHERE status = 'quarantined' ORDER BY created_at"
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def release(self, review_id: str, text: Optional[str] = None) -> bool:
+        """
+        Выпускает ответ из карантина (после ручной проверки) в pending;
+        с text — заменяет текст, новый текст снова проверяется
+        """
+        if text is not None and check_reply(text):
+            return False
+        with self._lock:
+            return self.conn.execute(
+                "UPDATE outbox SET status = 'pending', text = COALESCE(?, text), error = NULL, updated_at = ? "
+                "WHERE review_id = ? AND status = 'quarantined'",
+                (text, self._now(), review_id)
+            ).rowcount == 1
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
+
+
+def deliver(
+    outbox: Outbox,
+    limit: Optional[int] = None,
+    rps: Optional[float] = None,
+    max_in_flight: Optional[int] = None,
+    update_status: bool = True
+) -> Dict[str, int]:
+    """Отправляет pending через ReplySender, статус PROCESSED — пачками; возвращает счётчики sent/failed"""
+    from ozon_client import get_client
+    from review_store import record_reply, record_status
+    from sender import ReplySender
+    from status_updater import StatusUpdater, print_flush
+
+    def send(review_id: str, text: str) -> Dict:
+        result = get_client().create_comment(review_id, text)
+        record_reply(review_id)
+        return result
+
+    def change(ids: List[str], status: str) -> Dict:
+        result = get_client().change_status(ids, status)
+        record_status(ids, status)
+        return result
+
+    sender = ReplySender(rps=rps, max_in_flight=max_in_flight, send_func=send)
+    status = StatusUpdater(change_func=change, on_flush=print_flush) if update_status else None
+    stats = {"sent": 0, "failed": 0}
+    for result in outbox.drain(sender, limit):
+        if result["status"] == "success":
+            stats["sent"] += 1
+            print(f"  ✓ {result['review_id'][:20]}... Comment ID: {result['comment_id'][:20]}...")
+            if status:
+                status.add(result["review_id"])
+        else:
+            stats["failed"] += 1
+            print(f"  ✗ {result['review_id'][:20]}...: {result['error']}")
+    if status:
+        status.close()
+    print(f"\nDelivered: {stats['sent']}, failed: {stats['failed']}")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    from config import load_env
+    from sender import add_sender_args
+
+    load_env()
+
+    parser = argparse.ArgumentParser(description="Ozon reviews reply outbox")
+    parser.add_argument("--drain", action="store_true", help="Deliver pending replies")
+    parser.add_argument("--limit", type=int, help="Max replies to deliver")
+    parser.add_argument("--recover", action="store_true", help="Resolve replies stuck in 'sending' after a crash")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Move failed replies without a seller reply on the review back to pending")
+    parser.add_argument("--force", action="store_true", help="With --retry-failed: skip the delivery check")
+    parser.add_argument("--quarantine", action="store_true", help="List replies held for policy violations")
+    parser.add_argument("--release", metavar="REVIEW_ID", help="Release a quarantined reply to pending")
+    parser.add_argument("--text", help="Corrected reply text for --release")
+    parser.add_argument("--no-status-update", action="store_true", help="Skip status update")
+    add_sender_args(parser)
+
+    args = parser.parse_args(argv)
+
+    outbox = Outbox()
+    print("=== Ozon Reviews Outbox ===")
+    print(f"DB: {outbox.path}")
+
+    if args.recover or args.drain:
+        stats = outbox.recover()
+        if any(stats.values()):
+            print(f"Recovered: {stats}")
+    if args.quarantine:
+        for item in outbox.quarantined():
+            print(f"  ⛔ {item['review_id'][:20]}... [{item['source']}]: {item['error']}")
+            print(f"     {item['text'][:120]}")
+    if args.release:
+        released = outbox.release(args.release, args.text)
+        print(f"{'Released' if released else 'Not released'}: {args.release}")
+    if args.retry_failed:
+        # Ответ с таймаутом мог дойти до Ozon: без --force каждый failed сверяется с комментариями
+        print(f"Re-queued {outbox.retry_failed(None if args.force else has_seller_reply)} failed replies")
+
+    if args.drain:
+        deliver(outbox, args.limit, args.rps, args.max_in_flight, update_status=not args.no_status_update)
+
+    print(f"Outbox: {outbox.counts()}")
+
+
+if __name__ == "__main__":
+    from profiling import run_main
+    run_main(main)
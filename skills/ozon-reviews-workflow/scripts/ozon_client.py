@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Ozon Seller API Client
+Общий клиент для всех скриптов:
+- один requests.Session с пулом keep-alive соединений (requests импортируется лениво)
+- заголовки собираются один раз при создании клиента
+- типизированные методы для list/comment/create/change-status
+- постраничное чтение отзывов через has_next/last_id
+- адаптивный лимит скорости/параллельности (AIMD) и повторы на 429/5xx
+- метрики каждого вызова (metrics.py)
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+
+from metrics import get_metrics
+from throttle import AimdLimiter, default_max_in_flight, parse_retry_after, retry_delay
+
+BASE_URL = "https://api-seller.ozon.ru"
+
+# Максимальный размер страницы /v1/review/list
+PAGE_SIZE = 100
+
+# Размер пула соединений (переопределяется OZON_POOL_SIZE)
+DEFAULT_POOL_SIZE = 10
+
+# Ответы, после которых снижаем скорость и повторяем запрос
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+
+_client: Optional["OzonClient"] = None
+
+
+class OzonClient:
+    """Клиент Ozon Seller API поверх одного пула соединений"""
+
+    def __init__(
+        self,
+        client_id: str,
+        api_key: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = 30,
+        base_url: str = BASE_URL,
+        limiter: Optional[AimdLimiter] = None,
+        max_retries: int = MAX_RETRIES
+    ):
+        if not client_id or not api_key:
+            raise ValueError("Missing OZON_CLIENT_ID or OZON_API_KEY")
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = limiter or AimdLimiter(
+            concurrency=min(default_max_in_flight(), pool_size),
+            max_concurrency=pool_size
+        )
+
+        # requests грузится только при создании клиента: --help и dry-run без сети быстрее
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._network_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Client-Id": client_id,
+            "Api-Key": api_key,
+            "Content-Type": "application/json"
+        })
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "OzonClient":
+        """Создаёт клиент из OZON_CLIENT_ID / OZON_API_KEY / OZON_POOL_SIZE / OZON_BASE_URL"""
+        kwargs.setdefault("pool_size", int(os.environ.get("OZON_POOL_SIZE", DEFAULT_POOL_SIZE)))
+        kwargs.setdefault("base_url", os.environ.get("OZON_BASE_URL") or BASE_URL)
+        return cls(
+            os.environ.get("OZON_CLIENT_ID"),
+            os.environ.get("OZON_API_KEY"),
+            **kwargs
+        )
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _post(self, path: str, payload: Dict, idempotent: bool = True) -> Dict:
+        """
+        POST в API через адаптивный лимитер, возвращает JSON ответа
+        - 429 повторяется всегда (запрос отклонён до обработки)
+        - 5xx и сетевые ошибки повторяются только для идемпотентных вызовов
+        - пауза между попытками — экспонента с jitter, не меньше Retry-After
+        """
+        attempt = 0
+        metrics = get_metrics()
+        while True:
+            metrics.sleep(self.limiter.acquire())
+            started = time.monotonic()
+            try:
+                r = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+            except self._network_errors:
+                metrics.request(path, None, time.monotonic() - started)
+                self.limiter.on_error()
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                r = None
+            finally:
+                self.limiter.release()
+
+            if r is not None:
+                metrics.request(path, r.status_code, time.monotonic() - started)
+
+            if r is not None and r.status_code not in RETRY_STATUSES:
+                if r.ok:
+                    self.limiter.on_success(time.monotonic() - started, path)
+                r.raise_for_status()
+                return r.json()
+
+            if r is not None:
+                self.limiter.on_throttle(parse_retry_after(r.headers.get("Retry-After")))
+                if attempt >= self.max_retries or not (idempotent or r.status_code == 429):
+                    r.raise_for_status()
+
+            # acquire() дополнительно дождётся окончания Retry-After
+            delay = retry_delay(attempt)
+            metrics.retry(path)
+            metrics.sleep(delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def list_reviews(
+        self,
+        limit: int = PAGE_SIZE,
+        sort_dir: str = "DESC",
+        sku: Optional[int] = None,
+        last_id: Optional[str] = None
+    ) -> Dict:
+        """Одна страница /v1/review/list (reviews, has_next, last_id)"""
+        payload = {"limit": max(20, min(limit, 100)), "sort_dir": sort_dir}
+        if sku:
+            payload["sku"] = sku
+        if last_id:
+            payload["last_id"] = last_id
+        return self._post("/v1/review/list", payload)
+
+    def iter_reviews(
+        self,
+        sort_dir: str = "DESC",
+        sku: Optional[int] = None,
+        page_size: int = PAGE_SIZE
+    ) -> Iterator[Dict]:
+        """
+        Лениво обходит все страницы /v1/review/list
+        - Отзывы отдаются по мере загрузки страниц
+        - В памяти держится только текущая страница
+        - Вызывающий код может остановиться в любой момент (islice/break),
+          тогда следующие страницы не запрашиваются
+        """
+        last_id = None
+        while True:
+            data = self.list_reviews(page_size, sort_dir=sort_dir, sku=sku, last_id=last_id)
+
+            yield from data.get("reviews", [])
+
+            last_id = data.get("last_id")
+            if not data.get("has_next") or not last_id:
+                return
+
+    def review_info(self, review_id: str) -> Dict:
+        """Один отзыв по id (/v1/review/info) в формате элемента /v1/review/list"""
+        review = self._post("/v1/review/info", {"review_id": review_id})
+        if "photos_amount" not in review:
+            review["photos_amount"] = len(review.get("photos") or [])
+        return review
+
+    def list_comments(self, review_id: str, limit: int = 20) -> List[Dict]:
+        """Комментарии к отзыву"""
+        data = self._post(
+            "/v1/review/comment/list",
+            {"review_id": review_id, "limit": max(20, min(limit, 100))}
+        )
+        return data.get("comments", [])
+
+    def create_comment(self, review_id: str, text: str) -> Dict:
+        """Ответ на отзыв, возвращает {"comment_id": ...}"""
+        return self._post(
+            "/v1/review/comment/create",
+            {"review_id": review_id, "text": text},
+            idempotent=False
+        )
+
+    def change_status(self, review_ids: List[str], status: str = "PROCESSED") -> Dict:
+        """Статус отзывов (1-100 id за запрос)"""
+        return self._post("/v1/review/change-status", {"review_ids": review_ids, "status": status})
+
+
+def get_client() -> OzonClient:
+    """Общий клиент процесса (создаётся при первом вызове)"""
+    global _client
+    if _client is None:
+        try:
+            _client = OzonClient.from_env()
+        except ValueError as e:
+            print(json.dumps({"error": str(e)}, ensure_ascii=False))
+            sys.exit(1)
+    return _client
+
+
+def iter_reviews(
+    sort_dir: str = "DESC",
+    sku: Optional[int] = None,
+    page_size: int = PAGE_SIZE
+) -> Iterator[Dict]:
+    """Все отзывы со всех страниц через общий клиент"""
+    return get_client().iter_reviews(sort_dir=sort_dir, sku=sku, page_size=page_size)
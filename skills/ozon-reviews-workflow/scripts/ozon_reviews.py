@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews CLI
+Единая точка входа: ozon-reviews <команда> [аргументы команды]
+- модуль команды импортируется только после выбора команды: --help и разбор аргументов
+  не тянут requests, sqlite и пулы потоков остальных команд
+- .env читается один раз до импорта команды; сами модули берут настройки из окружения
+  при создании лимитера/журнала/экспорта, поэтому .env работает и у отдельных скриптов
+- --profile / --profile-dir / --profile-top работают для любой команды
+"""
+
+import argparse
+import importlib
+import sys
+from typing import List, Optional
+
+# Команда → (модуль в scripts/, описание)
+COMMANDS = {
+    "list": ("reviews", "List reviews and comments, reply to one review"),
+    "autoreply": ("autoreply", "Auto-reply to 5★ reviews without text or with photos"),
+    "ai-reply": ("ai_reply", "Generate and send replies to reviews with text"),
+    "import": ("import_replies", "Send replies from a JSONL/JSON file"),
+    "mark-processed": ("mark_processed", "Mark answered reviews as PROCESSED"),
+    "workflow": ("workflow", "Full workflow: steps 1-4, parallel or daemon mode"),
+    "accounts": ("accounts", "Run the workflow for several seller accounts"),
+    "export": ("ai_generator", "Export reviews and prompts for AI processing"),
+    "store": ("review_store", "Sync the local reviews store and show its stats"),
+    "archive": ("archive", "Columnar review archive: append from the store, query history"),
+    "outbox": ("outbox", "Reply outbox: drain, recover, retry failed, quarantine"),
+    "classify": ("classifier", "Classify reviews and show routing"),
+    "policy-check": ("policy_check", "Check replies against company policy"),
+    "log": ("run_log", "Read the run log"),
+    "metrics": ("metrics", "Show an API metrics JSON snapshot"),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    width = max(len(name) for name in COMMANDS)
+    commands = "\n".join(f"  {name:<{width}}  {help_text}" for name, (_, help_text) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog="ozon-reviews",
+        usage="%(prog)s [-h] command [args ...]",
+        description="Ozon seller reviews: fetch, reply, mark processed",
+        epilog=f"commands:\n{commands}\n\n"
+               "Run 'ozon-reviews <command> --help' for command options; "
+               "add --profile to any command to profile it.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="One of the commands below")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    module_name = COMMANDS[args.command][0]
+
+    from config import load_env
+    load_env()
+
+    module = importlib.import_module(module_name)
+    # prog в --help и ошибках команды: "ozon-reviews list"
+    sys.argv = [f"ozon-reviews {args.command}", *args.args]
+
+    from profiling import run_main
+    return run_main(module.main, args.args, name=module_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Policy Check
+Проверка ответов на соответствие company-policy.md перед отправкой:
+- запрещённые фразы из раздела «Что НЕ говорить» + встроенный список —
+  один автомат Aho-Corasick, текст просматривается за один проход
+- регулярные выражения для словоформ («оформим/оформлю/оформить возврат», «вернём вам деньги»,
+  «готовы заменить товар», «поможем решить вопрос», ...)
+- отрицание рядом с совпадением в той же части фразы («без компенсаций», «не оформляем возврат»,
+  «компенсация не предусмотрена») нарушением не считается; «Не переживайте, оформим возврат» — нарушение
+- правила компилируются один раз на процесс; outbox ставит нарушителей в карантин
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+POLICY_PATH = Path(__file__).resolve().parent.parent / "references" / "company-policy.md"
+
+# Фразы в дополнение к policy (нормализованные: нижний регистр, ё → е)
+PHRASES = [
+    "оформим возврат",
+    "вернем деньги",
+    "заменим товар",
+    "бесплатную замену",
+    "решим вопрос",
+]
+
+# «Мы готовы / можем / поможем ...» перед инфинитивом — обещание от нашего имени
+# («вы можете», «помогут» в поддержке Ozon — нет)
+_PROMISE = r"(готовы|можем|сможем|поможем|постараемся|предлагаем|хотим|обязательно)\s+(\w+\s+)?"
+
+# Словоформы: глагол от нашего имени + объект возврата/замены
+PATTERNS = [
+    ("обещание возврата", r"\b(оформ|сдела|организу|провед)\w*\s+(вам\s+)?возврат"),
+    ("возврат денег", r"\bверн(ем|у|ут|ул[аи]?|уть)\s+(вам\s+)?(\w+\s+)?(деньги|средства|стоимость|оплату)"),
+    ("компенсация", r"\bкомпенс(ир|ац)\w*"),
+    ("замена товара", r"\b(замен(им|ю|ят)|обменя(ем|ю))\b"),
+    ("замена товара", rf"\b{_PROMISE}(замени|поменя|обменя)ть\b"),
+    ("решение вопроса", rf"\b(реш(им|аем)|{_PROMISE}решить)\s+(\w+\s+)?вопрос"),
+    ("возмещение", r"\bвозмест(им|им вам|ит)\b"),
+]
+
+# Отрицание перед совпадением (до трёх слов в той же части фразы) или сразу после него
+NEGATION_BEFORE = re.compile(r"\b(не|ни|нет|без|никаких|никакой|никакие|невозможно|нельзя)\b")
+NEGATION_AFTER = re.compile(r"^\W*(\w+\W+)?(не\s+(предусм|производ|осуществл|выплач|возмож)|невозможн)")
+# Границы части фразы: отрицание из соседнего предложения, до запятой или тире не действует
+# («Не переживайте, оформим возврат», «Без проблем — компенсируем»)
+CLAUSE_BREAK = re.compile(r"[.!?;:,\n—]|\s[-–]\s")
+
+
+def normalize(text: str) -> str:
+    return (text or "").lower().replace("ё", "е")
+
+
+def policy_phrases(path: Path = POLICY_PATH) -> List[str]:
+    """Цитаты из раздела «Что НЕ говорить» company-policy.md"""
+    if not path.exists():
+        return []
+    phrases, active = [], False
+    for line in path.read_text().splitlines():
+        if line.startswith("#"):
+            active = "НЕ говорить" in line
+        elif active:
+            phrases += re.findall(r'"([^"]+)"', line)
+    return [normalize(p) for p in phrases]
+
+
+class AhoCorasick:
+    """Автомат Aho-Corasick: все вхождения набора фраз за один проход по тексту"""
+
+    def __init__(self, phrases: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[str]] = [[]]
+        for phrase in phrases:
+            self._add(phrase)
+        self._build()
+
+    def _add(self, phrase: str):
+        node = 0
+        for ch in phrase:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = nxt
+        if phrase not in self.out[node]:
+            self.out[node].append(phrase)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] += self.out[self.fail[nxt]]
+
+    def find(self, text: str) -> List[str]:
+        """Найденные фразы (без повторов, в порядке первого вхождения)"""
+        return list(dict.fromkeys(phrase for phrase, _start in self.matches(text)))
+
+    def matches(self, text: str) -> Iterator[Tuple[str, int]]:
+        """Все вхождения: (фраза, позиция начала)"""
+        node = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for phrase in out[node]:
+                yield phrase, i + 1 - len(phrase)
+
+
+def negated(text: str, start: int, end: int) -> bool:
+    """Совпадение text[start:end] стоит под отрицанием: «без компенсаций», «компенсация не предусмотрена»"""
+    before = text[:start]
+    breaks = list(CLAUSE_BREAK.finditer(before))
+    clause = before[breaks[-1].end():] if breaks else before
+    if NEGATION_BEFORE.search(" ".join(clause.split()[-3:])):
+        return True
+    return bool(NEGATION_AFTER.match(text[end:]))
+
+
+class PolicyValidator:
+    """Проверка текста ответа: список причин (пустой — ответ допустим)"""
+
+    def __init__(self, phrases: Optional[List[str]] = None, patterns: Optional[List[Tuple[str, str]]] = None):
+        phrases = PHRASES + policy_phrases() if phrases is None else phrases
+        self.automaton = AhoCorasick(dict.fromkeys(phrases))
+        self.patterns = [(reason, re.compile(p)) for reason, p in (PATTERNS if patterns is None else patterns)]
+
+    def check(self, text: str) -> List[str]:
+        text = normalize(text)
+        phrases = (
+            phrase for phrase, start in self.automaton.matches(text)
+            if not negated(text, start, start + len(phrase))
+        )
+        reasons = [f"фраза «{phrase}»" for phrase in dict.fromkeys(phrases)]
+        for reason, pattern in self.patterns:
+            for match in pattern.finditer(text):
+                if not negated(text, match.start(), match.end()):
+                    reasons.append(f"{reason}: «{match.group(0)}»")
+                    break
+        return list(dict.fromkeys(reasons))
+
+    def scan(self, items: Iterable[Dict], field: str = "ai_reply") -> Iterable[Tuple[Dict, List[str]]]:
+        """(запись, причины) для каждой записи с нарушениями"""
+        for item in items:
+            reasons = self.check(item.get(field) or "")
+            if reasons:
+                yield item, reasons
+
+
+_validator: Optional[PolicyValidator] = None
+
+
+def get_validator() -> PolicyValidator:
+    """Общий валидатор процесса (правила компилируются при первом вызове)"""
+    global _validator
+    if _validator is None:
+        _validator = PolicyValidator()
+    return _validator
+
+
+def check_reply(text: str) -> List[str]:
+    """Причины, по которым ответ нельзя отправлять"""
+    return get_validator().check(text)
+
+
+def main(argv: Optional[List[str]] = None):
+    from jsonl import iter_records
+
+    parser = argparse.ArgumentParser(description="Check AI replies against company policy")
+    parser.add_argument("file", help="JSONL (or JSON array) file with replies")
+    parser.add_argument("--json", action="store_true", help="Output violations as JSON lines")
+
+    args = parser.parse_args(argv)
+
+    validator = get_validator()
+    total = bad = 0
+
+    def counted():
+        nonlocal total
+        for item in iter_records(args.file):
+            total += 1
+            yield item
+
+    for item, reasons in validator.scan(counted()):
+        bad += 1
+        if args.json:
+            print(json.dumps({"id": item.get("id"), "reasons": reasons}, ensure_ascii=False))
+        else:
+            print(f"✗ {str(item.get('id'))[:20]}...: {'; '.join(reasons)}")
+            print(f"   {item.get('ai_reply', '')[:120]}")
+
+    if not args.json:
+        print(f"\nChecked {total} replies, {bad} violate the policy")
+    if bad:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    from profiling import run_main
+    run_main(main)
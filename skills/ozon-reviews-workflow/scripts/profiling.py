@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Profiling
+Профилирование любого скрипта без правки кода: флаг --profile (или env OZON_PROFILE=1)
+- фазы: fetch, filter, generate, send, status, log — время по часам (span) в каждом потоке
+- cProfile основного потока: .prof (pstats/snakeviz) и top-N в summary.txt
+- сэмплер всех потоков (sys._current_frames): stacks.collapsed для flamegraph.pl / speedscope,
+  корень стека — текущая фаза потока
+Без --profile span() почти ничего не стоит.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+PHASES = ("fetch", "filter", "generate", "send", "status", "log")
+# Шаг сэмплера, с (env OZON_PROFILE_INTERVAL читается при создании сэмплера)
+DEFAULT_INTERVAL = 0.005
+DEFAULT_TOP = 25
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+# Фаза каждого потока для сэмплера: id потока → имя фазы
+_current: Dict[int, str] = {}
+# Фаза → [суммарное время, число входов]
+_spans: Dict[str, List[float]] = {}
+
+
+class span:
+    """
+    Фаза работы: with span("send"): ...
+    Вложенная фаза того же потока учитывается отдельно; в стеке сэмплера — самая внутренняя.
+    """
+
+    __slots__ = ("name", "started", "outer")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        if _enabled:
+            self.outer = getattr(_local, "phase", None)
+            _local.phase = _current[threading.get_ident()] = self.name
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is None:
+            return False
+        elapsed = time.perf_counter() - self.started
+        with _lock:
+            total = _spans.setdefault(self.name, [0.0, 0])
+            total[0] += elapsed
+            total[1] += 1
+        _local.phase = self.outer
+        if self.outer is None:
+            _current.pop(threading.get_ident(), None)
+        else:
+            _current[threading.get_ident()] = self.outer
+        return False
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """Снимает стеки всех потоков раз в interval секунд"""
+
+    def __init__(self, interval: Optional[float] = None):
+        super().__init__(name="ozon-profile-sampler", daemon=True)
+        self.interval = interval or float(os.environ.get("OZON_PROFILE_INTERVAL") or DEFAULT_INTERVAL)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._halt.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                names.append(_current.get(thread_id, "-"))
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+class Profiler:
+    """cProfile + сэмплер + фазы на время одного прогона"""
+
+    def __init__(self, name: str, out_dir: Optional[Path] = None, top: int = DEFAULT_TOP,
+                 interval: Optional[float] = None):
+        if out_dir is None:
+            from run_log import default_log_dir
+            out_dir = default_log_dir() / "profiles" / f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # cProfile/pstats нужны только под --profile и не грузятся при обычном запуске
+        import cProfile
+
+        self.out_dir = Path(out_dir)
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.sampler = Sampler(interval)
+
+    def start(self):
+        global _enabled
+        _spans.clear()
+        _enabled = True
+        self.started = time.perf_counter()
+        self.sampler.start()
+        self.profile.enable()
+
+    def stop(self) -> Path:
+        global _enabled
+        self.profile.disable()
+        self.sampler.stop()
+        self.wall = time.perf_counter() - self.started
+        _enabled = False
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.profile.dump_stats(str(self.out_dir / "cprofile.prof"))
+        with open(self.out_dir / "stacks.collapsed", "w", encoding="utf-8") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        (self.out_dir / "summary.txt").write_text(self.summary(), encoding="utf-8")
+        return self.out_dir
+
+    def phases(self) -> str:
+        lines = [f"Wall time: {self.wall:.3f} s, samples: {self.sampler.samples}", "",
+                 f"{'phase':<12}{'seconds':>10}{'% wall':>9}{'calls':>8}"]
+        # Сначала известные фазы по порядку, затем остальные по имени
+        ordered = sorted(_spans.items(), key=lambda kv: (PHASES.index(kv[0]) if kv[0] in PHASES else len(PHASES), kv[0]))
+        for name, (seconds, calls) in ordered:
+            lines.append(f"{name:<12}{seconds:>10.3f}{seconds / self.wall * 100 if self.wall else 0:>8.1f}%{int(calls):>8}")
+        lines.append("(фазы в потоках отправки суммируются: % может превышать 100)")
+        return "\n".join(lines)
+
+    def summary(self) -> str:
+        import io
+        import pstats
+
+        parts = [self.phases()]
+        for sort in ("cumulative", "tottime"):
+            buffer = io.StringIO()
+            pstats.Stats(self.profile, stream=buffer).strip_dirs().sort_stats(sort).print_stats(self.top)
+            parts.append(f"\n=== cProfile (main thread), top {self.top} by {sort} ===\n{buffer.getvalue().strip()}")
+        return "\n".join(parts) + "\n"
+
+
+def _pop_option(argv: List[str], name: str, takes_value: bool) -> Optional[str]:
+    """Забирает --name [value] / --name=value из argv; None — опции нет"""
+    for i, arg in enumerate(argv):
+        if arg == name:
+            del argv[i]
+            return argv.pop(i) if takes_value and i < len(argv) else ""
+        if arg.startswith(name + "="):
+            del argv[i]
+            return arg.split("=", 1)[1]
+    return None
+
+
+def run_main(main: Callable, argv: Optional[List[str]] = None, name: Optional[str] = None):
+    """
+    Точка входа скрипта: main() под профилировщиком, если задан --profile / OZON_PROFILE=1
+    --profile-dir DIR — куда писать (по умолчанию profiles/<name или скрипт>_<время> рядом с журналом),
+    --profile-top N — строк в top-N
+    """
+    # OZON_PROFILE* могут быть заданы в .env: читаем его до проверки флагов
+    from config import load_env
+    load_env()
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    enabled = _pop_option(argv, "--profile", False) is not None or os.environ.get("OZON_PROFILE") == "1"
+    out_dir = _pop_option(argv, "--profile-dir", True) or os.environ.get("OZON_PROFILE_DIR")
+    top = _pop_option(argv, "--profile-top", True)
+    if not enabled:
+        return main(argv)
+
+    name = name or Path(sys.argv[0]).stem or "script"
+    profiler = Profiler(name, Path(out_dir) if out_dir else None, int(top or DEFAULT_TOP))
+    profiler.start()
+    try:
+        return main(argv)
+    finally:
+        written = profiler.stop()
+        print(f"\n⏱  Профиль: {written}")
+        print(profiler.phases())
+        print(f"   cprofile.prof — pstats/snakeviz, stacks.collapsed — flamegraph.pl/speedscope, summary.txt — top-{profiler.top}")
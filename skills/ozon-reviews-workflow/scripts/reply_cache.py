@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Reply Cache
+Экономия LLM-вызовов на однотипных отзывах:
+- кэш ответов по ключу (нормализованный текст + рейтинг + SKU), SQLite
+- кластеризация почти одинаковых текстов (MinHash по символьным шинглам + LSH):
+  на кластер (один рейтинг и SKU) — одна генерация, участникам — тот же ответ
+  с дешёвой вариацией приветствия
+- CachingBackend оборачивает любой ReplyBackend из llm_backend
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import DATA_DIR
+from llm_backend import ReplyBackend
+
+DEFAULT_DB = DATA_DIR / "reply_cache.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replies (
+    key TEXT PRIMARY KEY,
+    reply TEXT NOT NULL,
+    backend TEXT,
+    created_at TEXT,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+SHINGLE = 3
+NUM_PERM = 64
+BANDS = 16
+# Порог оценённого сходства Жаккара для попадания в кластер
+SIMILARITY = 0.8
+
+_PRIME = (1 << 61) - 1
+_PERMS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _PRIME or 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _PRIME)
+    for i in range(NUM_PERM)
+]
+
+GREETINGS = ["Здравствуйте!", "Добрый день!", "Приветствуем!"]
+
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр, ё→е, без пунктуации и эмодзи, одиночные пробелы"""
+    text = (text or "").lower().replace("ё", "е")
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def cache_key(review: Dict) -> str:
+    """Ключ ответа: нормализованный текст + рейтинг + SKU"""
+    raw = f"{review.get('rating')}|{review.get('sku')}|{normalize_text(review.get('text', ''))}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash-сигнатура по символьным шинглам нормализованного текста"""
+    text = normalize_text(text)
+    shingles = {text[i:i + SHINGLE] for i in range(max(1, len(text) - SHINGLE + 1))}
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Оценка сходства Жаккара по сигнатурам"""
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def cluster_reviews(reviews: List[Dict], threshold: float = SIMILARITY) -> List[List[Dict]]:
+    """
+    Кластеры почти одинаковых отзывов (внутри одного рейтинга и SKU, как и ключ кэша:
+    ответ про один товар не переносится на другой)
+    Кандидаты — через LSH по полосам сигнатуры, пары проверяются по threshold.
+    """
+    # Одинаковые после нормализации тексты хешируются один раз
+    memo: Dict[str, List[int]] = {}
+    signatures = []
+    for r in reviews:
+        text = normalize_text(r.get("text", ""))
+        if text not in memo:
+            memo[text] = minhash(text)
+        signatures.append(memo[text])
+    parent = list(range(len(reviews)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = NUM_PERM // BANDS
+    for band in range(BANDS):
+        buckets: Dict[tuple, List[int]] = {}
+        for i, sig in enumerate(signatures):
+            key = (reviews[i].get("rating"), reviews[i].get("sku"), tuple(sig[band * rows:(band + 1) * rows]))
+            buckets.setdefault(key, []).append(i)
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                if find(first) != find(other) and similarity(signatures[first], signatures[other]) >= threshold:
+                    parent[find(other)] = find(first)
+
+    clusters: Dict[int, List[Dict]] = {}
+    for i, review in enumerate(reviews):
+        clusters.setdefault(find(i), []).append(review)
+    return list(clusters.values())
+
+
+def vary(reply: str, review_id: str) -> str:
+    """Дешёвая вариация ответа: приветствие выбирается по id отзыва"""
+    for greeting in GREETINGS:
+        if reply.startswith(greeting):
+            choice = GREETINGS[zlib.crc32(review_id.encode("utf-8")) % len(GREETINGS)]
+            return choice + reply[len(greeting):]
+    return reply
+
+
+class ReplyCache:
+    """SQLite-кэш ответов по cache_key"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or os.environ.get("OZON_REPLY_CACHE_DB") or DEFAULT_DB)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ", ".join("?" * len(chunk))
+                found.update(self.conn.execute(
+                    f"SELECT key, reply FROM replies WHERE key IN ({marks})", chunk
+                ).fetchall())
+                self.conn.execute(f"UPDATE replies SET hits = hits + 1 WHERE key IN ({marks})", chunk)
+            self.conn.commit()
+        return found
+
+    def put_many(self, replies: Dict[str, str], backend: str = ""):
+        now = datetime.now().isoformat()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO replies (key, reply, backend, created_at) VALUES (?, ?, ?, ?)",
+                [(key, reply, backend, now) for key, reply in replies.items()]
+            )
+            self.conn.commit()
+
+
+class CachingBackend(ReplyBackend):
+    """
+    Обёртка над backend'ом: кэш → кластеры → одна генерация на кластер
+    stats: cached, clusters, generated, reused
+    """
+
+    def __init__(self, backend: ReplyBackend, cache: Optional[ReplyCache] = None, threshold: float = SIMILARITY):
+        self.backend = backend
+        self.cache = cache or ReplyCache()
+        self.threshold = threshold
+        self.name = f"{backend.name}+cache"
+        self.stats = {"cached": 0, "clusters": 0, "generated": 0, "reused": 0}
+
+    def close(self):
+        self.backend.close()
+        self.cache.close()
+
+    def generate(self, reviews: List[Dict]) -> Dict[str, str]:
+        keys = {r["id"]: cache_key(r) for r in reviews}
+        cached = self.cache.get_many(sorted(set(keys.values())))
+        replies = {r["id"]: vary(cached[keys[r["id"]]], r["id"]) for r in reviews if keys[r["id"]] in cached}
+        self.stats["cached"] += len(replies)
+
+        misses = [r for r in reviews if r["id"] not in replies]
+        if not misses:
+            return replies
+
+        clusters = cluster_reviews(misses, self.threshold)
+        self.stats["clusters"] += len(clusters)
+        generated = self.backend.generate([cluster[0] for cluster in clusters])
+        self.stats["generated"] += len(generated)
+
+        fresh = {}
+        for cluster in clusters:
+            reply = generated.get(cluster[0]["id"])
+            if not reply:
+                continue
+            for review in cluster:
+                replies[review["id"]] = vary(reply, review["id"])
+                fresh[keys[review["id"]]] = reply
+            self.stats["reused"] += len(cluster) - 1
+        self.cache.put_many(fresh, self.backend.name)
+        return replies
@@ -0,0 +1,741 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Store
+Локальная SQLite-копия отзывов:
+- инкрементальная синхронизация: читаем /v1/review/list от новых к старым,
+  пока не дойдём до watermark (published_at последней синхронизации)
+- прерванная полная синхронизация продолжается с сохранённого last_id
+- индексы по id, sku, rating, status, has_text, has_photo
+- свои ответы и смены статуса сразу отражаются в базе
+- delta-синхронизация не видит изменений в отзывах старше watermark (чужие ответы,
+  смена статуса в кабинете), поэтому кандидаты на ответ, не перечитанные синхронизацией
+  этого процесса, перепроверяются в API перед отправкой (unanswered), а UNPROCESSED-строки перечитываются порциями (refresh_unprocessed)
+- кэш комментариев: действителен, пока у отзыва не изменился comments_amount;
+  «есть ли ответ продавца» — индексированный запрос
+Все скрипты читают отзывы отсюда: один delta-запрос вместо N полных выборок.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from config import DATA_DIR
+from profiling import span
+
+DEFAULT_DB = DATA_DIR / "reviews.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id TEXT PRIMARY KEY,
+    sku INTEGER,
+    rating INTEGER,
+    status TEXT,
+    published_at TEXT,
+    has_text INTEGER,
+    has_photo INTEGER,
+    comments_amount INTEGER,
+    raw TEXT NOT NULL,
+    synced_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reviews_sku ON reviews(sku);
+CREATE INDEX IF NOT EXISTS idx_reviews_route ON reviews(status, rating, has_text, has_photo);
+CREATE INDEX IF NOT EXISTS idx_reviews_published ON reviews(published_at);
+CREATE TABLE IF NOT EXISTS comments (
+    review_id TEXT PRIMARY KEY,
+    comments_amount INTEGER,
+    seller_replied INTEGER NOT NULL DEFAULT 0,
+    raw TEXT,
+    fetched_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_comments_replied ON comments(seller_replied);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Параметров в одном SQL-запросе (лимит SQLite по умолчанию — 999)
+ID_CHUNK = 500
+
+_store: Optional["ReviewStore"] = None
+_synced = False
+
+
+class ReviewStore:
+    """SQLite-хранилище отзывов"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or os.environ.get("OZON_REVIEWS_DB") or DEFAULT_DB)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        # Начало последней синхронизации в этом процессе: строки с synced_at не раньше — свежие
+        self.synced_at: Optional[str] = None
+
+    def close(self):
+        self.conn.close()
+
+    # --- состояние синхронизации ---
+
+    def get_state(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_state(self, key: str, value: Optional[str]):
+        if value is None:
+            self.conn.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+        else:
+            self.conn.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    # --- запись ---
+
+    def upsert(self, reviews: Iterable[Dict]) -> int:
+        """Добавляет/обновляет отзывы, возвращает количество"""
+        now = datetime.now().isoformat()
+        rows = [
+            (
+                r["id"],
+                r.get("sku"),
+                r.get("rating"),
+                r.get("status"),
+                r.get("published_at", ""),
+                int(bool((r.get("text") or "").strip())),
+                int(r.get("photos_amount", 0) > 0),
+                r.get("comments_amount", 0),
+                json.dumps(r, ensure_ascii=False),
+                now
+            )
+            for r in reviews
+        ]
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO reviews (id, sku, rating, status, published_at, has_text, has_photo, "
+                "comments_amount, raw, synced_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET sku = excluded.sku, rating = excluded.rating, "
+                "status = excluded.status, published_at = excluded.published_at, "
+                "has_text = excluded.has_text, has_photo = excluded.has_photo, "
+                "comments_amount = excluded.comments_amount, raw = excluded.raw, "
+                "synced_at = excluded.synced_at",
+                rows
+            )
+        return len(rows)
+
+    def set_status(self, review_ids: List[str], status: str):
+        """Отражает смену статуса, сделанную нами"""
+        with self._lock:
+            for review_id in review_ids:
+                self._patch(review_id, status=status)
+            self.conn.commit()
+
+    def delete(self, review_ids: List[str]):
+        """Удаляет отзывы, которых больше нет в API, вместе с кэшем комментариев"""
+        with self._lock:
+            for i in range(0, len(review_ids), ID_CHUNK):
+                chunk = review_ids[i:i + ID_CHUNK]
+                marks = ", ".join("?" * len(chunk))
+                self.conn.execute(f"DELETE FROM reviews WHERE id IN ({marks})", chunk)
+                self.conn.execute(f"DELETE FROM comments WHERE review_id IN ({marks})", chunk)
+            self.conn.commit()
+
+    def mark_replied(self, review_id: str):
+        """Отражает отправленный нами ответ (comments_amount + 1)"""
+        with self._lock:
+            row = self.conn.execute("SELECT comments_amount FROM reviews WHERE id = ?", (review_id,)).fetchone()
+            amount = (row["comments_amount"] or 0) + 1 if row else None
+            if row:
+                self._patch(review_id, comments_amount=amount)
+            # Ответ продавца точно есть; текст комментариев перечитается при следующей загрузке
+            self.conn.execute(
+                "INSERT INTO comments (review_id, comments_amount, seller_replied, raw, fetched_at) "
+                "VALUES (?, ?, 1, NULL, ?) ON CONFLICT(review_id) DO UPDATE SET "
+                "comments_amount = excluded.comments_amount, seller_replied = 1, raw = NULL",
+                (review_id, amount, datetime.now().isoformat())
+            )
+            self.conn.commit()
+
+    def _patch(self, review_id: str, **fields):
+        row = self.conn.execute("SELECT raw FROM reviews WHERE id = ?", (review_id,)).fetchone()
+        if not row:
+            return
+        raw = json.loads(row["raw"])
+        raw.update(fields)
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        self.conn.execute(
+            f"UPDATE reviews SET {assignments}, raw = ? WHERE id = ?",
+            (*fields.values(), json.dumps(raw, ensure_ascii=False), review_id)
+        )
+
+    # --- кэш комментариев ---
+
+    def save_comments(self, review_id: str, comments: List[Dict], comments_amount: Optional[int] = None):
+        """Сохраняет комментарии отзыва вместе с comments_amount, при котором они получены"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO comments (review_id, comments_amount, seller_replied, raw, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(review_id) DO UPDATE SET "
+                "comments_amount = excluded.comments_amount, seller_replied = excluded.seller_replied, "
+                "raw = excluded.raw, fetched_at = excluded.fetched_at",
+                (
+                    review_id,
+                    len(comments) if comments_amount is None else comments_amount,
+                    int(any(c.get("is_owner") for c in comments)),
+                    json.dumps(comments, ensure_ascii=False),
+                    datetime.now().isoformat()
+                )
+            )
+            self.conn.commit()
+
+    def stale_comments(self, review_ids: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Отзывы, чей кэш комментариев отсутствует или устарел: {id: текущий comments_amount}
+        (None — отзыва нет в базе)
+        """
+        stale = {}
+        for i in range(0, len(review_ids), ID_CHUNK):
+            chunk = review_ids[i:i + ID_CHUNK]
+            marks = ", ".join("?" * len(chunk))
+            with self._lock:
+                amounts = dict(self.conn.execute(
+                    f"SELECT id, comments_amount FROM reviews WHERE id IN ({marks})", chunk
+                ).fetchall())
+                cached = {
+                    row["review_id"]: row for row in self.conn.execute(
+                        f"SELECT review_id, comments_amount, raw IS NULL AS empty FROM comments "
+                        f"WHERE review_id IN ({marks})", chunk
+                    )
+                }
+            for review_id in chunk:
+                row = cached.get(review_id)
+                amount = amounts.get(review_id)
+                if row is None or row["empty"] or (amount is not None and amount != row["comments_amount"]):
+                    stale[review_id] = amount
+        return stale
+
+    def cached_comments(self, review_id: str) -> Optional[List[Dict]]:
+        """Комментарии из кэша (None — кэша нет или он устарел)"""
+        if self.stale_comments([review_id]):
+            return None
+        with self._lock:
+            row = self.conn.execute("SELECT raw FROM comments WHERE review_id = ?", (review_id,)).fetchone()
+        return json.loads(row["raw"])
+
+    def seller_replied(self, review_ids: List[str]) -> List[str]:
+        """Из списка id — те, где в кэше есть ответ продавца"""
+        replied = []
+        for i in range(0, len(review_ids), ID_CHUNK):
+            chunk = review_ids[i:i + ID_CHUNK]
+            with self._lock:
+                replied += [row[0] for row in self.conn.execute(
+                    f"SELECT review_id FROM comments WHERE seller_replied = 1 "
+                    f"AND review_id IN ({', '.join('?' * len(chunk))})", chunk
+                )]
+        return replied
+
+    # --- синхронизация ---
+
+    def sync(self, client, full: bool = False) -> Dict:
+        """
+        Синхронизирует базу с API
+        - head: от новых к старым, пока не встретится отзыв старше watermark
+          (без watermark или с full=True — до конца списка)
+        - backfill: если прошлая полная синхронизация прервалась, продолжает её с last_id
+        """
+        watermark = None if full else self.get_state("watermark")
+        stats = {"fetched": 0, "pages": 0}
+        started = datetime.now().isoformat()
+
+        with span("fetch"):
+            if watermark is None:
+                # Полный проход: watermark фиксируем сразу, хвост догоняется через backfill_cursor
+                self._walk(client, None, None, stats, track_cursor=True)
+            else:
+                self._walk(client, None, watermark, stats, track_cursor=False)
+                cursor = self.get_state("backfill_cursor")
+                if cursor:
+                    self._walk(client, cursor, None, stats, track_cursor=True)
+
+        self.synced_at = started
+        stats["watermark"] = self.get_state("watermark")
+        stats["total"] = self.count()
+        return stats
+
+    def _walk(self, client, last_id: Optional[str], stop_before: Optional[str], stats: Dict, track_cursor: bool):
+        newest = self.get_state("watermark") or ""
+        while True:
+            data = client.list_reviews(sort_dir="DESC", last_id=last_id)
+            reviews = data.get("reviews", [])
+            with self._lock:
+                self.upsert(reviews)
+                stats["fetched"] += len(reviews)
+                stats["pages"] += 1
+                newest = max([newest] + [r.get("published_at", "") for r in reviews])
+                last_id = data.get("last_id") if data.get("has_next") else None
+
+                reached = stop_before is not None and any(
+                    r.get("published_at", "") < stop_before for r in reviews
+                )
+                done = reached or not last_id
+                # В head-проходе watermark двигаем только в конце, иначе сбой оставит дыру
+                if track_cursor or done:
+                    self._set_state("watermark", newest or None)
+                if track_cursor:
+                    self._set_state("backfill_cursor", None if done else last_id)
+                self.conn.commit()
+            if done:
+                return
+
+    # --- чтение ---
+
+    def get(self, review_id: str) -> Optional[Dict]:
+        """Отзыв по id (по первичному ключу)"""
+        with self._lock:
+            row = self.conn.execute("SELECT raw FROM reviews WHERE id = ?", (review_id,)).fetchone()
+        return json.loads(row["raw"]) if row else None
+
+    def get_many(self, review_ids: List[str]) -> Dict[str, Dict]:
+        """Отзывы по списку id: {id: отзыв}, отсутствующих в базе в ответе нет"""
+        found = {}
+        for i in range(0, len(review_ids), ID_CHUNK):
+            chunk = review_ids[i:i + ID_CHUNK]
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT id, raw FROM reviews WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            found.update((row["id"], json.loads(row["raw"])) for row in rows)
+        return found
+
+    def iter_appended(self, after: int = 0, chunk: int = 5000) -> Iterator[tuple]:
+        """
+        (rowid, отзыв) в порядке появления в базе, начиная после rowid after
+        rowid не меняется при обновлении отзыва, поэтому новые отзывы (и догруженные
+        старые) всегда идут после уже выгруженных — для инкрементальных выгрузок (archive.py).
+        """
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT rowid, raw FROM reviews WHERE rowid > ? ORDER BY rowid LIMIT ?", (after, chunk)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[0], json.loads(row["raw"])
+            after = rows[-1][0]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+    def synced_since(self, review_ids: List[str], since: str) -> Set[str]:
+        """Из списка id — те, что перечитаны из API не раньше since"""
+        fresh = set()
+        for i in range(0, len(review_ids), ID_CHUNK):
+            chunk = review_ids[i:i + ID_CHUNK]
+            with self._lock:
+                fresh.update(row[0] for row in self.conn.execute(
+                    f"SELECT id FROM reviews WHERE synced_at >= ? "
+                    f"AND id IN ({', '.join('?' * len(chunk))})", [since, *chunk]
+                ))
+        return fresh
+
+    def least_recently_synced(self, status: str = "UNPROCESSED", limit: int = 100) -> List[str]:
+        """id отзывов со статусом status, дольше всех не перечитывавшихся из API"""
+        with self._lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT id FROM reviews WHERE status = ? ORDER BY synced_at LIMIT ?", (status, limit)
+            )]
+
+    def _where(
+        self,
+        status: Optional[str] = None,
+        rating_min: Optional[int] = None,
+        rating_max: Optional[int] = None,
+        sku: Optional[int] = None,
+        has_text: Optional[bool] = None,
+        has_photo: Optional[bool] = None,
+        commented: Optional[bool] = None,
+        seller_replied: Optional[bool] = None
+    ) -> tuple:
+        """WHERE и параметры для query/load_batch"""
+        where, params = [], []
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        if rating_min is not None:
+            where.append("rating >= ?")
+            params.append(rating_min)
+        if rating_max is not None:
+            where.append("rating <= ?")
+            params.append(rating_max)
+        if sku is not None:
+            where.append("sku = ?")
+            params.append(sku)
+        if has_text is not None:
+            where.append("has_text = ?")
+            params.append(int(has_text))
+        if has_photo is not None:
+            where.append("has_photo = ?")
+            params.append(int(has_photo))
+        if commented is not None:
+            where.append("comments_amount > 0" if commented else "comments_amount = 0")
+        if seller_replied is not None:
+            where.append(
+                ("" if seller_replied else "NOT ")
+                + "EXISTS (SELECT 1 FROM comments c WHERE c.review_id = reviews.id AND c.seller_replied = 1)"
+            )
+        return (" WHERE " + " AND ".join(where) if where else ""), params
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        rating_min: Optional[int] = None,
+        rating_max: Optional[int] = None,
+        sku: Optional[int] = None,
+        has_text: Optional[bool] = None,
+        has_photo: Optional[bool] = None,
+        commented: Optional[bool] = None,
+        seller_replied: Optional[bool] = None,
+        sort_dir: str = "DESC",
+        limit: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Отзывы по фильтрам (по индексам), в формате ответа API
+        seller_replied — по кэшу комментариев (см. prefetch_comments)
+        """
+        where, params = self._where(status, rating_min, rating_max, sku, has_text, has_photo, commented, seller_replied)
+        sql = "SELECT raw FROM reviews" + where
+        sql += " ORDER BY published_at " + ("ASC" if sort_dir == "ASC" else "DESC")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        # Соединение общее для потоков: читаем порциями под блокировкой
+        with span("filter"), self._lock:
+            cursor = self.conn.execute(sql, params)
+        while True:
+            # Фаза — только чтение порции, не работа вызывающего кода между yield
+            with span("filter"):
+                with self._lock:
+                    rows = cursor.fetchmany(500)
+                reviews = [json.loads(row["raw"]) for row in rows]
+            if not reviews:
+                return
+            yield from reviews
+
+    def load_batch(self, keep_text: bool = False, sort_dir: str = "DESC", limit: Optional[int] = None, **filters):
+        """
+        Отзывы по фильтрам query() колонками (records.ReviewBatch)
+        Поля берутся из колонок таблицы и json_extract, raw целиком не разбирается:
+        сотни тысяч отзывов помещаются в десятки МБ.
+        """
+        from records import ReviewBatch
+
+        where, params = self._where(**filters)
+        text = "COALESCE(json_extract(raw, '$.text'), '')" if keep_text else "NULL"
+        sql = (
+            "SELECT id, COALESCE(sku, 0), COALESCE(rating, 0), status, published_at, "
+            "COALESCE(json_extract(raw, '$.photos_amount'), 0), COALESCE(comments_amount, 0), "
+            f"{text}, has_text FROM reviews{where} "
+            "ORDER BY published_at " + ("ASC" if sort_dir == "ASC" else "DESC")
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        batch = ReviewBatch(keep_text)
+        with span("filter"), self._lock:
+            # Кортежи вместо sqlite3.Row: строки сразу раскладываются по колонкам
+            cursor = self.conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(5000)
+                if not rows:
+                    break
+                batch.add_rows(rows)
+        return batch
+
+
+def get_store() -> ReviewStore:
+    """Общее хранилище процесса"""
+    global _store
+    if _store is None:
+        _store = ReviewStore()
+    return _store
+
+
+def synced_store(full: bool = False) -> ReviewStore:
+    """Хранилище, синхронизированное с API (delta-синхронизация — один раз на процесс)"""
+    global _synced
+    store = get_store()
+    if full or not _synced:
+        from ozon_client import get_client
+        store.sync(get_client(), full=full)
+        _synced = True
+    return store
+
+
+def _fetch_info(review_ids: List[str], strict: bool = True) -> Dict[str, Optional[Dict]]:
+    """
+    /v1/review/info по списку id, параллельно в пределах лимитера; найденные сохраняются в базу
+    {id: отзыв}; неизвестные Ozon id (400/404) — None, прочие ошибки пробрасываются
+    (strict) или такие id просто не попадают в ответ
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import requests
+    from ozon_client import get_client
+    from throttle import default_max_in_flight
+
+    client = get_client()
+
+    def fetch(review_id: str):
+        try:
+            with span("fetch"):
+                return review_id, client.review_info(review_id)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code in (400, 404):
+                return review_id, None
+            if strict:
+                raise
+        except Exception:
+            if strict:
+                raise
+        return review_id, False
+
+    with ThreadPoolExecutor(max_workers=max(1, min(default_max_in_flight(), len(review_ids)))) as pool:
+        results = {review_id: r for review_id, r in pool.map(fetch, review_ids) if r is not False}
+    fetched = [r for r in results.values() if r and r.get("id")]
+    if fetched:
+        store = get_store()
+        with store._lock:
+            store.upsert(fetched)
+            store.conn.commit()
+    return {review_id: r if r and r.get("id") else None for review_id, r in results.items()}
+
+
+def lookup_reviews(review_ids: Iterable[str], fetch_missing: bool = True) -> Dict[str, Dict]:
+    """
+    Отзывы по id без выкачивания страниц
+    - сначала локальная база (первичный ключ, пачками)
+    - недостающие — адресно через /v1/review/info, параллельно в пределах лимитера;
+      найденные сохраняются в базу
+    Неизвестные Ozon id в ответ не попадают.
+    """
+    ids = list(dict.fromkeys(review_ids))
+    found = get_store().get_many(ids)
+    missing = [review_id for review_id in ids if review_id not in found]
+    if not missing or not fetch_missing:
+        return found
+
+    found.update((review_id, r) for review_id, r in _fetch_info(missing).items() if r)
+    return found
+
+
+def refresh_reviews(review_ids: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Перечитывает отзывы из API (/v1/review/info) и обновляет базу, возвращает {id: свежий отзыв}
+    Отзывы, удалённые в Ozon, удаляются и из базы; не перечитанные из-за ошибки в ответ не попадают.
+    """
+    ids = list(dict.fromkeys(review_ids))
+    if not ids:
+        return {}
+    results = _fetch_info(ids, strict=False)
+    gone = [review_id for review_id, r in results.items() if r is None]
+    if gone:
+        get_store().delete(gone)
+    return {review_id: r for review_id, r in results.items() if r}
+
+
+def refresh_unprocessed(limit: int = 100) -> int:
+    """
+    Перечитывает limit UNPROCESSED-отзывов, дольше всех не обновлявшихся
+    (delta-синхронизация до них не доходит), возвращает число перечитанных
+    Каждый вызов берёт следующую порцию: synced_at перечитанных сдвигается вперёд.
+    """
+    return len(refresh_reviews(get_store().least_recently_synced("UNPROCESSED", limit)))
+
+
+def unanswered(reviews: Iterable[Dict]) -> List[Dict]:
+    """
+    Кандидаты на ответ, перепроверенные перед отправкой (порядок сохраняется)
+    - статус и comments_amount берутся свежие: строки, перечитанные синхронизацией этого процесса,
+      — из базы, остальные (delta-синхронизация до них не дошла) — через /v1/review/info
+    - уже PROCESSED и отзывы, где в комментариях есть ответ продавца, отбрасываются
+    - отзывы, которые не удалось перепроверить, тоже: лучше ответить в следующий раз, чем дважды
+    """
+    reviews = list(reviews)
+    ids = [r["id"] for r in reviews]
+    store = get_store()
+    current = store.synced_since(ids, store.synced_at) if store.synced_at else set()
+    fresh = store.get_many([review_id for review_id in ids if review_id in current])
+    fresh.update(refresh_reviews(review_id for review_id in ids if review_id not in current))
+    candidates = [fresh[r["id"]] for r in reviews if fresh.get(r["id"], {}).get("status") == "UNPROCESSED"]
+
+    commented = [r["id"] for r in candidates if r.get("comments_amount")]
+    if not commented:
+        return candidates
+    stats = prefetch_comments(commented)
+    skip = set(stats["failed"]) | set(store.seller_replied(commented))
+    return [r for r in candidates if r["id"] not in skip]
+
+
+def lookup_review(review_id: str) -> Optional[Dict]:
+    """Один отзыв по id (см. lookup_reviews)"""
+    return lookup_reviews([review_id]).get(review_id)
+
+
+def prefetch_comments(review_ids: Iterable[str], workers: Optional[int] = None) -> Dict:
+    """
+    Загружает комментарии многих отзывов в кэш
+    - свежий кэш (comments_amount не менялся) не перезапрашивается
+    - отзывы без комментариев сохраняются без запроса к API
+    - остальные запрашиваются параллельно, не больше workers одновременно
+    Возвращает {"cached", "fetched", "failed": {id: ошибка}}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from ozon_client import get_client
+    from throttle import default_max_in_flight
+
+    ids = list(dict.fromkeys(review_ids))
+    store = get_store()
+    stale = store.stale_comments(ids)
+    stats = {"cached": len(ids) - len(stale), "fetched": 0, "failed": {}}
+
+    to_fetch = []
+    for review_id, amount in stale.items():
+        if amount == 0:
+            store.save_comments(review_id, [], 0)
+        else:
+            to_fetch.append(review_id)
+    if not to_fetch:
+        return stats
+
+    client = get_client()
+
+    def fetch(review_id: str):
+        try:
+            with span("fetch"):
+                return review_id, client.list_comments(review_id, limit=100), None
+        except Exception as e:
+            return review_id, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=min(workers or default_max_in_flight(), len(to_fetch))) as pool:
+        for review_id, comments, error in pool.map(fetch, to_fetch):
+            if error is not None:
+                stats["failed"][review_id] = error
+                continue
+            store.save_comments(review_id, comments, stale[review_id])
+            stats["fetched"] += 1
+    return stats
+
+
+def load_comments(review_id: str) -> List[Dict]:
+    """Комментарии отзыва: из кэша, при промахе — из API (с записью в кэш)"""
+    stats = prefetch_comments([review_id])
+    if stats["failed"]:
+        from ozon_client import get_client
+        return get_client().list_comments(review_id, limit=100)
+    return get_store().cached_comments(review_id) or []
+
+
+def record_reply(review_id: str):
+    """Отмечает ответ в базе, если она открыта в этом процессе"""
+    if _store is not None:
+        _store.mark_replied(review_id)
+
+
+def record_status(review_ids: List[str], status: str):
+    """Отмечает смену статуса в базе, если она открыта в этом процессе"""
+    if _store is not None:
+        _store.set_status(review_ids, status)
+
+
+def summarize(batch) -> Dict:
+    """Разбивка набора ReviewBatch по рейтингу, статусу и признакам"""
+    month_ago = datetime.now().timestamp() - 30 * 86400
+    return {
+        "by_rating": {str(k): v for k, v in sorted(batch.counts("rating").items())},
+        "by_status": dict(batch.counts("status").most_common()),
+        "with_text": sum(batch.has_text),
+        "with_photos": len(batch.indices(has_photo=True)),
+        "commented": len(batch.indices(commented=True)),
+        "last_30_days": len(batch.indices(since=month_ago)),
+        "batch_mb": round(batch.nbytes() / 1024 / 1024, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    from config import load_env
+
+    load_env()
+
+    parser = argparse.ArgumentParser(description="Local Ozon reviews store")
+    parser.add_argument("--full", action="store_true", help="Full resync (refresh statuses of old reviews)")
+    parser.add_argument("--no-sync", action="store_true", help="Only show store stats")
+    parser.add_argument("--comments", action="store_true",
+                        help="Prefetch comments of commented UNPROCESSED reviews into the cache")
+    parser.add_argument("--summary", action="store_true",
+                        help="Breakdown by rating, status, text/photos/comments (columnar, whole store)")
+    parser.add_argument("--json", action="store_true", help="Output as JSON")
+
+    args = parser.parse_args(argv)
+
+    try:
+        store = get_store() if args.no_sync else synced_store(full=args.full)
+        comments = None
+        if args.comments:
+            ids = [r["id"] for r in store.query(status="UNPROCESSED", commented=True)]
+            comments = prefetch_comments(ids)
+        stats = {
+            "db": str(store.path),
+            "total": store.count(),
+            "unprocessed": store.conn.execute(
+                "SELECT COUNT(*) FROM reviews WHERE status = 'UNPROCESSED'"
+            ).fetchone()[0],
+            "watermark": store.get_state("watermark"),
+            "backfill_pending": bool(store.get_state("backfill_cursor"))
+        }
+        if comments is not None:
+            stats["comments"] = {**comments, "failed": len(comments["failed"])}
+        if args.summary:
+            stats["summary"] = summarize(store.load_batch())
+        if args.json:
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+        else:
+            print(f"DB: {stats['db']}")
+            print(f"Reviews: {stats['total']} (UNPROCESSED: {stats['unprocessed']})")
+            print(f"Watermark: {stats['watermark']}")
+            if stats["backfill_pending"]:
+                print("Backfill: incomplete, will resume on next sync")
+            if comments is not None:
+                print(f"Comments: {comments['fetched']} fetched, {comments['cached']} from cache, "
+                      f"{len(comments['failed'])} failed")
+            if args.summary:
+                summary = stats["summary"]
+                print("By rating: " + ", ".join(f"{k}★ {v}" for k, v in summary["by_rating"].items()))
+                print("By status: " + ", ".join(f"{k} {v}" for k, v in summary["by_status"].items()))
+                print(f"With text: {summary['with_text']}, with photos: {summary['with_photos']}, "
+                      f"commented: {summary['commented']}, last 30 days: {summary['last_30_days']}")
+                print(f"In memory: {summary['batch_mb']} MB")
+    except Exception as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    from profiling import run_main
+    run_main(main)
@@ -5,45 +5,13 @@ Ozon Reviews Client
 """
 
 import json
-import os
 import sys
 import argparse
-import requests
-from pathlib import Path
 from typing import List, Dict, Optional
 
-BASE_URL = "https://api-seller.ozon.ru"
-
-
-def load_env():
-    """Загружает .env из разных мест"""
-    paths = [
-        Path.cwd() / ".env",
-        Path(__file__).parent.parent / ".env",
-        Path(__file__).parent.parent.parent / ".env",
-    ]
-    for env_path in paths:
-        if env_path.exists():
-            with open(env_path) as f:
-                for line in f:
-                    if line.strip() and not line.startswith("#") and "=" in line:
-                        k, v = line.strip().split("=", 1)
-                        os.environ.setdefault(k.strip(), v.strip().strip('"\''))
-            break
-
-
-def get_headers():
-    """Возвращает заголовки для API"""
-    client_id = os.environ.get("OZON_CLIENT_ID")
-    api_key = os.environ.get("OZON_API_KEY")
-    if not client_id or not api_key:
-        print(json.dumps({"error": "Missing OZON_CLIENT_ID or OZON_API_KEY"}, ensure_ascii=False))
-        sys.exit(1)
-    return {
-        "Client-Id": client_id,
-        "Api-Key": api_key,
-        "Content-Type": "application/json"
-    }
+from config import load_env
+from ozon_client import get_client
+from review_store import load_comments, lookup_reviews, record_reply, synced_store
 
 
 def get_reviews(
@@ -54,72 +22,53 @@ def get_reviews(
     rating_max: Optional[int] = None,
     status: Optional[str] = None
 ) -> List[Dict]:
-    """Получить список отзывов"""
-    payload = {"limit": max(20, min(limit, 100)), "sort_dir": sort_dir}
-    if sku:
-        payload["sku"] = sku
-    
-    r = requests.post(
-        f"{BASE_URL}/v1/review/list",
-        headers=get_headers(),
-        json=payload,
-        timeout=30
-    )
-    r.raise_for_status()
-    
-    reviews = r.json().get("reviews", [])
-    
-    # Фильтрация на клиенте
-    if rating_min is not None:
-        reviews = [r for r in reviews if r.get("rating", 0) >= rating_min]
-    if rating_max is not None:
-        reviews = [r for r in reviews if r.get("rating", 5) <= rating_max]
-    if status:
-        reviews = [r for r in reviews if r.get("status") == status]
-    
-    return reviews
+    """Получить список отзывов (из локальной базы после delta-синхронизации)"""
+    return list(synced_store().query(
+        status=status or None,
+        rating_min=rating_min,
+        rating_max=rating_max,
+        sku=sku,
+        sort_dir=sort_dir,
+        limit=limit
+    ))
+
+
+def get_reviews_by_id(review_ids: List[str]) -> List[Dict]:
+    """Получить отзывы по id (база, затем адресные запросы к API), в порядке запроса"""
+    found = lookup_reviews(review_ids)
+    return [found[review_id] for review_id in review_ids if review_id in found]
 
 
 def get_comments(review_id: str, limit: int = 20) -> List[Dict]:
-    """Получить комментарии к отзыву"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/comment/list",
-        headers=get_headers(),
-        json={"review_id": review_id, "limit": max(20, min(limit, 100))},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json().get("comments", [])
+    """Получить комментарии к отзыву (кэш сбрасывается, когда меняется comments_amount)"""
+    return load_comments(review_id)[:limit]
 
 
 def reply_to_review(review_id: str, text: str) -> Dict:
     """Ответить на отзыв"""
-    r = requests.post(
-        f"{BASE_URL}/v1/review/comment/create",
-        headers=get_headers(),
-        json={"review_id": review_id, "text": text},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json()
+    result = get_client().create_comment(review_id, text)
+    record_reply(review_id)
+    return result
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     load_env()
     
     parser = argparse.ArgumentParser(description="Ozon Reviews Client")
-    parser.add_argument("--limit", type=int, default=20, help="Limit (20-100)")
+    parser.add_argument("--limit", type=int, default=20, help="Max reviews to return (comments: 20-100)")
     parser.add_argument("--sort-dir", default="DESC", choices=["ASC", "DESC"], help="Sort direction")
     parser.add_argument("--sku", type=int, help="Filter by SKU")
     parser.add_argument("--rating-min", type=int, help="Min rating (1-5)")
     parser.add_argument("--rating-max", type=int, help="Max rating (1-5)")
     parser.add_argument("--status", choices=["UNPROCESSED", "PROCESSED"], help="Filter by status")
+    parser.add_argument("--ids", nargs="+", metavar="REVIEW_ID", help="Get specific reviews by ID")
     parser.add_argument("--comments-for", help="Get comments for review ID")
     parser.add_argument("--reply-to", help="Reply to review ID")
     parser.add_argument("--reply-text", help="Reply text")
     parser.add_argument("--json", action="store_true", help="Output as JSON")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    import requests
     
     try:
         if args.comments_for:
@@ -143,14 +92,17 @@ def main():
             
         else:
             # Get reviews
-            reviews = get_reviews(
-                limit=args.limit,
-                sort_dir=args.sort_dir,
-                sku=args.sku,
-                rating_min=args.rating_min,
-                rating_max=args.rating_max,
-                status=args.status
-            )
+            if args.ids:
+                reviews = get_reviews_by_id(args.ids)
+            else:
+                reviews = get_reviews(
+                    limit=args.limit,
+                    sort_dir=args.sort_dir,
+                    sku=args.sku,
+                    rating_min=args.rating_min,
+                    rating_max=args.rating_max,
+                    status=args.status
+                )
             
             if args.json:
                 print(json.dumps({"reviews": reviews}, ensure_ascii=False, indent=2))
@@ -177,4 +129,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main
+    run_main(main)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Run Log
+Журнал прогонов в формате JSONL (одна запись — одна строка):
+- запись дописывается в конец файла, история не перечитывается
+- при превышении размера файл ротируется (run_log.jsonl.1, .2, ...),
+  старые сегменты можно сжимать gzip
+- чтение потоковое, с фильтром по дате, id отзыва и скрипту;
+  обрезанная при сбое строка пропускается, а не ломает весь журнал
+"""
+
+import argparse
+import gzip
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config import DATA_DIR, load_env
+from profiling import span
+
+LOG_NAME = "run_log.jsonl"
+
+# Значения по умолчанию; OZON_LOG_DIR / OZON_LOG_MAX_BYTES / OZON_LOG_BACKUPS / OZON_LOG_GZIP
+# читаются при каждом обращении к журналу, а не при импорте (уже после load_env())
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 10
+
+_lock = threading.Lock()
+
+
+def default_log_dir() -> Path:
+    return Path(os.environ.get("OZON_LOG_DIR") or DATA_DIR)
+
+
+def _backups() -> int:
+    return int(os.environ.get("OZON_LOG_BACKUPS") or BACKUPS)
+
+
+def log_path(log_dir: Optional[Path] = None) -> Path:
+    return Path(log_dir or default_log_dir()) / LOG_NAME
+
+
+def _segment(path: Path, n: int, compress: bool) -> Path:
+    return path.with_name(f"{path.name}.{n}{'.gz' if compress else ''}")
+
+
+def _rotate(path: Path, backups: int, compress: bool):
+    """run_log.jsonl → .1, .1 → .2, ...; самый старый сегмент удаляется"""
+    for n in range(backups, 0, -1):
+        for gz in (True, False):
+            src = _segment(path, n, gz)
+            if not src.exists():
+                continue
+            if n == backups:
+                src.unlink()
+            else:
+                src.rename(_segment(path, n + 1, gz))
+
+    if compress:
+        with open(path, "rb") as src, gzip.open(_segment(path, 1, True), "wb") as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                dst.write(chunk)
+        path.unlink()
+    else:
+        path.rename(_segment(path, 1, False))
+
+
+def append(
+    entry: Dict,
+    log_dir: Optional[Path] = None,
+    max_bytes: Optional[int] = None,
+    backups: Optional[int] = None,
+    compress: Optional[bool] = None
+) -> Path:
+    """Дописывает запись в журнал (timestamp добавляется, если его нет)"""
+    if max_bytes is None:
+        max_bytes = int(os.environ.get("OZON_LOG_MAX_BYTES") or MAX_BYTES)
+    if backups is None:
+        backups = _backups()
+    if compress is None:
+        compress = os.environ.get("OZON_LOG_GZIP", "1") != "0"
+    with span("log"):
+        return _append(entry, log_dir, max_bytes, backups, compress)
+
+
+def _append(entry: Dict, log_dir: Optional[Path], max_bytes: int, backups: int, compress: bool) -> Path:
+    path = log_path(log_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entry = {"timestamp": datetime.now().isoformat(), **entry}
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+    with _lock:
+        if path.exists() and path.stat().st_size + len(line) > max_bytes > 0:
+            _rotate(path, backups, compress)
+        with open(path, "a+b") as f:
+            # Недописанная при сбое строка не должна склеиться с новой
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+    return path
+
+
+def segments(log_dir: Optional[Path] = None) -> List[Path]:
+    """Файлы журнала от старых к новым"""
+    path = log_path(log_dir)
+    found = []
+    for n in range(_backups() + 1, 0, -1):
+        for gz in (True, False):
+            segment = _segment(path, n, gz)
+            if segment.exists():
+                found.append(segment)
+    if path.exists():
+        found.append(path)
+    return found
+
+
+def iter_entries(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    review_id: Optional[str] = None,
+    script: Optional[str] = None,
+    log_dir: Optional[Path] = None
+) -> Iterator[Dict]:
+    """
+    Потоково читает журнал с фильтрами
+    since/until — ISO-дата или время (сравнение по префиксу timestamp)
+    """
+    for segment in segments(log_dir):
+        opener = gzip.open if segment.suffix == ".gz" else open
+        with opener(segment, "rt") as f:
+            for line in f:
+                # Дешёвый отсев до разбора JSON
+                if review_id and review_id not in line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                timestamp = entry.get("timestamp", "")
+                if since and timestamp < since:
+                    continue
+                if until and timestamp[:len(until)] > until:
+                    continue
+                if script and entry.get("script") != script:
+                    continue
+                yield entry
+
+
+def main(argv: Optional[List[str]] = None):
+    load_env()
+
+    parser = argparse.ArgumentParser(description="Read Ozon reviews run log")
+    parser.add_argument("--since", help="From date/time (ISO, e.g. 2026-02-01)")
+    parser.add_argument("--until", help="Up to date/time inclusive (ISO)")
+    parser.add_argument("--review-id", help="Only runs that touched this review")
+    parser.add_argument("--script", help="Only entries from this script (autoreply, ai_reply, import_replies)")
+    parser.add_argument("--summary", action="store_true", help="One line per run instead of full JSON")
+
+    args = parser.parse_args(argv)
+
+    for entry in iter_entries(args.since, args.until, args.review_id, args.script):
+        if args.summary:
+            print(f"{entry.get('timestamp', '')[:19]}  {entry.get('script', '?'):<15} "
+                  f"mode={entry.get('mode', '?')} replied={entry.get('replied', 0)} "
+                  f"errors={entry.get('errors', 0)}")
+        else:
+            print(json.dumps(entry, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    from profiling import run_main
+    run_main(main)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Sender
+Параллельная отправка ответов на отзывы:
+- скорость подстраивается в клиенте (AIMD, см. throttle.py)
+- --rps задаёт жёсткий потолок запросов в секунду (token bucket)
+- не больше max_in_flight запросов одновременно
+- задания читаются из итератора лениво, результаты отдаются по мере готовности
+"""
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from ozon_client import get_client
+from profiling import span
+from throttle import TokenBucket, default_max_in_flight
+
+
+class ReplySender:
+    """
+    Движок отправки ответов
+    Задание — dict с review_id и text (остальные поля сохраняются в результате)
+    Результат — то же задание + status ("success"/"error") и comment_id/error
+    """
+
+    def __init__(
+        self,
+        rps: Optional[float] = None,
+        max_in_flight: Optional[int] = None,
+        send_func: Optional[Callable[[str, str], Dict]] = None
+    ):
+        max_in_flight = max_in_flight or default_max_in_flight()
+        self.bucket = TokenBucket(rps, burst=max_in_flight) if rps else None
+        self.max_in_flight = max(1, max_in_flight)
+        self.send_func = send_func or (lambda review_id, text: get_client().create_comment(review_id, text))
+
+    def _send_one(self, job: Dict) -> Dict:
+        if self.bucket:
+            self.bucket.acquire()
+        try:
+            with span("send"):
+                result = self.send_func(job["review_id"], job["text"])
+            return {**job, "comment_id": result.get("comment_id", "unknown"), "status": "success"}
+        except Exception as e:
+            return {**job, "error": str(e), "status": "error"}
+
+    def send(self, jobs: Iterable[Dict]) -> Iterator[Dict]:
+        """Отправляет задания параллельно, отдаёт результаты в порядке завершения"""
+        jobs = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            pending = set()
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.max_in_flight:
+                    job = next(jobs, None)
+                    if job is None:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(self._send_one, job))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+
+def add_sender_args(parser):
+    """Общие аргументы скорости отправки для скриптов"""
+    parser.add_argument("--rps", type=float,
+                        help="Hard cap on reply requests per second (default: adaptive, see OZON_RPS/OZON_MAX_RPS)")
+    # Парсер строится в main() после load_env(), так что OZON_MAX_IN_FLIGHT из .env уже виден
+    max_in_flight = default_max_in_flight()
+    parser.add_argument("--max-in-flight", type=int, default=max_in_flight,
+                        help=f"Max concurrent reply requests (default: {max_in_flight}, see OZON_MAX_IN_FLIGHT)")
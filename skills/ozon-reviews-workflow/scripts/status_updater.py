@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Ozon Reviews Status Updater
+Фоновая стадия обновления статуса отзывов:
+- id копятся в пачки по ≤100 (лимит /v1/review/change-status)
+- пачка отправляется, как только набралась или прошло flush_interval секунд,
+  то есть пока ответы ещё отправляются, а не в конце прогона
+- 400/422 (запрос отвергнут по содержимому) делит пачку пополам, чтобы найти
+  конкретные плохие id; 401/403 и прочие ошибки сразу проваливают всю пачку
+- 429/5xx и сетевые сбои повторяет сам клиент (OzonClient._post), второго слоя повторов нет
+- итог по каждому id: updated / failed (с текстом ошибки)
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from ozon_client import get_client
+from profiling import span
+
+# Лимит review_ids в одном запросе change-status
+MAX_BATCH = 100
+# Ответы «плохой id в пачке»: только они стоят деления пачки
+BISECT_STATUSES = {400, 422}
+
+_STOP = object()
+
+
+class StatusUpdater:
+    """
+    Использование:
+        with StatusUpdater() as status:
+            ...
+            status.add(review_id)   # после успешного ответа
+        status.updated, status.failed
+    """
+
+    def __init__(
+        self,
+        status: str = "PROCESSED",
+        batch_size: int = MAX_BATCH,
+        flush_interval: float = 5.0,
+        change_func: Optional[Callable[[List[str], str], Dict]] = None,
+        on_flush: Optional[Callable[[List[str], Optional[str]], None]] = None
+    ):
+        self.status = status
+        self.batch_size = max(1, min(batch_size, MAX_BATCH))
+        self.flush_interval = flush_interval
+        self.change_func = change_func or (lambda ids, status: get_client().change_status(ids, status))
+        self.on_flush = on_flush
+
+        self.updated: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self._seen = set()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="status-updater", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, review_id: str):
+        """Ставит id в очередь на обновление статуса (повторы игнорируются)"""
+        if review_id in self._seen:
+            return
+        self._seen.add(review_id)
+        self._queue.put(review_id)
+
+    def close(self) -> "StatusUpdater":
+        """Отправляет остаток и дожидается завершения стадии"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        return self
+
+    @property
+    def pending(self) -> int:
+        return len(self._seen) - len(self.updated) - len(self.failed)
+
+    def _run(self):
+        batch: List[str] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                if batch:
+                    self._flush(batch)
+                return
+
+            if item is not None:
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+
+    def _flush(self, ids: List[str]):
+        import requests
+
+        try:
+            with span("status"):
+                self.change_func(ids, self.status)
+        except requests.exceptions.HTTPError as e:
+            code = e.response.status_code if e.response is not None else None
+            if code in BISECT_STATUSES and len(ids) > 1:
+                # Запрос отвергнут по содержимому — ищем виноватые id
+                middle = len(ids) // 2
+                self._flush(ids[:middle])
+                self._flush(ids[middle:])
+                return
+            error = str(e) if str(e) and code not in BISECT_STATUSES else f"API error {code}"
+        except Exception as e:
+            error = str(e)
+        else:
+            self.updated.extend(ids)
+            self._notify(ids, None)
+            return
+
+        for review_id in ids:
+            self.failed[review_id] = error
+        self._notify(ids, error)
+
+    def _notify(self, ids: List[str], error: Optional[str]):
+        if self.on_flush:
+            self.on_flush(ids, error)
+
+
+def print_flush(ids: List[str], error: Optional[str]):
+    """Стандартный вывод результата пачки для скриптов"""
+    if error:
+        print(f"  ✗ Status update failed for {len(ids)} reviews: {error}")
+    else:
+        print(f"  ✓ Status PROCESSED: {len(ids)} reviews")
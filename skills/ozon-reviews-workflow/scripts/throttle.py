@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Ozon API Throttling
+- TokenBucket: фиксированный лимит запросов в секунду
+- AimdLimiter: адаптивный лимит скорости и параллельности (AIMD)
+  * аддитивный рост, пока ответы здоровые
+  * мультипликативное снижение на 429/5xx и на рост задержки относительно
+    скользящей базы своего эндпоинта (EWMA с допуском), а не глобального минимума
+  * учёт Retry-After
+- retry_delay: экспоненциальная пауза с jitter для повторов
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Лимит Ozon API: 40 запросов/минуту (переопределяется OZON_RPS)
+DEFAULT_RPS = 40 / 60
+# Одновременных запросов по умолчанию (OZON_MAX_IN_FLIGHT)
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+# Окружение читается при вызове, а не при импорте: к этому моменту load_env() уже отработал
+def default_rps() -> float:
+    return float(os.environ.get("OZON_RPS") or DEFAULT_RPS)
+
+
+def default_max_rps(rate: float) -> float:
+    """Потолок, до которого AIMD может разгоняться (OZON_MAX_RPS, по умолчанию 3 × rate)"""
+    return float(os.environ.get("OZON_MAX_RPS") or rate * 3)
+
+
+def default_max_in_flight() -> int:
+    return int(os.environ.get("OZON_MAX_IN_FLIGHT") or DEFAULT_MAX_IN_FLIGHT)
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: rate токенов в секунду, не больше burst про запас"""
+
+    def __init__(self, rate: float, burst: float = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        """Меняет скорость на лету (накопленные токены сохраняются)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Забирает один токен, при необходимости ждёт; возвращает время ожидания"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AimdLimiter:
+    """
+    Адаптивный ограничитель скорости и числа одновременных запросов
+    Использование:
+        limiter.acquire()
+        ... запрос ...
+        limiter.on_success(latency, endpoint) / limiter.on_throttle(retry_after) / limiter.on_error()
+        limiter.release()
+    """
+
+    # Вес нового ответа в быстрой (текущая задержка) и медленной (база) EWMA
+    FAST_ALPHA = 0.3
+    BASE_ALPHA = 0.05
+    # Ответов эндпоинта до первого решения по задержке
+    WARMUP = 5
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        max_rate: Optional[float] = None,
+        min_rate: float = 0.1,
+        concurrency: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        rate_step: float = 0.2,
+        decrease: float = 0.5,
+        latency_factor: float = 2.0,
+        cooldown: float = 1.0
+    ):
+        # Не заданное явно берётся из окружения (OZON_RPS / OZON_MAX_RPS / OZON_MAX_IN_FLIGHT)
+        rate = rate or default_rps()
+        max_rate = max_rate or default_max_rps(rate)
+        concurrency = concurrency or default_max_in_flight()
+        max_concurrency = max_concurrency or concurrency * 4
+        self.max_rate = max(rate, max_rate)
+        self.min_rate = min(rate, min_rate)
+        self.max_concurrency = max(concurrency, max_concurrency)
+        self.rate_step = rate_step
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+
+        self.bucket = TokenBucket(rate, burst=1)
+        self.concurrency = float(concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        # Эндпоинт → [база, текущая задержка, число ответов]
+        self.latency: Dict[str, List[float]] = {}
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def acquire(self) -> float:
+        """Ждёт свободный слот, конец Retry-After и токен; возвращает время ожидания"""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    self._cond.wait(self.blocked_until - now)
+                elif self.in_flight >= int(self.concurrency):
+                    self._cond.wait()
+                else:
+                    self.in_flight += 1
+                    break
+        self.bucket.acquire()
+        return time.monotonic() - started
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float, endpoint: str = ""):
+        """
+        Здоровый ответ: аддитивный рост, пока задержка эндпоинта в пределах
+        latency_factor × его скользящей базы
+        База — медленная EWMA, а не минимум: один быстрый ответ не делает обычную
+        задержку «перегрузкой», а устойчивый сдвиг со временем становится новой нормой.
+        """
+        with self._cond:
+            stats = self.latency.get(endpoint)
+            if stats is None:
+                stats = self.latency[endpoint] = [latency, latency, 0]
+            base, avg, samples = stats
+            avg = avg + self.FAST_ALPHA * (latency - avg)
+            stats[1], stats[2] = avg, samples + 1
+
+            stats[0] = base + self.BASE_ALPHA * (latency - base)
+
+            if samples >= self.WARMUP and avg > self.latency_factor * base:
+                self._decrease()
+                # Сбрасываем среднее, чтобы следующее решение принималось по новым ответам
+                stats[1] = stats[0]
+                return
+
+            self.bucket.set_rate(min(self.max_rate, self.rate + self.rate_step))
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._cond.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """429/5xx: мультипликативное снижение и пауза по Retry-After"""
+        with self._cond:
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self._decrease()
+
+    def on_error(self):
+        """Сетевая ошибка: считаем перегрузкой"""
+        with self._cond:
+            self._decrease()
+
+    def _decrease(self):
+        # Не чаще раза в cooldown, чтобы пачка одновременных 429 не обнулила лимит
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.bucket.set_rate(max(self.min_rate, self.rate * self.decrease))
+        self.concurrency = max(1.0, self.concurrency * self.decrease)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After: секунды или HTTP-дата → секунды ожидания"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # Дата в Retry-After — редкость, email.utils грузится только ради неё
+    from email.utils import parsedate_to_datetime
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def retry_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Экспоненциальная пауза с полным jitter: uniform(0, min(cap, base * 2^attempt))"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
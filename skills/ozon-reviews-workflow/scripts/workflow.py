@@ -5,33 +5,86 @@ Ozon Reviews Workflow - Полный цикл обработки отзывов
 1. 5★ без текста → автоответ
 2. 4-5★ с текстом → AI (экспорт/анализ/импорт)
 3. 1-3★ → AI с особыми инструкциями (претензии)
+
+Шаги выполняются в этом же процессе (без запуска python3 на каждый шаг):
+общий API-клиент, одна delta-синхронизация отзывов, время каждого шага.
+--daemon: один постоянный процесс опрашивает новые отзывы с адаптивным интервалом.
 """
 
-import json
+import io
 import os
+import signal
 import sys
+import time
 import argparse
-import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
+
+from config import WORKSPACE
+
+
+def export_dir() -> Path:
+    """Куда экспортируются отзывы для AI: OZON_EXPORT_DIR (accounts.py задаёт папку кабинета) или workspace"""
+    return Path(os.environ.get("OZON_EXPORT_DIR") or WORKSPACE)
+
+
+class StepOutput:
+    """stdout, который в параллельном режиме собирает вывод каждого шага отдельно"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer if buffer is not None else self.stream).write(text)
 
-WORKSPACE = Path.home() / ".openclaw" / "workspace"
+    def flush(self):
+        self.stream.flush()
 
-def run_command(cmd: List[str], description: str) -> bool:
-    """Выполняет команду и показывает результат"""
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def run_command(main_func: Callable, argv: List[str], description: str) -> bool:
+    """Выполняет main() скрипта в этом процессе и показывает результат"""
     print(f"\n{'='*60}")
     print(f"▶ {description}")
     print(f"{'='*60}")
     
-    result = subprocess.run(cmd, capture_output=True, text=True, cwd=WORKSPACE)
-    
-    if result.returncode == 0:
-        print(result.stdout)
+    try:
+        main_func(argv)
         return True
-    else:
-        print(f"❌ Ошибка: {result.stderr}")
+    except SystemExit as e:
+        if e.code in (None, 0):
+            return True
+        print(f"❌ Ошибка: шаг завершился с кодом {e.code}")
         return False
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        return False
+
+
+def timed(step: Callable, *args, **kwargs) -> Dict:
+    """Запускает шаг и добавляет в результат время выполнения"""
+    started = time.perf_counter()
+    result = step(*args, **kwargs)
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def sync_reviews() -> Dict:
+    """Одна delta-синхронизация отзывов на весь прогон"""
+    from review_store import synced_store
+    
+    started = time.perf_counter()
+    store = synced_store()
+    seconds = round(time.perf_counter() - started, 2)
+    print(f"\n🔄 Отзывы синхронизированы: {store.count()} в базе ({seconds} с)")
+    return {"step": 0, "name": "sync", "success": True, "seconds": seconds}
 
 def step1_auto_5star_no_text(dry_run: bool = False) -> Dict:
     """
@@ -41,15 +94,14 @@ def step1_auto_5star_no_text(dry_run: bool = False) -> Dict:
     print("📋 ШАГ 1: 5★ без текста → Автоответ")
     print("="*60)
     
-    cmd = [
-        "python3", "skills/ozon-reviews-workflow/scripts/autoreply.py",
-        "--limit", "100"
-    ]
+    from autoreply import main as autoreply_main
+    
+    cmd = ["--limit", "100"]
     
     if dry_run:
         cmd.append("--dry-run")
     
-    success = run_command(cmd, "Запуск автоответов на 5★ без текста")
+    success = run_command(autoreply_main, cmd, "Запуск автоответов на 5★ без текста")
     
     return {
         "step": 1,
@@ -58,7 +110,23 @@ def step1_auto_5star_no_text(dry_run: bool = False) -> Dict:
         "dry_run": dry_run
     }
 
-def step2_ai_4_5_with_text(confirm_each: bool = False, dry_run: bool = False) -> Dict:
+def llm_step(step: int, name: str, rating_min: int, rating_max: int, dry_run: bool) -> Dict:
+    """AI-шаг за один проход: генерация через LLM-backend и отправка, без экспорта/импорта файлов"""
+    from ai_reply import main as ai_reply_main
+    
+    cmd = [
+        "--backend", "openai",
+        "--limit", "100",
+        "--rating-min", str(rating_min),
+        "--rating-max", str(rating_max)
+    ]
+    if dry_run:
+        cmd.append("--dry-run")
+    
+    success = run_command(ai_reply_main, cmd, f"LLM-ответы на {rating_min}-{rating_max}★ с текстом")
+    return {"step": step, "name": name, "success": success, "dry_run": dry_run}
+
+def step2_ai_4_5_with_text(confirm_each: bool = False, dry_run: bool = False, llm: bool = False) -> Dict:
     """
     Шаг 2: 4-5★ с текстом → AI анализ
     """
@@ -66,26 +134,31 @@ def step2_ai_4_5_with_text(confirm_each: bool = False, dry_run: bool = False) ->
     print("📋 ШАГ 2: 4-5★ с текстом → AI анализ")
     print("="*60)
     
-    output_file = f"ai_reviews_4_5_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
+    if llm:
+        return llm_step(2, "ai_4_5_llm", 4, 5, dry_run)
+    
+    output_file = f"ai_reviews_4_5_{datetime.now().strftime('%Y%m%d_%H%M')}.jsonl"
+    
+    from ai_reply import main as ai_reply_main
     
     # Экспорт
     cmd_export = [
-        "python3", "skills/ozon-reviews-workflow/scripts/ai_reply.py",
         "--export",
+        "--limit", "100",
         "--rating-min", "4",
         "--rating-max", "5",
-        "--output", output_file
+        "--output", str(export_dir() / output_file)
     ]
     
-    if not run_command(cmd_export, "Экспорт отзывов 4-5★ для AI"):
+    if not run_command(ai_reply_main, cmd_export, "Экспорт отзывов 4-5★ для AI"):
         return {"step": 2, "name": "ai_4_5_export", "success": False}
     
     print(f"\n✅ Отзывы экспортированы в: {output_file}")
-    print(f"\n⏸️  СЛЕДУЮЩИЙ ШАГ:")
-    print(f"   1. Передай файл AI (мне) для анализа")
-    print(f"   2. Получи файл с ответами (например: {output_file.replace('.json', '_replied.json')})")
-    print(f"   3. Запусти импорт:")
-    print(f"      python3 skills/ozon-reviews-workflow/scripts/ai_reply.py --import-file {output_file.replace('.json', '_replied.json')}")
+    print("\n⏸️  СЛЕДУЮЩИЙ ШАГ:")
+    print("   1. Передай файл AI (мне) для анализа")
+    print(f"   2. Получи файл с ответами (например: {output_file.replace('.jsonl', '_replied.jsonl')})")
+    print("   3. Запусти импорт:")
+    print(f"      python3 skills/ozon-reviews-workflow/scripts/ai_reply.py --import-file {output_file.replace('.jsonl', '_replied.jsonl')}")
     
     return {
         "step": 2,
@@ -95,7 +168,7 @@ def step2_ai_4_5_with_text(confirm_each: bool = False, dry_run: bool = False) ->
         "next_action": "Передай файл AI для анализа"
     }
 
-def step3_ai_1_3_negative(confirm_each: bool = False, dry_run: bool = False) -> Dict:
+def step3_ai_1_3_negative(confirm_each: bool = False, dry_run: bool = False, llm: bool = False) -> Dict:
     """
     Шаг 3: 1-3★ (негатив) → AI с особыми инструкциями
     """
@@ -103,31 +176,36 @@ def step3_ai_1_3_negative(confirm_each: bool = False, dry_run: bool = False) ->
     print("📋 ШАГ 3: 1-3★ (негатив/претензии) → AI с особыми инструкциями")
     print("="*60)
     
-    output_file = f"ai_reviews_negative_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
+    if llm:
+        return llm_step(3, "ai_negative_llm", 1, 3, dry_run)
+    
+    output_file = f"ai_reviews_negative_{datetime.now().strftime('%Y%m%d_%H%M')}.jsonl"
+    
+    from ai_reply import main as ai_reply_main
     
     # Экспорт
     cmd_export = [
-        "python3", "skills/ozon-reviews-workflow/scripts/ai_reply.py",
         "--export",
+        "--limit", "100",
         "--rating-min", "1",
         "--rating-max", "3",
-        "--output", output_file
+        "--output", str(export_dir() / output_file)
     ]
     
-    if not run_command(cmd_export, "Экспорт отзывов 1-3★ для AI"):
+    if not run_command(ai_reply_main, cmd_export, "Экспорт отзывов 1-3★ для AI"):
         return {"step": 3, "name": "ai_negative_export", "success": False}
     
     print(f"\n✅ Отзывы экспортированы в: {output_file}")
-    print(f"\n⚠️  ВАЖНО: Для негативных отзывов (1-3★) используй специальные инструкции:")
-    print(f"   - Больше эмпатии и извинений")
-    print(f"   - Конкретные решения (возврат/замена)")
-    print(f"   - Приглашение в личные сообщения")
-    print(f"   - Не шаблонные ответы, а персональные")
-    print(f"\n⏸️  СЛЕДУЮЩИЙ ШАГ:")
-    print(f"   1. Передай файл AI (мне) с пометкой 'негативные отзывы'")
-    print(f"   2. Получи файл с ответами")
-    print(f"   3. Запусти импорт:")
-    print(f"      python3 skills/ozon-reviews-workflow/scripts/ai_reply.py --import-file [файл]")
+    print("\n⚠️  ВАЖНО: Для негативных отзывов (1-3★) используй специальные инструкции:")
+    print("   - Больше эмпатии и извинений")
+    print("   - Конкретные решения (возврат/замена)")
+    print("   - Приглашение в личные сообщения")
+    print("   - Не шаблонные ответы, а персональные")
+    print("\n⏸️  СЛЕДУЮЩИЙ ШАГ:")
+    print("   1. Передай файл AI (мне) с пометкой 'негативные отзывы'")
+    print("   2. Получи файл с ответами")
+    print("   3. Запусти импорт:")
+    print("      python3 skills/ozon-reviews-workflow/scripts/ai_reply.py --import-file [файл]")
     
     return {
         "step": 3,
@@ -137,34 +215,66 @@ def step3_ai_1_3_negative(confirm_each: bool = False, dry_run: bool = False) ->
         "next_action": "Передай файл AI для анализа (особые инструкции для негатива)"
     }
 
-def full_workflow(dry_run: bool = False, auto_5star: bool = True):
+def run_parallel(steps: List[Callable]) -> List[Dict]:
+    """
+    Запускает независимые шаги одновременно
+    Вывод каждого шага собирается отдельно и печатается целиком по завершении
+    """
+    output = StepOutput(sys.stdout)
+    
+    def run(step):
+        output.local.buffer = buffer = io.StringIO()
+        try:
+            return timed(step), buffer.getvalue()
+        finally:
+            output.local.buffer = None
+    
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=len(steps)) as pool:
+            futures = [pool.submit(run, step) for step in steps]
+            results = []
+            for future in futures:
+                result, text = future.result()
+                output.stream.write(text)
+                results.append(result)
+    finally:
+        sys.stdout = output.stream
+    return results
+
+def full_workflow(dry_run: bool = False, auto_5star: bool = True, parallel: bool = False, llm: bool = False):
     """
     Полный рабочий процесс
     """
+    started = time.perf_counter()
     print("\n" + "="*60)
     print("🚀 OZON REVIEWS WORKFLOW - Полный цикл")
     print("="*60)
     print(f"Режим: {'ТЕСТОВЫЙ (dry-run)' if dry_run else 'РЕАЛЬНАЯ ОТПРАВКА'}")
     print(f"Время: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     
-    results = []
+    # Одна синхронизация на все шаги
+    results = [sync_reviews()]
     
-    # Шаг 1: 5★ без текста (авто)
+    steps = [
+        lambda: step2_ai_4_5_with_text(dry_run=dry_run, llm=llm),
+        lambda: step3_ai_1_3_negative(dry_run=dry_run, llm=llm),
+    ]
     if auto_5star:
-        result = step1_auto_5star_no_text(dry_run)
-        results.append(result)
-        
-        if not result["success"]:
-            print("\n❌ Ошибка на шаге 1. Останавливаемся.")
-            return results
+        steps.insert(0, lambda: step1_auto_5star_no_text(dry_run))
     
-    # Шаг 2: 4-5★ с текстом (AI)
-    result = step2_ai_4_5_with_text(dry_run=dry_run)
-    results.append(result)
-    
-    # Шаг 3: 1-3★ (негатив, AI)
-    result = step3_ai_1_3_negative(dry_run=dry_run)
-    results.append(result)
+    if parallel:
+        # Шаги работают с непересекающимися отзывами (без текста / с текстом по рейтингу)
+        results.extend(run_parallel(steps))
+    else:
+        for i, step in enumerate(steps):
+            result = timed(step)
+            results.append(result)
+            
+            # Шаг 1: 5★ без текста (авто) — при ошибке дальше не идём
+            if auto_5star and i == 0 and not result["success"]:
+                print("\n❌ Ошибка на шаге 1. Останавливаемся.")
+                return results
     
     # Итог
     print("\n" + "="*60)
@@ -173,18 +283,137 @@ def full_workflow(dry_run: bool = False, auto_5star: bool = True):
     
     for r in results:
         status = "✅" if r["success"] else "❌"
-        print(f"{status} Шаг {r['step']}: {r['name']}")
+        print(f"{status} Шаг {r['step']}: {r['name']} ({r['seconds']} с)")
+    print(f"⏱  Всего: {time.perf_counter() - started:.2f} с")
     
-    print(f"\n⏭️  Следующие действия:")
-    print(f"   1. Дождись экспорта файлов отзывов")
-    print(f"   2. Передай их мне (AI) для анализа")
-    print(f"   3. Получи файлы с ответами")
-    print(f"   4. Импортируй ответы командой:")
-    print(f"      python3 skills/ozon-reviews-workflow/scripts/ai_reply.py --import-file [файл]")
+    if llm:
+        return results
+    
+    print("\n⏭️  Следующие действия:")
+    print("   1. Дождись экспорта файлов отзывов")
+    print("   2. Передай их мне (AI) для анализа")
+    print("   3. Получи файлы с ответами")
+    print("   4. Импортируй ответы командой:")
+    print("      python3 skills/ozon-reviews-workflow/scripts/ai_reply.py --import-file [файл]")
     
     return results
 
-def main():
+# Интервал опроса в режиме --daemon по умолчанию, секунды (OZON_POLL_MIN / OZON_POLL_MAX)
+DAEMON_MIN_INTERVAL = 15.0
+DAEMON_MAX_INTERVAL = 600.0
+# Сглаживание оценки частоты новых отзывов (EWMA)
+ARRIVAL_ALPHA = 0.3
+
+def next_interval(rate: float, min_interval: float, max_interval: float) -> float:
+    """Интервал опроса: примерно один новый отзыв за интервал, в пределах [min, max]"""
+    if rate <= 0:
+        return max_interval
+    return max(min_interval, min(max_interval, 1 / rate))
+
+def daemon(
+    dry_run: bool = False,
+    llm: bool = False,
+    min_interval: float = DAEMON_MIN_INTERVAL,
+    max_interval: float = DAEMON_MAX_INTERVAL,
+    metrics_file: Optional[str] = None
+):
+    """
+    Постоянный режим: опрос новых отзывов (delta от watermark) и их обработка
+    - интервал сокращается, когда отзывы приходят часто, и растёт в тишине
+    - SIGTERM/SIGINT: текущий цикл (отправка и смена статусов) дорабатывает, затем выход
+    - шаги экспорта для AI в цикле не запускаются: 5★ без текста — всегда, 1-5★ с текстом — только с llm
+    - metrics_file перезаписывается после каждого цикла (накопленные метрики процесса)
+    - каждый цикл, независимо от новых отзывов, дожимается outbox: pending отправляются,
+      failed возвращаются в очередь через max_interval после сбоя, если ответ не дошёл;
+      шаги, упавшие в прошлом цикле, повторяются
+    """
+    from metrics import get_metrics
+    from outbox import Outbox, deliver, has_seller_reply
+    from ozon_client import get_client
+    from review_store import get_store, synced_store
+    
+    stop = threading.Event()
+    
+    def request_stop(signum, frame):
+        if not stop.is_set():
+            print(f"\n⏹  Сигнал {signal.Signals(signum).name}: завершаю текущий цикл и выхожу")
+        stop.set()
+    
+    previous = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    
+    store, client = get_store(), get_client()
+    outbox = Outbox()
+    if not dry_run:
+        # Зависшие sending — только от прошлого процесса: разбираем один раз при старте
+        recovered = outbox.recover()
+        if any(recovered.values()):
+            print(f"📮 Outbox после сбоя: {recovered}")
+    rate, interval = 0.0, min_interval
+    last_poll = time.monotonic()
+    print(f"🔁 Daemon: интервал {min_interval:.0f}-{max_interval:.0f} с, "
+          f"{'LLM' if llm else 'только автоответы 5★'}{' (dry-run)' if dry_run else ''}")
+    
+    try:
+        first, retry_steps = True, False
+        while not stop.is_set():
+            before = store.count()
+            try:
+                # Первый цикл — через synced_store, чтобы шаги не синхронизировали повторно
+                synced_store() if first else store.sync(client)
+            except Exception as e:
+                print(f"❌ Синхронизация не удалась: {e}")
+                stop.wait(interval)
+                continue
+            now = time.monotonic()
+            arrived = store.count() - before
+            rate = ARRIVAL_ALPHA * arrived / max(now - last_poll, 1e-6) + (1 - ARRIVAL_ALPHA) * rate
+            last_poll = now
+            
+            if arrived or first or retry_steps:
+                print(f"\n📥 {datetime.now().strftime('%H:%M:%S')}: новых отзывов {arrived}"
+                      f"{' (повтор упавших шагов)' if retry_steps and not arrived else ''}")
+                steps = [lambda: step1_auto_5star_no_text(dry_run)]
+                if llm:
+                    steps += [
+                        lambda: step2_ai_4_5_with_text(dry_run=dry_run, llm=True),
+                        lambda: step3_ai_1_3_negative(dry_run=dry_run, llm=True),
+                    ]
+                retry_steps = False
+                for step in steps:
+                    result = timed(step)
+                    print(f"{'✅' if result['success'] else '❌'} {result['name']} ({result['seconds']} с)")
+                    retry_steps = retry_steps or not result["success"]
+                first = False
+            
+            # Outbox — каждый цикл: ответы, не ушедшие раньше, не ждут новых отзывов
+            if not dry_run:
+                try:
+                    requeued = outbox.retry_failed(has_seller_reply, older_than=max_interval)
+                    if requeued or outbox.counts()["pending"]:
+                        print(f"\n📮 Outbox: повтор {requeued} неотправленных, доставка очереди")
+                        deliver(outbox)
+                except Exception as e:
+                    print(f"❌ Outbox не доставлен: {e}")
+            if metrics_file:
+                try:
+                    get_metrics().export(metrics_file)
+                except OSError as e:
+                    print(f"⚠️  Metrics not written: {e}")
+            
+            interval = next_interval(rate, min_interval, max_interval)
+            stop.wait(interval)
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        print("👋 Daemon остановлен")
+
+def main(argv: Optional[List[str]] = None):
+    from config import load_env
+    from metrics import add_metrics_args, export_metrics
+    
+    # До построения парсера: значения по умолчанию берутся из окружения и .env
+    load_env()
+    
     parser = argparse.ArgumentParser(
         description="Ozon Reviews Workflow - Полный цикл обработки",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -204,6 +433,15 @@ def main():
   
   # Полный цикл (реальная отправка 5★ + экспорт для AI)
   python3 workflow.py
+  
+  # Все шаги одновременно
+  python3 workflow.py --parallel
+  
+  # AI-ответы через LLM за один проход (без экспорта/импорта файлов)
+  python3 workflow.py --llm
+  
+  # Постоянный процесс вместо cron (новые отзывы — за секунды)
+  python3 workflow.py --daemon --llm
         """
     )
     
@@ -217,21 +455,41 @@ def main():
                         help="Только шаг 3: 1-3★ негатив (AI)")
     parser.add_argument("--no-auto-5star", action="store_true",
                         help="Пропустить автоответы 5★ (только экспорт для AI)")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Выполнять независимые шаги одновременно")
+    parser.add_argument("--llm", action="store_true",
+                        help="AI-шаги через LLM-backend (OZON_LLM_*) вместо экспорта файлов")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Постоянный режим: опрос новых отзывов с адаптивным интервалом")
+    parser.add_argument("--min-interval", type=float,
+                        default=float(os.environ.get("OZON_POLL_MIN") or DAEMON_MIN_INTERVAL),
+                        help="Минимальный интервал опроса, с (env OZON_POLL_MIN)")
+    parser.add_argument("--max-interval", type=float,
+                        default=float(os.environ.get("OZON_POLL_MAX") or DAEMON_MAX_INTERVAL),
+                        help="Максимальный интервал опроса, с (env OZON_POLL_MAX)")
+    add_metrics_args(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Определяем что запускать
-    if args.step1_only:
+    if args.daemon:
+        daemon(args.dry_run, args.llm, args.min_interval, args.max_interval, args.metrics)
+    elif args.step1_only:
         step1_auto_5star_no_text(args.dry_run)
     elif args.step2_only:
-        step2_ai_4_5_with_text(dry_run=args.dry_run)
+        step2_ai_4_5_with_text(dry_run=args.dry_run, llm=args.llm)
     elif args.step3_only:
-        step3_ai_1_3_negative(dry_run=args.dry_run)
+        step3_ai_1_3_negative(dry_run=args.dry_run, llm=args.llm)
     else:
         full_workflow(
             dry_run=args.dry_run,
-            auto_5star=not args.no_auto_5star
+            auto_5star=not args.no_auto_5star,
+            parallel=args.parallel,
+            llm=args.llm
         )
+    
+    export_metrics(args.metrics)
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main
+    run_main(main)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Policy Check Tests
+Таблица фраз: обещания от нашего имени ловятся, отрицания и отсылки к Ozon — нет.
+Запуск: python3 -m pytest skills/ozon-reviews-workflow/tests (или python3 -m unittest)
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from policy_check import PolicyValidator  # noqa: E402
+
+# Ответы, которые нельзя отправлять
+VIOLATIONS = [
+    "Оформим возврат в течение дня",
+    "Мы оформим вам возврат",
+    "Вернём деньги на карту",
+    "Компенсируем стоимость доставки",
+    "Предлагаем компенсацию 500 рублей",
+    "Заменим товар бесплатно",
+    "Готовы заменить товар",
+    "Можем поменять флакон на новый",
+    "Решим вопрос в ближайшее время",
+    "Обязательно поможем решить ваш вопрос",
+    "Мы не предусматриваем возвраты, но компенсируем доставку",
+    "Не переживайте, оформим возврат",
+    "Не волнуйтесь, вернём деньги",
+    "Не беспокойтесь, компенсируем доставку",
+    "Нет проблем, заменим товар",
+    "Без проблем — компенсируем стоимость",
+    "Вернем вам полную стоимость",
+]
+
+# Допустимые ответы, в том числе с теми же словами под отрицанием
+ALLOWED = [
+    "Сожалеем о возникшей ситуации 😔 Рекомендуем обратиться в поддержку Ozon",
+    "Мы не предусматриваем возвраты после приемки на пункте выдачи.",
+    "К сожалению, без компенсаций: товар был получен",
+    "Никаких компенсаций после получения товара не производится",
+    "Компенсация не предусмотрена правилами магазина",
+    "Мы не оформляем возврат после приемки товара",
+    "Вы можете заменить товар по процедуре Ozon",
+    "В поддержке Ozon помогут решить вопрос с доставкой",
+    "Если есть сомнения в качестве - верните по процедуре Ozon",
+]
+
+
+class PolicyValidatorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.validator = PolicyValidator()
+
+    def test_violations(self):
+        for text in VIOLATIONS:
+            with self.subTest(text=text):
+                self.assertTrue(self.validator.check(text), "violation not detected")
+
+    def test_allowed(self):
+        for text in ALLOWED:
+            with self.subTest(text=text):
+                self.assertEqual(self.validator.check(text), [])
+
+
+if __name__ == "__main__":
+    unittest.main()